@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 from pydantic_settings import BaseSettings
 from pydantic import Field, model_validator, field_validator
 
@@ -13,9 +13,17 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     BART_API_KEY: str
     
+    # Agencies served (keys, aliases or 511 ids from app/services/agency_registry.py; each needs its GTFS
+    # tables loaded). AGENCY_PRELOAD ones are warmed at startup and kept; any other agency loads on first
+    # use and is dropped after AGENCY_IDLE_SECONDS unused, or when more than AGENCY_MAX_LOADED are held.
+    # AGENCY_REGISTRY_EXTRA adds operators, e.g. {"napavine": {"operator": "VN", "name": "Napa VINE"}}
     AGENCY_ID: List[str] = ["muni", "bart"]
+    AGENCY_PRELOAD: List[str] = ["muni", "bart"]
+    AGENCY_IDLE_SECONDS: int = 1800
+    AGENCY_MAX_LOADED: int = 8
+    AGENCY_REGISTRY_EXTRA: Dict[str, Dict[str, Any]] = {}
 
-    @field_validator("AGENCY_ID", mode="before")
+    @field_validator("AGENCY_ID", "AGENCY_PRELOAD", mode="before")
     @classmethod
     def parse_agency_id(cls, v):
         if isinstance(v, str):
@@ -40,12 +48,110 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: Optional[str] = None
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+    CACHE_TTL: int = 60
+
+    # Multi-worker deployments (see gunicorn.conf.py); leader lock TTL in seconds
+    WEB_CONCURRENCY: int = 1
+    LEADER_LOCK_TTL: int = 15
+
+    # Response encoding (app/utils/responses.py): compress bodies at or above this size
+    COMPRESSION_MIN_BYTES: int = 1024
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 5
+    ENABLE_MSGPACK: bool = True
+    STATIC_CACHE_MAX_AGE: int = 3600
 
     DEBUG: bool = False
     LOG_LEVEL: str = "INFO"
 
+    # Preload stop catalogs and schedule indexes at startup; /ready stays 503 until done
+    WARMUP_ON_STARTUP: bool = True
+
     API_KEY: Optional[str] = None
     TRANSIT_511_BASE_URL: str = "http://api.511.org/transit"
+    BART_API_BASE_URL: str = "https://api.bart.gov/api"
+    UPSTREAM_TIMEOUT: float = 10.0
+
+    # Resilience (app/integrations/resilience.py): interactive calls time out at
+    # p99 x UPSTREAM_TIMEOUT_FACTOR within [UPSTREAM_MIN_TIMEOUT, UPSTREAM_SLO_SECONDS]
+    UPSTREAM_SLO_SECONDS: float = 3.0
+    UPSTREAM_MIN_TIMEOUT: float = 0.5
+    UPSTREAM_TIMEOUT_FACTOR: float = 2.0
+    UPSTREAM_MIN_SAMPLES: int = 20
+    UPSTREAM_HEDGE: bool = True
+    UPSTREAM_HEDGE_MIN_DELAY: float = 0.1
+    UPSTREAM_BREAKER_FAILURE_RATE: float = 0.5
+    UPSTREAM_BREAKER_MIN_CALLS: int = 10
+    UPSTREAM_BREAKER_COOLDOWN: float = 30.0
+
+    # 511 per-key quota shared by all workers (0 disables the limiter); background
+    # refreshes leave UPSTREAM_BACKGROUND_RESERVE of the bucket for interactive requests
+    UPSTREAM_511_QUOTA: int = 60
+    UPSTREAM_511_QUOTA_WINDOW: int = 3600
+    UPSTREAM_511_BURST: int = 0
+    UPSTREAM_BACKGROUND_RESERVE: float = 0.25
+    # How long the last good real-time answer per stop is kept for degraded responses
+    REALTIME_FALLBACK_TTL: int = 900
+    # Merged arrivals: how far ahead the schedule is read and how far a prediction
+    # may be from its scheduled time and still be joined to it when there is no trip id
+    MERGED_SCHEDULE_HORIZON_MINUTES: int = 90
+    MERGED_MATCH_WINDOW_SECONDS: int = 900
+    # Batch arrivals: upstream calls in flight per request, and how recent a cached
+    # live answer must be to be served without calling the upstream again
+    ARRIVALS_BATCH_CONCURRENCY: int = 6
+    ARRIVALS_FRESH_SECONDS: int = 30
+    # Notifications: the leader evaluates subscriptions every NOTIFICATION_POLL_SECONDS;
+    # failed deliveries are retried with exponential backoff up to NOTIFICATION_MAX_ATTEMPTS.
+    # NOTIFICATION_SINK is "log", "memory" (local testing) or "webhook" (POST to NOTIFICATION_WEBHOOK_URL)
+    NOTIFICATIONS_ENABLED: bool = True
+    NOTIFICATION_POLL_SECONDS: int = 30
+    NOTIFICATION_MAX_ATTEMPTS: int = 5
+    NOTIFICATION_RETRY_BASE_SECONDS: float = 2.0
+    NOTIFICATION_SINK: str = "log"
+    NOTIFICATION_WEBHOOK_URL: Optional[str] = None
+    # Arrival history (app/services/arrival_recorder.py) and the delay stats read from it
+    # (app/services/delay_analytics.py)
+    ARRIVAL_RECORDER_ENABLED: bool = True
+    ARRIVAL_RECORDER_FLUSH_SECONDS: int = 15
+    ARRIVAL_RECORDER_MAX_BUFFER: int = 50000
+    DELAY_ARRIVAL_MINUTES: int = 1
+    DELAY_HISTORY_DAYS: int = 28
+    DELAY_MIN_SAMPLES: int = 20
+    DELAY_CACHE_SECONDS: int = 3600
+    # GTFS-Realtime snapshots (app/services/realtime_feed.py); polling is stretched to spend
+    # at most GTFS_RT_BUDGET_SHARE of the 511 background quota
+    GTFS_RT_ENABLED: bool = False
+    GTFS_RT_AGENCIES: List[str] = ["muni"]
+    GTFS_RT_VEHICLE_POSITIONS: bool = False
+    GTFS_RT_POLL_SECONDS: int = 180
+    GTFS_RT_BUDGET_SHARE: float = 0.5
+    GTFS_RT_SYNC_SECONDS: int = 5
+    GTFS_RT_MAX_AGE_SECONDS: int = 420
+    GTFS_RT_HORIZON_MINUTES: int = 90
+    # BART board (app/services/bart_board.py): all stations' departures from one etd.aspx?orig=ALL call
+    BART_BOARD_ENABLED: bool = True
+    BART_BOARD_POLL_SECONDS: int = 30
+    BART_BOARD_SYNC_SECONDS: int = 5
+    BART_BOARD_MAX_AGE_SECONDS: int = 120
+    # Static tiles (app/services/static_tiles.py): map data exported per feed version for Caddy to serve
+    STATIC_TILES_ENABLED: bool = False
+    STATIC_TILES_DIR: str = str(Path(__file__).resolve().parent.parent / "static_tiles")
+    STATIC_TILES_URL: str = "/tiles"
+    STATIC_TILES_ZOOMS: List[int] = [12, 14]
+    STATIC_TILES_CHECK_SECONDS: int = 3600
+    # Request profiling (app/utils/profiling.py), served at /admin/profiles to ADMIN_TOKEN holders
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: Optional[str] = None
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_KEEP: int = 50
+    PROFILING_TTL: int = 86400
+    ADMIN_TOKEN: Optional[str] = None
+
+    # Point both 511 and BART at the local stand-in (backend/mock_upstream), e.g. http://127.0.0.1:8099
+    UPSTREAM_MOCK_URL: Optional[str] = None
+
     DEFAULT_AGENCY: str = "SF"
 
     GTFS_AGENCIES: List[str] = ["muni", "bart"]
@@ -54,16 +160,19 @@ class Settings(BaseSettings):
         "bart": "/app/gtfs_data/bart_gtfs-current"
     }
 
+    @model_validator(mode="after")
+    def use_mock_upstream(self):
+        if self.UPSTREAM_MOCK_URL:
+            base = self.UPSTREAM_MOCK_URL.rstrip("/")
+            self.TRANSIT_511_BASE_URL = f"{base}/transit"
+            self.BART_API_BASE_URL = f"{base}/api"
+        return self
+
     def normalize_agency(self, agency: str, to_511: bool = False) -> str:
-        agency = agency.strip().lower()
-        muni_aliases = {"sf", "sfmta", "muni"}
-        bart_aliases = {"ba", "bart"}
-
-        if agency in muni_aliases:
-            return "SF" if to_511 else "muni"
-        elif agency in bart_aliases:
-            return "BA" if to_511 else "bart"
-        return agency.upper() if to_511 else agency.lower()
+        # The registry reads these settings, so it is imported on first use
+        from app.services.agency_registry import agency_registry
+
+        return agency_registry.operator_id(agency) if to_511 else agency_registry.normalize(agency)
 
     class Config:
         env_file = ".env"
@@ -1,26 +1,38 @@
-import os
-from dotenv import load_dotenv
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-load_dotenv()
+from app.config import settings
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is not set in the .env file")
+# The engine is created on first use (normally by init_db in the app lifespan), not at import
+_engine: Optional[Engine] = None
 
-DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+Base = declarative_base()
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    echo=DEBUG
-)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+def get_engine() -> Engine:
+    """Return the process-wide engine, creating it (and binding SessionLocal) on first call."""
+    global _engine
+    if _engine is None:
+        if not settings.DATABASE_URL:
+            raise RuntimeError("DATABASE_URL is not set in the .env file")
+        _engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True, echo=settings.DEBUG)
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def __getattr__(name: str):
+    # `from app.db.database import engine` keeps working for scripts and gunicorn hooks
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -28,7 +40,8 @@ def get_db():
         db.close()
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
 def cleanup_db():
-    engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
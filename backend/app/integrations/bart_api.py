@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.schemas.transit import Arrival, StopArrivals
+
+# Board entry per departure (parse_bart_board), in arrival order within a station
+ARRIVAL, ROUTE, DESTINATION, DIRECTION, PLATFORM, COLOR, HEXCOLOR, LENGTH, DELAY = range(9)
+
+
+def _estimates(station: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any], int, str]]:
+    """(etd, estimate, minutes until departure, direction) for each estimate at a station."""
+    for etd in station.get("etd", []):
+        for estimate in etd.get("estimate", []):
+            minutes = estimate.get("minutes")
+            minutes_until = 0 if minutes == "Leaving" else int(minutes)
+            direction = "outbound" if estimate.get("direction", "").lower() == "south" else "inbound"
+            yield etd, estimate, minutes_until, direction
+
+
+def parse_bart_etd(raw: Dict[str, Any], stop_code: str, now: Optional[datetime] = None) -> StopArrivals:
+    """
+    Convert a BART etd.aspx JSON response into typed arrivals in one pass.
+    Southbound trains are `outbound`, everything else `inbound` (as the app always has).
+    """
+    now = now or datetime.now(timezone.utc)
+    result = StopArrivals(agency="bart", stop_code=stop_code)
+
+    stations = raw.get("root", {}).get("station", [])
+    if not stations:
+        return result
+
+    for etd, estimate, minutes_until, direction in _estimates(stations[0]):
+        arrival = Arrival(
+            route_number=etd.get("abbreviation"),
+            destination=etd.get("destination"),
+            direction=direction,
+            arrival_time=(now + timedelta(minutes=minutes_until)).isoformat(timespec="seconds"),
+            minutes_until=minutes_until,
+            status="Due" if minutes_until == 0 else f"{minutes_until} min",
+            platform=estimate.get("platform"),
+            color=estimate.get("color"),
+            hexcolor=estimate.get("hexcolor"),
+            length=estimate.get("length"),
+            # BART reports how late the train is running; 0 when on time
+            delay_seconds=int(estimate.get("delay") or 0),
+        )
+        getattr(result, direction).append(arrival)
+
+    result.inbound.sort(key=lambda a: a.minutes_until)
+    result.outbound.sort(key=lambda a: a.minutes_until)
+    return result
+
+
+def parse_bart_board(raw: Dict[str, Any], fetched_at: float) -> Tuple[Dict[str, str], Dict[str, List[list]]]:
+    """
+    Parse an etd.aspx?orig=ALL response once for every station: ({abbr: name},
+    {abbr: [entry, ...]}) with board entries as plain lists (fields above) so the
+    whole board serializes compactly. ARRIVAL is epoch seconds from `fetched_at`.
+    """
+    names: Dict[str, str] = {}
+    board: Dict[str, List[list]] = {}
+    for station in raw.get("root", {}).get("station", []):
+        abbr = str(station.get("abbr", "")).upper()
+        if not abbr:
+            continue
+        names[abbr] = station.get("name") or abbr
+        entries = [
+            [
+                fetched_at + minutes_until * 60,
+                etd.get("abbreviation"),
+                etd.get("destination"),
+                direction,
+                estimate.get("platform"),
+                estimate.get("color"),
+                estimate.get("hexcolor"),
+                estimate.get("length"),
+                int(estimate.get("delay") or 0),
+            ]
+            for etd, estimate, minutes_until, direction in _estimates(station)
+        ]
+        entries.sort(key=lambda entry: entry[ARRIVAL])
+        board[abbr] = entries
+    return names, board
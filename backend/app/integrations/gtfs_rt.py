@@ -0,0 +1,181 @@
+"""
+Minimal GTFS-Realtime (protobuf) decoder for TripUpdates and VehiclePositions feeds.
+
+Reads the protobuf wire format directly and keeps only the fields the app uses, so no
+generated bindings or protobuf runtime are needed; unknown and unused fields are
+skipped by wire type without being decoded. Field numbers follow gtfs-realtime.proto.
+"""
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+VARINT, FIXED64, LENGTH, FIXED32 = 0, 1, 2, 5
+
+_float = struct.Struct("<f").unpack_from
+
+
+def _varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _signed(value: int) -> int:
+    # int32/int64 negatives are sent as 64-bit two's complement
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _fields(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, Any]]:
+    """(field number, wire type, value) for each field; LENGTH values are (start, end) offsets."""
+    pos, end = start, len(data) if end is None else end
+    while pos < end:
+        key, pos = _varint(data, pos)
+        number, wire = key >> 3, key & 7
+        if wire == VARINT:
+            value, pos = _varint(data, pos)
+        elif wire == LENGTH:
+            size, pos = _varint(data, pos)
+            value = (pos, pos + size)
+            pos += size
+        elif wire == FIXED32:
+            value = data[pos:pos + 4]
+            pos += 4
+        elif wire == FIXED64:
+            value = data[pos:pos + 8]
+            pos += 8
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield number, wire, value
+
+
+def _text(data: bytes, span: Tuple[int, int]) -> str:
+    return data[span[0]:span[1]].decode("utf-8", "replace")
+
+
+def _trip(data: bytes, span: Tuple[int, int]) -> Dict[str, Any]:
+    """TripDescriptor: trip_id = 1, start_date = 3, route_id = 5, direction_id = 6."""
+    trip: Dict[str, Any] = {}
+    for number, _, value in _fields(data, *span):
+        if number == 1:
+            trip["trip_id"] = _text(data, value)
+        elif number == 5:
+            trip["route_id"] = _text(data, value)
+        elif number == 6:
+            trip["direction_id"] = value
+        elif number == 3:
+            trip["start_date"] = _text(data, value)
+    return trip
+
+
+def _vehicle_id(data: bytes, span: Tuple[int, int]) -> Optional[str]:
+    """VehicleDescriptor: id = 1, label = 2 (used when there is no id)."""
+    vehicle_id = label = None
+    for number, _, value in _fields(data, *span):
+        if number == 1:
+            vehicle_id = _text(data, value)
+        elif number == 2:
+            label = _text(data, value)
+    return vehicle_id or label
+
+
+def _event(data: bytes, span: Tuple[int, int]) -> Tuple[Optional[int], Optional[int]]:
+    """StopTimeEvent: (delay = 1, time = 2)."""
+    delay = time = None
+    for number, _, value in _fields(data, *span):
+        if number == 1:
+            delay = _signed(value)
+        elif number == 2:
+            time = _signed(value)
+    return delay, time
+
+
+def _stop_time_update(data: bytes, span: Tuple[int, int]) -> Dict[str, Any]:
+    """StopTimeUpdate: stop_sequence = 1, arrival = 2, departure = 3, stop_id = 4, schedule_relationship = 5."""
+    update: Dict[str, Any] = {"stop_sequence": None, "stop_id": None, "delay": None, "time": None, "skipped": False}
+    departure = (None, None)
+    for number, _, value in _fields(data, *span):
+        if number == 1:
+            update["stop_sequence"] = value
+        elif number == 4:
+            update["stop_id"] = _text(data, value)
+        elif number == 2:
+            update["delay"], update["time"] = _event(data, value)
+        elif number == 3:
+            departure = _event(data, value)
+        elif number == 5:
+            update["skipped"] = value == 1  # SKIPPED
+    # Origin stops often only carry a departure
+    if update["delay"] is None:
+        update["delay"] = departure[0]
+    if update["time"] is None:
+        update["time"] = departure[1]
+    return update
+
+
+def _trip_update(data: bytes, span: Tuple[int, int]) -> Dict[str, Any]:
+    """TripUpdate: trip = 1, stop_time_update = 2, vehicle = 3, timestamp = 4, delay = 5."""
+    update: Dict[str, Any] = {"trip": {}, "vehicle_id": None, "stop_time_updates": [], "delay": None}
+    for number, _, value in _fields(data, *span):
+        if number == 2:
+            update["stop_time_updates"].append(_stop_time_update(data, value))
+        elif number == 1:
+            update["trip"] = _trip(data, value)
+        elif number == 3:
+            update["vehicle_id"] = _vehicle_id(data, value)
+        elif number == 5:
+            update["delay"] = _signed(value)
+    return update
+
+
+def _vehicle_position(data: bytes, span: Tuple[int, int]) -> Dict[str, Any]:
+    """VehiclePosition: trip = 1, position = 2 (latitude = 1, longitude = 2, bearing = 3), vehicle = 8, stop_id = 7."""
+    vehicle: Dict[str, Any] = {"trip": {}, "vehicle_id": None, "lat": None, "lon": None, "stop_id": None}
+    for number, _, value in _fields(data, *span):
+        if number == 2:
+            for field, wire, raw in _fields(data, *value):
+                if wire == FIXED32 and field in (1, 2):
+                    vehicle["lat" if field == 1 else "lon"] = round(_float(raw)[0], 6)
+        elif number == 1:
+            vehicle["trip"] = _trip(data, value)
+        elif number == 8:
+            vehicle["vehicle_id"] = _vehicle_id(data, value)
+        elif number == 7:
+            vehicle["stop_id"] = _text(data, value)
+    return vehicle
+
+
+def decode_feed(data: bytes) -> Dict[str, Any]:
+    """
+    Decode a FeedMessage into {"timestamp", "trip_updates", "vehicles"}.
+    FeedMessage: header = 1 (timestamp = 3), entity = 2; FeedEntity: trip_update = 3, vehicle = 4, is_deleted = 2.
+    """
+    feed: Dict[str, Any] = {"timestamp": None, "trip_updates": [], "vehicles": []}
+    trip_updates: List[Dict[str, Any]] = feed["trip_updates"]
+    vehicles: List[Dict[str, Any]] = feed["vehicles"]
+    for number, _, value in _fields(data):
+        if number == 2:
+            trip_update = vehicle = None
+            deleted = False
+            for field, wire, entity_value in _fields(data, *value):
+                if field == 3:
+                    trip_update = _trip_update(data, entity_value)
+                elif field == 4:
+                    vehicle = _vehicle_position(data, entity_value)
+                elif field == 2 and wire == VARINT:
+                    deleted = bool(entity_value)
+            # Incremental feeds only; a full dataset never marks entities deleted
+            if deleted:
+                continue
+            if trip_update is not None:
+                trip_updates.append(trip_update)
+            if vehicle is not None:
+                vehicles.append(vehicle)
+        elif number == 1:
+            for field, wire, header_value in _fields(data, *value):
+                if field == 3 and wire == VARINT:
+                    feed["timestamp"] = header_value
+    return feed
@@ -0,0 +1,130 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.services.debug_logger import log_debug
+from app.utils.cache import get_async_redis
+from app.utils.metrics import record_budget
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+# Refill and take atomically. KEYS[1] bucket hash; ARGV: capacity, refill/sec, now, cost, floor.
+# A request is granted only if at least `floor` tokens remain after taking `cost`, which is
+# how background work leaves a reserve for interactive requests.
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local floor = tonumber(ARGV[5])
+local state = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens - cost >= floor then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('hset', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('expire', KEYS[1], math.ceil(capacity / rate) + 60)
+return {allowed, tostring(tokens)}
+"""
+
+
+class UpstreamBudgetExceeded(Exception):
+    """Raised instead of calling an upstream whose request budget is spent."""
+
+    def __init__(self, upstream: str, priority: str):
+        super().__init__(f"{upstream} request budget exhausted for {priority} traffic")
+        self.upstream = upstream
+        self.priority = priority
+
+
+class TokenBucket:
+    """
+    Request budget for one upstream, shared by every worker through Redis.
+
+    The bucket holds up to `capacity` tokens and refills at quota/window per second,
+    so sustained usage stays inside the provider's quota while short bursts are allowed.
+    Background refreshes may only spend tokens above `reserve`; interactive requests
+    can use all of them. If Redis is unreachable each worker falls back to a local
+    bucket holding its 1/WEB_CONCURRENCY share.
+    """
+
+    def __init__(self, upstream: str, quota: int, window: int, capacity: Optional[int] = None,
+                 reserve_fraction: float = 0.25):
+        self.upstream = upstream
+        self.key = f"munibuddy:ratelimit:{upstream}"
+        self.rate = quota / window
+        self.capacity = float(capacity or quota)
+        self.reserve = self.capacity * reserve_fraction
+        self._local: Tuple[float, float] = (self.capacity, time.time())
+
+    def _floor(self, priority: str) -> float:
+        return self.reserve if priority == BACKGROUND else 0.0
+
+    def _take_local(self, priority: str, cost: float) -> Tuple[bool, float]:
+        share = max(settings.WEB_CONCURRENCY, 1)
+        capacity, rate = self.capacity / share, self.rate / share
+        tokens, ts = self._local
+        now = time.time()
+        tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+        allowed = tokens - cost >= self._floor(priority) / share
+        if allowed:
+            tokens -= cost
+        self._local = (tokens, now)
+        return allowed, tokens
+
+    async def acquire(self, priority: str = INTERACTIVE, cost: float = 1.0) -> bool:
+        """Take `cost` tokens if the budget allows it for this priority class."""
+        try:
+            allowed, tokens = await get_async_redis().eval(
+                _TAKE_SCRIPT, 1, self.key, self.capacity, self.rate, time.time(), cost, self._floor(priority)
+            )
+            allowed, tokens = bool(allowed), float(tokens)
+        except Exception as e:
+            log_debug(f"[RateLimit] ⚠️ Redis unavailable for {self.upstream} ({e}); using local budget")
+            allowed, tokens = self._take_local(priority, cost)
+        record_budget(self.upstream, priority, "allowed" if allowed else "denied", tokens)
+        return allowed
+
+    async def drain(self):
+        """Empty the bucket, e.g. after the provider answered 429, so no worker keeps retrying."""
+        self._local = (0.0, time.time())
+        try:
+            await get_async_redis().hset(self.key, mapping={"tokens": 0, "ts": time.time()})
+        except Exception as e:
+            log_debug(f"[RateLimit] ⚠️ Failed to drain {self.upstream} budget: {e}")
+
+
+def _build_buckets() -> Dict[str, TokenBucket]:
+    buckets = {}
+    if settings.UPSTREAM_511_QUOTA > 0:
+        buckets["511"] = TokenBucket(
+            "511",
+            quota=settings.UPSTREAM_511_QUOTA,
+            window=settings.UPSTREAM_511_QUOTA_WINDOW,
+            capacity=settings.UPSTREAM_511_BURST or None,
+            reserve_fraction=settings.UPSTREAM_BACKGROUND_RESERVE,
+        )
+    return buckets
+
+
+# Upstreams without an entry (BART) are not budgeted
+buckets: Dict[str, TokenBucket] = _build_buckets()
+
+
+async def drain_budget(upstream: str):
+    bucket = buckets.get(upstream)
+    if bucket is not None:
+        await bucket.drain()
+
+
+async def acquire_budget(upstream: str, priority: str = INTERACTIVE):
+    """Raise UpstreamBudgetExceeded if `upstream` has no budget left for `priority`."""
+    bucket = buckets.get(upstream)
+    if bucket is not None and not await bucket.acquire(priority):
+        raise UpstreamBudgetExceeded(upstream, priority)
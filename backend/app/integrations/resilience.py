@@ -0,0 +1,142 @@
+import time
+from collections import deque
+from typing import Deque, Dict
+
+import httpx
+
+from app.config import settings
+from app.services.debug_logger import log_debug
+from app.utils.metrics import record_circuit_state
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"{upstream} circuit open, retrying in {retry_in:.0f}s")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for adaptive timeouts and hedge delays."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def timeout(self, cap: float) -> float:
+        """p99 × UPSTREAM_TIMEOUT_FACTOR, clamped to [UPSTREAM_MIN_TIMEOUT, cap]; `cap` until warmed up."""
+        if len(self.samples) < settings.UPSTREAM_MIN_SAMPLES:
+            return cap
+        adaptive = self.percentile(99) * settings.UPSTREAM_TIMEOUT_FACTOR
+        return max(settings.UPSTREAM_MIN_TIMEOUT, min(cap, adaptive))
+
+    def hedge_delay(self) -> float:
+        """Send a hedged request once the first has run longer than p95."""
+        if len(self.samples) < settings.UPSTREAM_MIN_SAMPLES:
+            return settings.UPSTREAM_HEDGE_MIN_DELAY * 4
+        return max(settings.UPSTREAM_HEDGE_MIN_DELAY, self.percentile(95))
+
+
+class CircuitBreaker:
+    """
+    Per-upstream, per-worker circuit breaker.
+
+    Opens when the failure rate over the last `window` calls reaches
+    UPSTREAM_BREAKER_FAILURE_RATE (with at least UPSTREAM_BREAKER_MIN_CALLS calls);
+    while open, calls fail fast with CircuitOpenError. After UPSTREAM_BREAKER_COOLDOWN
+    one probe is let through (half-open): success closes the circuit, failure re-opens it.
+    Timeouts, connection errors and 5xx count as failures; 4xx and 429 do not.
+    """
+
+    def __init__(self, upstream: str, window: int = 20):
+        self.upstream = upstream
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        record_circuit_state(upstream, self.state)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            log_debug(f"[Circuit] {'🔴' if state == OPEN else '🟡' if state == HALF_OPEN else '🟢'} "
+                      f"{self.upstream}: {self.state} -> {state}")
+            self.state = state
+            record_circuit_state(self.upstream, state)
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls to this upstream should fail fast right now."""
+        if self.state == OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < settings.UPSTREAM_BREAKER_COOLDOWN:
+                raise CircuitOpenError(self.upstream, settings.UPSTREAM_BREAKER_COOLDOWN - elapsed)
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.probe_in_flight:
+                raise CircuitOpenError(self.upstream, 0)
+            self.probe_in_flight = True
+
+    def record(self, success: bool):
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+            self.outcomes.clear()
+            if success:
+                self._set_state(CLOSED)
+            else:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+            return
+
+        self.outcomes.append(success)
+        failures = self.outcomes.count(False)
+        if (len(self.outcomes) >= settings.UPSTREAM_BREAKER_MIN_CALLS
+                and failures / len(self.outcomes) >= settings.UPSTREAM_BREAKER_FAILURE_RATE):
+            self.opened_at = time.monotonic()
+            self.outcomes.clear()
+            self._set_state(OPEN)
+
+
+def is_failure(response: httpx.Response) -> bool:
+    return response.status_code >= 500
+
+
+def failure_reason(error: Exception) -> str:
+    """Low-cardinality label for why an upstream call did not produce data."""
+    from app.integrations.rate_limiter import UpstreamBudgetExceeded
+
+    if isinstance(error, UpstreamBudgetExceeded):
+        return "budget"
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.HTTPStatusError):
+        if error.response.status_code == 429:
+            return "rate_limited"
+        return f"http_{error.response.status_code // 100}xx"
+    return "error"
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    if upstream not in _breakers:
+        _breakers[upstream] = CircuitBreaker(upstream)
+    return _breakers[upstream]
+
+
+def get_latency(upstream: str) -> LatencyTracker:
+    if upstream not in _latencies:
+        _latencies[upstream] = LatencyTracker()
+    return _latencies[upstream]
@@ -1,17 +1,87 @@
-from typing import List, Dict, Any
-import httpx
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
 import asyncio
 from app.config import settings
+from app.integrations.rate_limiter import UpstreamBudgetExceeded
+from app.integrations.upstream import upstream_get
 from app.services.debug_logger import log_debug
-from app.services.stop_helper import load_stops, find_nearby_stops
+from app.utils.metrics import time_section
+from app.services.stop_helper import nearby_stops as stops_near
+from app.schemas.transit import Arrival, StopArrivals, Vehicle
+
+INBOUND_REFS = {"IB", "INBOUND", "N", "NORTH"}
 
 def normalize_agency(agency: str) -> str:
-    agency = agency.lower()
-    if agency in ["sf", "muni", "sfmta"]:
-        return "SF"
-    elif agency in ["ba", "bart"]:
-        return "BA"
-    return agency.upper()
+    """511 operator id for an agency name ("muni" -> "SF")."""
+    return settings.normalize_agency(agency, to_511=True)
+
+def _as_list(value: Any) -> List[Any]:
+    """511 returns a single object instead of a one-element list in some places."""
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _as_float(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_stop_monitoring(data: Dict[str, Any], stop_code: str, agency: str = "muni",
+                          now: Optional[datetime] = None) -> StopArrivals:
+    """
+    Convert a 511 StopMonitoring response into typed arrivals in one pass over the visits,
+    keeping only the modelled fields.
+    """
+    now = now or datetime.now(timezone.utc)
+    result = StopArrivals(agency=agency, stop_code=stop_code)
+
+    deliveries = _as_list(data.get("ServiceDelivery", {}).get("StopMonitoringDelivery"))
+    for delivery in deliveries:
+        for visit in _as_list(delivery.get("MonitoredStopVisit")):
+            journey = visit.get("MonitoredVehicleJourney") or {}
+            call = journey.get("MonitoredCall") or {}
+            location = journey.get("VehicleLocation") or {}
+            expected = call.get("ExpectedArrivalTime") or call.get("ExpectedDepartureTime")
+            aimed = call.get("AimedArrivalTime") or call.get("AimedDepartureTime")
+            arrival_time = expected or aimed
+
+            minutes_until = None
+            if arrival_time:
+                try:
+                    delta = datetime.fromisoformat(arrival_time) - now
+                    minutes_until = max(0, round(delta.total_seconds() / 60))
+                except ValueError:
+                    pass
+
+            direction = "inbound" if str(journey.get("DirectionRef", "")).upper() in INBOUND_REFS else "outbound"
+            line = journey.get("LineRef")
+            name = journey.get("PublishedLineName")
+            arrival = Arrival(
+                route_number=f"{line} {name}".strip() if line and name and name != line else (line or name),
+                destination=call.get("DestinationDisplay") or journey.get("DestinationName"),
+                direction=direction,
+                arrival_time=arrival_time,
+                scheduled_time=aimed,
+                minutes_until=minutes_until,
+                status="Unknown" if minutes_until is None else ("Due" if minutes_until == 0 else f"{minutes_until} min"),
+                is_realtime=bool(expected),
+                vehicle=Vehicle(
+                    vehicle_id=journey.get("VehicleRef"),
+                    lat=_as_float(location.get("Latitude")),
+                    lon=_as_float(location.get("Longitude")),
+                ),
+                trip_id=(journey.get("FramedVehicleJourneyRef") or {}).get("DatedVehicleJourneyRef"),
+            )
+            getattr(result, direction).append(arrival)
+
+    unknown = float("inf")
+    result.inbound.sort(key=lambda a: unknown if a.minutes_until is None else a.minutes_until)
+    result.outbound.sort(key=lambda a: unknown if a.minutes_until is None else a.minutes_until)
+    return result
+
 
 async def fetch_siri_data(lat: float, lon: float, agency: str = "muni", radius: float = 0.15) -> Dict[str, Any]:
     """
@@ -19,8 +89,7 @@ async def fetch_siri_data(lat: float, lon: float, agency: str = "muni", radius:
     Returns parsed real-time results with route, destination, vehicle info, etc.
     """
     normalized_agency = settings.normalize_agency(agency)
-    stops = load_stops(normalized_agency)
-    nearby_stops = find_nearby_stops(lat, lon, stops, radius)
+    nearby_stops = [stop for _, stop in stops_near(lat, lon, radius, normalized_agency, limit=10)]
 
     stop_codes = [stop["stop_code"] or stop["stop_id"] for stop in nearby_stops]
     if not stop_codes:
@@ -31,48 +100,37 @@ async def fetch_siri_data(lat: float, lon: float, agency: str = "muni", radius:
     headers = {"accept": "application/json"}
     results = {"inbound": [], "outbound": []}
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        tasks = []
-        for stop_code in stop_codes:
-            params = {
-                "api_key": settings.API_KEY,
-                "agency": normalize_agency(agency),
-                "stopCode": stop_code,
-                "format": "json"
-            }
-            tasks.append(client.get(url, params=params, headers=headers))
-
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for stop_code, response in zip(stop_codes, responses):
-            if isinstance(response, Exception):
-                log_debug(f"[SIRI] ❌ Failed for stop {stop_code}: {response}")
-                continue
-
-            try:
-                data = response.json()
-                visits = data.get("ServiceDelivery", {}).get("StopMonitoringDelivery", [{}])[0].get("MonitoredStopVisit", [])
-                for visit in visits:
-                    journey = visit.get("MonitoredVehicleJourney", {})
-                    call = journey.get("MonitoredCall", {})
-                    direction = journey.get("DirectionRef", "").upper()
-                    entry = {
-                        "stop_code": stop_code,
-                        "route": journey.get("PublishedLineName"),
-                        "destination": journey.get("DestinationName"),
-                        "arrival_time": call.get("ExpectedArrivalTime") or call.get("AimedArrivalTime"),
-                        "status": "Due",
-                        "vehicle": journey.get("VehicleRef"),
-                        "lat": journey.get("VehicleLocation", {}).get("Latitude"),
-                        "lon": journey.get("VehicleLocation", {}).get("Longitude")
-                    }
-                    if direction == "IB":
-                        results["inbound"].append(entry)
-                    else:
-                        results["outbound"].append(entry)
-
-            except Exception as e:
-                log_debug(f"[SIRI] ❌ JSON parse or visit extraction failed for {stop_code}: {e}")
+    agency_511 = normalize_agency(agency)
+    tasks = []
+    for stop_code in stop_codes:
+        params = {
+            "api_key": settings.API_KEY,
+            "agency": agency_511,
+            "stopCode": stop_code,
+            "format": "json"
+        }
+        tasks.append(upstream_get("511", normalized_agency, "StopMonitoring", url, params=params, headers=headers))
+
+    responses = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for stop_code, response in zip(stop_codes, responses):
+        if isinstance(response, UpstreamBudgetExceeded):
+            log_debug(f"[SIRI] ⚠️ Skipped stop {stop_code}: {response}")
+            continue
+        if isinstance(response, Exception):
+            log_debug(f"[SIRI] ❌ Failed for stop {stop_code}: {response}")
+            continue
+
+        try:
+            with time_section("siri_parse"):
+                parsed = parse_stop_monitoring(response.json(), stop_code, normalized_agency)
+            for direction in ("inbound", "outbound"):
+                results[direction].extend(
+                    {"stop_code": stop_code, **arrival.model_dump()} for arrival in getattr(parsed, direction)
+                )
+
+        except Exception as e:
+            log_debug(f"[SIRI] ❌ JSON parse or visit extraction failed for {stop_code}: {e}")
 
     return results
 
@@ -88,27 +146,26 @@ async def fetch_siri_data_multi(stop_codes: List[str], agency: str = "bart") ->
 
     results = {}
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        tasks = []
-        for stop_code in stop_codes:
-            params = {
-                "api_key": settings.API_KEY,
-                "agency": normalized_agency,
-                "stopCode": stop_code,
-                "format": "json"
-            }
-            tasks.append(client.get(url, params=params, headers=headers))
-
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for stop_code, response in zip(stop_codes, responses):
-            if isinstance(response, Exception):
-                log_debug(f"[SIRI MULTI] ❌ Failed for stop {stop_code}: {response}")
-                continue
-            try:
-                results[stop_code] = response.json()
-            except Exception as e:
-                log_debug(f"[SIRI MULTI] ❌ Failed to parse JSON for {stop_code}: {e}")
-                results[stop_code] = {}
+    tasks = []
+    for stop_code in stop_codes:
+        params = {
+            "api_key": settings.API_KEY,
+            "agency": normalized_agency,
+            "stopCode": stop_code,
+            "format": "json"
+        }
+        tasks.append(upstream_get("511", settings.normalize_agency(agency), "StopMonitoring", url, params=params, headers=headers))
+
+    responses = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for stop_code, response in zip(stop_codes, responses):
+        if isinstance(response, Exception):
+            log_debug(f"[SIRI MULTI] ❌ Failed for stop {stop_code}: {response}")
+            continue
+        try:
+            results[stop_code] = response.json()
+        except Exception as e:
+            log_debug(f"[SIRI MULTI] ❌ Failed to parse JSON for {stop_code}: {e}")
+            results[stop_code] = {}
 
     return results
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config import settings
+from app.integrations.rate_limiter import BACKGROUND, INTERACTIVE, UpstreamBudgetExceeded, acquire_budget
+from app.integrations.resilience import HALF_OPEN, CircuitOpenError, get_breaker, get_latency, is_failure
+from app.utils.metrics import observe_upstream, record_hedge
+
+# One pooled client per worker process, created lazily inside the event loop
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=settings.UPSTREAM_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _hedged_get(upstream: str, url: str, params, headers, timeout: float) -> httpx.Response:
+    """
+    Send the GET; if it has not answered within the upstream's hedge delay (p95), send a
+    second identical request and return whichever succeeds first. Hedges for budgeted
+    upstreams only go out if the background share of the budget allows it.
+    """
+    client = get_client()
+    tasks = []
+
+    def send():
+        task = asyncio.create_task(client.get(url, params=params, headers=headers, timeout=timeout))
+        tasks.append(task)
+        return task
+
+    try:
+        first = send()
+        done, _ = await asyncio.wait({first}, timeout=get_latency(upstream).hedge_delay())
+        if done:
+            return first.result()
+        try:
+            await acquire_budget(upstream, BACKGROUND)
+        except UpstreamBudgetExceeded:
+            return await first
+
+        record_hedge(upstream)
+        pending = {first, send()}
+        failed = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and not is_failure(task.result()):
+                    return task.result()
+                failed = task
+        return failed.result()  # both failed: surface the last response or exception
+    finally:
+        # Also reached when the caller is cancelled, so no request outlives it
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def upstream_get(
+    upstream: str,
+    agency: str,
+    endpoint: str,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    priority: str = INTERACTIVE,
+    hedge: bool = True,
+) -> httpx.Response:
+    """
+    GET an upstream transit API through the shared client, recording latency and outcome.
+    `upstream` is the provider ("511", "bart"), `endpoint` a low-cardinality name
+    such as "StopMonitoring" or "etd".
+
+    Raises without calling out when the upstream's circuit breaker is open
+    (CircuitOpenError) or, for budgeted upstreams (511), when `priority` has no tokens
+    left (UpstreamBudgetExceeded). Interactive calls time out adaptively at
+    p99 × UPSTREAM_TIMEOUT_FACTOR, capped at UPSTREAM_SLO_SECONDS; background calls
+    are capped at UPSTREAM_TIMEOUT. Slow calls are hedged when UPSTREAM_HEDGE is on.
+    """
+    breaker = get_breaker(upstream)
+    try:
+        breaker.before_call()
+    except CircuitOpenError:
+        observe_upstream(upstream, agency, endpoint, "circuit_open", None)
+        raise
+    try:
+        await acquire_budget(upstream, priority)
+    except UpstreamBudgetExceeded:
+        if breaker.state == HALF_OPEN:
+            breaker.probe_in_flight = False
+        observe_upstream(upstream, agency, endpoint, "budget", None)
+        raise
+
+    latency = get_latency(upstream)
+    cap = settings.UPSTREAM_SLO_SECONDS if priority == INTERACTIVE else settings.UPSTREAM_TIMEOUT
+    timeout = latency.timeout(cap)
+
+    start = time.perf_counter()
+    status = "error"
+    success = False
+    try:
+        if hedge and settings.UPSTREAM_HEDGE:
+            response = await _hedged_get(upstream, url, params, headers, timeout)
+        else:
+            response = await get_client().get(url, params=params, headers=headers, timeout=timeout)
+        status = str(response.status_code)
+        success = not is_failure(response)
+        if success:
+            latency.observe(time.perf_counter() - start)
+        return response
+    except httpx.TimeoutException:
+        status = "timeout"
+        raise
+    finally:
+        breaker.record(success)
+        observe_upstream(upstream, agency, endpoint, status, time.perf_counter() - start)
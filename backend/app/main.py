@@ -1,19 +1,86 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, Response
 
-from app.db.database import init_db
+from app.config import settings
+from app.db.database import cleanup_db, init_db
+from app.services.warmup_service import warmup_service
+from app.services.leader_election import leader_tasks
+from app.services.notification_service import notification_service
+from app.services.arrival_recorder import arrival_recorder
+from app.services.realtime_feed import realtime_feed
+from app.services.bart_board import bart_board
+from app.services.static_tiles import static_tiles
+from app.integrations.upstream import close_client, get_client
+from app.utils.cache import close_redis
+from app.utils.metrics import MetricsMiddleware, render_metrics
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.responses import CompactResponseMiddleware, FastJSONResponse
 from app.routers.nearby_stops import router as nearby_stops_router
 from app.routers.bus_router import router as bus_router
 from app.routers.bart_router import router as bart_router
 from app.routers.stop_schedule import router as stop_schedule_router
+from app.routers.fares_router import router as fares_router
+from app.routers.route_timetable import router as route_timetable_router
+from app.routers.arrivals_router import router as arrivals_router
+from app.routers.notifications import router as notifications_router
+from app.routers.search_router import router as search_router
+from app.routers.analytics_router import router as analytics_router
+from app.routers.isochrone_router import router as isochrone_router
+from app.routers.tiles_router import router as tiles_router
+from app.routers.trip_progress_router import router as trip_progress_router
+from app.routers.admin_router import router as admin_router
 from app.routers import routes_router
-load_dotenv()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create clients and start background work when the server starts, not at import,
+    so importing app.main stays cheap and forked workers never share live connections.
+    """
+    print("🔄 Starting MuniBuddy API...")
+    init_db()
+    print("✅ Database initialized")
+    get_client()
+    if settings.WARMUP_ON_STARTUP and not warmup_service.ready:
+        # Warm in the background so /health and /ready answer while indexes load
+        app.state.warmup_task = asyncio.create_task(warmup_service.run())
+    if settings.NOTIFICATIONS_ENABLED:
+        notification_service.start()
+        leader_tasks.register("notifications", settings.NOTIFICATION_POLL_SECONDS, notification_service.evaluate)
+    if settings.ARRIVAL_RECORDER_ENABLED:
+        arrival_recorder.start()
+    if settings.GTFS_RT_ENABLED:
+        realtime_feed.snapshots.start()
+        leader_tasks.register("gtfs_realtime", realtime_feed.poll_seconds(), realtime_feed.poll)
+    if settings.BART_BOARD_ENABLED:
+        bart_board.snapshots.start()
+        leader_tasks.register("bart_board", settings.BART_BOARD_POLL_SECONDS, bart_board.poll)
+    if settings.STATIC_TILES_ENABLED:
+        leader_tasks.register("static_tiles", settings.STATIC_TILES_CHECK_SECONDS, static_tiles.poll)
+    leader_tasks.start()
+
+    yield
+
+    await leader_tasks.stop()
+    await notification_service.stop()
+    await arrival_recorder.stop()
+    await realtime_feed.snapshots.stop()
+    await bart_board.snapshots.stop()
+    await close_client()
+    await close_redis()
+    cleanup_db()
+
 
 app = FastAPI(
     title="MuniBuddy API",
     description="Transit info and route planner for SF (Muni + BART)",
-    version="1.1.0"
+    version="1.1.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -23,12 +90,28 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompactResponseMiddleware)
+app.add_middleware(MetricsMiddleware)
+if settings.PROFILING_ENABLED:
+    # Not installed at all otherwise, so unprofiled deployments pay nothing
+    app.add_middleware(ProfilingMiddleware)
 
 app.include_router(nearby_stops_router, prefix="/api/v1")
 app.include_router(bus_router, prefix="/api/v1")
 app.include_router(bart_router, prefix="/api/v1")
 app.include_router(stop_schedule_router, prefix="/api/v1")
 app.include_router(routes_router.router, prefix="/api/v1")
+app.include_router(fares_router, prefix="/api/v1")
+app.include_router(route_timetable_router, prefix="/api/v1")
+app.include_router(arrivals_router, prefix="/api/v1")
+app.include_router(notifications_router, prefix="/api/v1")
+app.include_router(search_router, prefix="/api/v1")
+app.include_router(analytics_router, prefix="/api/v1")
+app.include_router(isochrone_router, prefix="/api/v1")
+app.include_router(tiles_router, prefix="/api/v1")
+app.include_router(trip_progress_router, prefix="/api/v1")
+# Outside /api, so Caddy does not proxy it
+app.include_router(admin_router, include_in_schema=False)
 
 @app.get("/")
 async def root():
@@ -38,11 +121,16 @@ async def root():
 def health_check():
     return {
         "status": "ok",
-        "services_initialized": True
+        "services_initialized": warmup_service.ready
     }
 
-@app.on_event("startup")
-async def startup_event():
-    print("🔄 Starting MuniBuddy API...")
-    init_db()
-    print("✅ Database initialized")
\ No newline at end of file
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: 200 only once every warm-up component has loaded."""
+    report = warmup_service.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
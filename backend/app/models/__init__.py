@@ -1,6 +1,8 @@
 from sqlalchemy.orm import declarative_base
 from .bus_route import BusRoute
+from .notification import Notification, NotificationSubscription
+from .arrival_observation import ArrivalObservation
 
 Base = declarative_base()
 
-__all__ = ['Base', 'BusRoute']
\ No newline at end of file
+__all__ = ['Base', 'BusRoute', 'Notification', 'NotificationSubscription', 'ArrivalObservation']
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, DateTime, Index, Integer, SmallInteger, String
+from app.db.database import Base
+
+
+class ArrivalObservation(Base):
+    """
+    One live prediction as seen from 511 or BART, appended by the arrival recorder.
+
+    Append-only and range-partitioned by month on `observed_at` in PostgreSQL (partitions
+    are created by the recorder as it writes), so old months can be detached or dropped
+    whole. There is no surrogate key: rows are never updated or referenced.
+    """
+    __tablename__ = "arrival_observations"
+    __table_args__ = (
+        Index("ix_arrival_observations_stop", "agency", "stop_code", "observed_at"),
+        {"extend_existing": True, "postgresql_partition_by": "RANGE (observed_at)"},
+    )
+
+    observed_at = Column(DateTime, nullable=False)  # UTC
+    agency = Column(String, nullable=False)
+    stop_code = Column(String, nullable=False)
+    line = Column(String, nullable=False)  # Muni line ("14") or BART colour ("YELLOW")
+    route = Column(String, nullable=True)  # as reported ("14 MISSION", "DALY")
+    direction = Column(String, nullable=False)
+    trip_id = Column(String, nullable=True)
+    vehicle_id = Column(String, nullable=True)
+    predicted_at = Column(DateTime, nullable=False)  # UTC
+    minutes_until = Column(SmallInteger, nullable=True)
+    delay_seconds = Column(Integer, nullable=True)
+    # Local (service-area) hour and weekday of the predicted arrival, 0 = Monday
+    hour = Column(SmallInteger, nullable=False)
+    weekday = Column(SmallInteger, nullable=False)
+
+    __mapper_args__ = {"primary_key": [observed_at, agency, stop_code, line, predicted_at]}
+
+    def __repr__(self):
+        return f"<ArrivalObservation {self.agency}:{self.stop_code} {self.line} {self.predicted_at}>"
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, String
+from app.db.database import Base
+
+
+class NotificationSubscription(Base):
+    """A user watching one stop (optionally one route) and wanting a heads-up `lead_minutes` ahead."""
+    __tablename__ = "notification_subscriptions"
+    __table_args__ = (
+        Index("ix_notification_subscriptions_stop", "agency", "stop_code"),
+        {"extend_existing": True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False, index=True)
+    agency = Column(String, nullable=False)
+    stop_code = Column(String, nullable=False)
+    route = Column(String, nullable=True)  # None watches every route at the stop
+    lead_minutes = Column(Integer, nullable=False, default=5)
+    active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<NotificationSubscription {self.user_id} {self.agency}:{self.stop_code} {self.route or '*'}>"
+
+
+class Notification(Base):
+    """One message for a user and its delivery state (pending, sent, failed)."""
+    __tablename__ = "notifications"
+    __table_args__ = {"extend_existing": True}
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, nullable=False, index=True)
+    subscription_id = Column(Integer, ForeignKey("notification_subscriptions.id", ondelete="SET NULL"), nullable=True)
+    message = Column(String, nullable=False)
+    payload = Column(JSON, nullable=True)  # structured fields sent alongside the message
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    read = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Notification {self.id} {self.user_id} {self.status}>"
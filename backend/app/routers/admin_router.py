@@ -0,0 +1,41 @@
+import hmac
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from app.config import settings
+from app.utils.profiling import load_profile, recent_profiles, render_svg
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Without an ADMIN_TOKEN the admin endpoints do not exist
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Compared as bytes (the header as received): compare_digest rejects str with non-ASCII characters
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("latin-1"), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def list_profiles() -> List[Dict[str, Any]]:
+    """Recent request profiles, newest first."""
+    return await recent_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("svg", pattern="^(svg|folded|json)$", description="svg flame graph, folded stacks or raw JSON")
+):
+    profile = await load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"No profile {profile_id}")
+    if format == "json":
+        return profile
+    if format == "folded":
+        return PlainTextResponse(profile["folded"])
+    title = (f"{profile['method']} {profile['path']} → {profile['status']}  "
+             f"{profile['duration_ms']} ms, {profile['samples']} samples @ {profile['interval_ms']} ms")
+    return Response(content=render_svg(profile["folded"], title), media_type="image/svg+xml")
@@ -0,0 +1,37 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.config import settings
+from app.schemas.transit import DelayStats
+from app.utils.lazy import LazyObject
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+delay_analytics = LazyObject("app.services.delay_analytics", "delay_analytics")
+GROUPS = ("route", "stop", "hour", "weekday")
+
+@router.get("/delays", response_model=List[DelayStats])
+def get_delay_stats(
+    agency: str = Query("muni"),
+    stop_code: Optional[str] = Query(None, alias="stopCode"),
+    route: Optional[str] = Query(None, description="Muni line (\"14\") or BART colour (\"YELLOW\")"),
+    days: int = Query(7, ge=1, le=90),
+    group_by: str = Query("route,hour", description="Comma-separated: route, stop, hour, weekday")
+):
+    """
+    Delay percentiles from the recorded arrival history, e.g. per route and hour of day.
+    Each group reports p50/p90/p95 delay in seconds, the mean and the on-time share.
+    """
+    groups = [g.strip() for g in group_by.split(",") if g.strip()]
+    if not groups or any(g not in GROUPS for g in groups):
+        raise HTTPException(status_code=400, detail=f"group_by must be a comma-separated subset of {', '.join(GROUPS)}")
+
+    try:
+        return delay_analytics.percentiles(
+            settings.normalize_agency(agency),
+            stop_code=stop_code,
+            route=route,
+            days=days,
+            group_by=list(dict.fromkeys(groups)),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compute delay statistics: {str(e)}")
@@ -0,0 +1,67 @@
+from typing import List
+from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+import orjson
+from app.config import settings
+from app.schemas.transit import MergedStopArrivals
+from app.services.arrivals_service import batch_arrivals, merged_arrivals
+from app.services.agency_registry import agency_registry
+from app.services.stop_helper import find_stop
+
+router = APIRouter(prefix="/arrivals", tags=["Arrivals"])
+
+MAX_BATCH_STOPS = 50
+
+
+class StopRef(BaseModel):
+    stop_code: str
+    agency: str = "muni"
+
+
+class ArrivalsBatchRequest(BaseModel):
+    stops: List[StopRef] = Field(..., max_length=MAX_BATCH_STOPS)
+
+
+@router.get("/by-stop", response_model=MergedStopArrivals)
+async def get_merged_arrivals(
+    stopCode: str = Query(...),
+    agency: str = Query(default="muni")
+):
+    """
+    Real-time predictions joined with the GTFS schedule by trip: each prediction carries
+    its scheduled time and delay, and scheduled trips with no prediction are included
+    as `is_realtime: false`.
+    """
+    agency = settings.normalize_agency(agency)
+    if not agency_registry.is_enabled(agency):
+        raise HTTPException(status_code=404, detail=f"Unknown agency: {agency}")
+    if find_stop(agency, stopCode) is None:
+        raise HTTPException(status_code=404, detail=f"{stopCode} is not a valid {agency.upper()} stop")
+
+    return await merged_arrivals(agency, stopCode)
+
+
+@router.post("/batch")
+async def get_arrivals_batch(request: ArrivalsBatchRequest):
+    """
+    Arrivals for many stops across agencies in one request, streamed as NDJSON:
+    one line per stop (the `/bus-positions` / `/bart-positions` body) in the order
+    stops resolve, so the first lines arrive before the slowest upstream answers.
+    Unknown stops get a line with `error` instead.
+    """
+    stops, rejected = [], []
+    for ref in request.stops:
+        agency = settings.normalize_agency(ref.agency)
+        if agency_registry.is_enabled(agency) and find_stop(agency, ref.stop_code) is not None:
+            stops.append((agency, ref.stop_code))
+        else:
+            rejected.append({"agency": agency, "stop_code": ref.stop_code, "error": "unknown stop"})
+
+    async def lines():
+        for entry in rejected:
+            yield orjson.dumps(entry) + b"\n"
+        async for entry in batch_arrivals(stops):
+            yield orjson.dumps(entry) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,35 +1,21 @@
 from fastapi import APIRouter, Query, HTTPException
-from app.config import settings
-from app.services.stop_helper import load_stops
-import httpx
+from app.schemas.transit import StopArrivals
+from app.services.arrivals_service import live_arrivals
+from app.services.agency_registry import agency_registry
+from app.services.stop_helper import find_stop
 
 router = APIRouter(prefix="/bus-positions", tags=["MUNI Bus Positions"])
 
-@router.get("/by-stop")
+@router.get("/by-stop", response_model=StopArrivals)
 async def get_parsed_bus_by_stop(
     stopCode: str = Query(...),
     agency: str = Query(default="muni")
 ):
-    try:
-        norm_agency = settings.normalize_agency(agency, to_511=True)
+    agency = agency_registry.normalize(agency)
+    if not agency_registry.is_enabled(agency):
+        raise HTTPException(status_code=404, detail=f"Unknown agency: {agency}")
+    if find_stop(agency, stopCode) is None:
+        raise HTTPException(status_code=404, detail=f"Stop {stopCode} is not a valid {agency.upper()} stop")
 
-        muni_stops = load_stops("muni")
-        valid_stop_codes = {s["stop_code"] for s in muni_stops if s.get("stop_code")}
-        if stopCode not in valid_stop_codes:
-            raise HTTPException(status_code=404, detail=f"Stop {stopCode} is not a valid MUNI stop")
-
-        url = f"{settings.TRANSIT_511_BASE_URL}/StopMonitoring"
-        params = {
-            "api_key": settings.API_KEY,
-            "agency": norm_agency,
-            "stopCode": stopCode,
-            "format": "json"
-        }
-
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch 511 SIRI data: {e}")
+    # Budget spent, circuit open, timeout or upstream error: answered from cache or schedule
+    return await live_arrivals(agency, stopCode)
@@ -0,0 +1,53 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
+from app.utils.lazy import LazyObject
+
+router = APIRouter(prefix="/fares", tags=["BART Fares"])
+
+fare_service = LazyObject("app.services.fare_service", "fare_service")
+
+MAX_BATCH_SIZE = 500
+
+
+class FarePair(BaseModel):
+    origin: str
+    destination: str
+
+
+class FareBatchRequest(BaseModel):
+    trips: List[FarePair] = Field(..., max_length=MAX_BATCH_SIZE)
+    rider_category: Optional[str] = None
+
+
+@router.get("")
+def get_fare(
+    origin: str = Query(..., description="BART station code, e.g. 16TH"),
+    destination: str = Query(..., description="BART station code, e.g. SFIA"),
+    rider_category: Optional[str] = Query(None, description="'adult' (default) or a rider_category_id")
+):
+    """Fare for one BART origin/destination pair, answered from the precompiled fare matrix."""
+    try:
+        result = fare_service.get_fares([(origin, destination)], rider_category)[0]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result.get("error") == "Unknown station":
+        raise HTTPException(status_code=404, detail=f"Unknown BART station: {origin} or {destination}")
+    return result
+
+
+@router.post("/batch")
+def get_fares_batch(request: FareBatchRequest):
+    """Fares for many origin/destination pairs in one vectorized lookup."""
+    try:
+        pairs = [(trip.origin, trip.destination) for trip in request.trips]
+        return {"fares": fare_service.get_fares(pairs, request.rider_category)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/categories")
+def get_rider_categories():
+    """Rider categories available in the fare matrix."""
+    fare_service._ensure_loaded()
+    return {"categories": fare_service.categories}
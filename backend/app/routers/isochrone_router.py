@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.schemas.transit import Isochrone
+from app.utils.lazy import LazyObject
+
+isochrone_service = LazyObject("app.services.isochrone", "isochrone_service")
+
+router = APIRouter(tags=["Isochrone"])
+
+@router.get("/isochrone", response_model=Isochrone)
+def get_isochrone(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    minutes: int = Query(30, ge=5, le=90),
+    date: Optional[str] = Query(None, description="Service date as YYYYMMDD (default: today)"),
+    time: Optional[str] = Query(None, description="Departure as HH:MM (default: now)"),
+):
+    """
+    Stops reachable by walking and Muni/BART within `minutes` of leaving (lat, lon),
+    with earliest arrival times and a coarse outline polygon (GeoJSON).
+    """
+    now = datetime.now()
+    try:
+        day = datetime.strptime(date, "%Y%m%d") if date else now
+        clock = datetime.strptime(time, "%H:%M") if time else now
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYYMMDD and time HH:MM")
+    departure = datetime(day.year, day.month, day.day, clock.hour, clock.minute, clock.second if not time else 0)
+
+    try:
+        return isochrone_service.isochrone(lat, lon, minutes, departure)
+    except RuntimeError as e:
+        # No stop_times loaded for any agency (feeds without stop_times or warm-up pending)
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Isochrone failed: {str(e)}")
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Query, HTTPException
 from typing import Optional, List, Dict, Any
-from app.services.stop_helper import load_stops, calculate_distance
-from app.services.stations_data import station_to_lines
+from app.services.stop_helper import nearby_stops
+from app.services.stations_data import lines_for_station
+from app.schemas.transit import Stop
 
 router = APIRouter()
 
-@router.get("/nearby-stops")
+@router.get("/nearby-stops", response_model=List[Stop])
 def get_combined_nearby_stops(
     lat: float = Query(...),
     lon: float = Query(...),
@@ -13,20 +14,14 @@ def get_combined_nearby_stops(
     agency: Optional[str] = Query(None)
 ):
     try:
-        all_stops: List[Dict[str, Any]] = load_stops()
         filtered: List[Dict[str, Any]] = []
-
-        for stop in all_stops:
+        for dist, stop in nearby_stops(lat, lon, radius, agency):
             code = (stop.get("stop_code") or stop.get("stop_id") or "").upper()
-            stop["bart_lines"] = station_to_lines.get(code, [])
-            if agency and stop["agency"].lower() != agency.lower():
-                continue
-            dist = calculate_distance(lat, lon, stop["stop_lat"], stop["stop_lon"])
-            if dist <= radius:
-                stop["distance_miles"] = round(dist, 3)
-                filtered.append(stop)
-
-        filtered.sort(key=lambda x: x["distance_miles"])
+            filtered.append({
+                **stop,
+                "bart_lines": lines_for_station(code),
+                "distance_miles": round(dist, 3)
+            })
         return filtered
 
     except Exception as e:
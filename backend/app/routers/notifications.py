@@ -1,19 +1,103 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.db.database import get_db
-from app.models.bus_route import BusRoute
+from app.models.notification import Notification, NotificationSubscription
+from app.services.stop_helper import find_stop
 
-router = APIRouter()
+router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
-@router.get("/notifications")
-def get_notifications(db: Session = Depends(get_db)):
-    """Fetch all notifications."""
-    return db.query(BusRoute).all()
 
-@router.put("/notifications/{notification_id}/read")
+class SubscriptionRequest(BaseModel):
+    user_id: str
+    stop_code: str
+    agency: str = "muni"
+    route: Optional[str] = Field(None, description="Muni line (\"14\") or BART colour (\"YELLOW\"); omit for any route")
+    lead_minutes: int = Field(5, ge=0, le=60)
+
+
+class SubscriptionOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: str
+    agency: str
+    stop_code: str
+    route: Optional[str] = None
+    lead_minutes: int
+    active: bool
+
+
+class NotificationOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: str
+    message: str
+    status: str
+    read: bool
+
+
+@router.post("/subscriptions", response_model=SubscriptionOut, status_code=201)
+def create_subscription(request: SubscriptionRequest, db: Session = Depends(get_db)):
+    """Watch a stop (optionally one route) and get notified `lead_minutes` before arrival."""
+    agency = settings.normalize_agency(request.agency)
+    if find_stop(agency, request.stop_code) is None:
+        raise HTTPException(status_code=404, detail=f"{request.stop_code} is not a valid {agency.upper()} stop")
+
+    subscription = NotificationSubscription(
+        user_id=request.user_id,
+        agency=agency,
+        stop_code=request.stop_code,
+        route=request.route.strip().upper() if request.route else None,
+        lead_minutes=request.lead_minutes,
+    )
+    db.add(subscription)
+    db.commit()
+    db.refresh(subscription)
+    return subscription
+
+
+@router.get("/subscriptions", response_model=List[SubscriptionOut])
+def list_subscriptions(user_id: str = Query(...), db: Session = Depends(get_db)):
+    """A user's active subscriptions."""
+    return db.query(NotificationSubscription).filter(
+        NotificationSubscription.user_id == user_id,
+        NotificationSubscription.active.is_(True),
+    ).all()
+
+
+@router.delete("/subscriptions/{subscription_id}")
+def delete_subscription(subscription_id: int, db: Session = Depends(get_db)):
+    """Stop watching; past notifications are kept."""
+    subscription = db.get(NotificationSubscription, subscription_id)
+    if not subscription or not subscription.active:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    subscription.active = False
+    db.commit()
+    return {"message": "Subscription removed"}
+
+
+@router.get("", response_model=List[NotificationOut])
+def get_notifications(
+    user_id: str = Query(...),
+    unread_only: bool = Query(False),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """A user's most recent notifications."""
+    query = db.query(Notification).filter(Notification.user_id == user_id)
+    if unread_only:
+        query = query.filter(Notification.read.is_(False))
+    return query.order_by(Notification.id.desc()).limit(limit).all()
+
+
+@router.put("/{notification_id}/read")
 def mark_notification_as_read(notification_id: int, db: Session = Depends(get_db)):
     """Mark a notification as read."""
-    notification = db.query(BusRoute).filter(BusRoute.id == notification_id).first()
+    notification = db.get(Notification, notification_id)
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
     notification.read = True
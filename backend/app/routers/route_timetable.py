@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.utils.lazy import LazyObject
+
+route_pattern_service = LazyObject("app.services.route_patterns", "route_pattern_service")
+schedule_service = LazyObject("app.services.schedule_service", "schedule_service")
+
+router = APIRouter()
+
+@router.get("/route-timetable/{route_id}")
+def get_route_timetable(
+    route_id: str,
+    agency: str = Query("muni", enum=["muni", "bart"]),
+    date: Optional[str] = Query(None, description="Service date as YYYYMMDD (default: today)"),
+    direction_id: Optional[int] = Query(None, ge=0, le=1),
+):
+    """
+    Returns the stop patterns, headways per time band and the main-pattern timetable
+    for each direction of a route on a service day.
+    """
+    try:
+        service_date = datetime.strptime(date, "%Y%m%d") if date else datetime.now()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYYMMDD")
+
+    try:
+        service_ids = schedule_service.active_service_ids(agency, service_date)
+        timetable = route_pattern_service.get_route_timetable(
+            agency, route_id, service_ids, direction_id=direction_id, service_date=service_date
+        )
+    except RuntimeError as e:
+        # No stop_times loaded for this agency (feed without stop_times or warm-up pending)
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Route timetable failed: {str(e)}")
+
+    if timetable is None:
+        raise HTTPException(status_code=404, detail=f"Route not found: {route_id}")
+    return timetable
@@ -0,0 +1,41 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.config import settings
+from app.schemas.transit import SearchResult
+from app.utils.lazy import LazyObject
+
+router = APIRouter(tags=["Search"])
+
+get_search_index = LazyObject("app.services.search_index", "get_search_index")
+
+@router.get("/search", response_model=List[SearchResult])
+def search_stops_and_routes(
+    q: str = Query(..., min_length=1, max_length=100, description="Stop name, stop code or route, e.g. '19th ave holloway'"),
+    agency: Optional[str] = Query(None),
+    type: Optional[str] = Query(None, enum=["stop", "route"]),
+    lat: Optional[float] = Query(None),
+    lon: Optional[float] = Query(None),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """
+    Typeahead search over stops and routes, answered from the in-memory index.
+    Ranked by text match; pass lat/lon to favour nearby stops.
+
+    The index starts with the agencies in AGENCY_PRELOAD. Another enabled agency is
+    added the first time it is passed as `agency` (that request reads its stops and
+    routes), so until then searches without `agency` do not return its stops or routes.
+    """
+    normalized = settings.normalize_agency(agency) if agency else None
+    try:
+        index = get_search_index(normalized)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Search index unavailable: {str(e)}")
+
+    return index.search(
+        q,
+        limit=limit,
+        agency=normalized,
+        kind=type,
+        lat=lat,
+        lon=lon,
+    )
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException, Query
-from app.services.schedule_service import SchedulerService
+from app.utils.lazy import LazyObject
+
+schedule_service = LazyObject("app.services.schedule_service", "schedule_service")
 
 router = APIRouter()
-schedule_service = SchedulerService()
 
 @router.get("/stop-schedule/{stop_id}")
-def get_stop_schedule(stop_id: str, agency: str = Query("muni", enum=["muni", "bart"])):
+def get_stop_schedule(stop_id: str, agency: str = Query("muni")):
     """
     Returns upcoming scheduled stops from GTFS data in DB.
     """
@@ -0,0 +1,30 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+
+from app.services.agency_registry import agency_registry
+from app.services.static_tiles import static_tiles
+
+router = APIRouter(prefix="/tiles", tags=["Static Tiles"])
+
+# Short, so clients pick up a new export soon; the files it names are cached for good
+MANIFEST_MAX_AGE = 60
+
+@router.get("/manifest")
+def get_tiles_manifest(response: Response, agency: Optional[str] = Query(None, description="Only this agency's entry")):
+    """
+    Names of the current static map files (stops per z/x/y tile, routes, shapes, BART
+    topology) per agency and feed version. Fetch them from `base_url` + "/" + name:
+    Caddy serves them precompressed and immutable, without reaching the API.
+    """
+    manifest = static_tiles.manifest()
+    if manifest is None:
+        raise HTTPException(status_code=503, detail="Static tiles have not been exported yet")
+    response.headers["Cache-Control"] = f"public, max-age={MANIFEST_MAX_AGE}"
+    if agency is None:
+        return manifest
+
+    key = agency_registry.normalize(agency)
+    if key not in manifest["agencies"]:
+        raise HTTPException(status_code=404, detail=f"No static tiles for agency: {agency}")
+    return {**manifest, "agencies": {key: manifest["agencies"][key]}}
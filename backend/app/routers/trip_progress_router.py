@@ -0,0 +1,60 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.schemas.transit import TripProgress, VehicleProgress
+from app.services.agency_registry import agency_registry
+from app.utils.lazy import LazyObject
+
+trip_progress = LazyObject("app.services.trip_progress", "trip_progress")
+
+router = APIRouter(prefix="/trip-progress", tags=["Trip Progress"])
+
+
+def _agency(agency: str) -> str:
+    agency = agency_registry.normalize(agency)
+    if not agency_registry.is_enabled(agency):
+        raise HTTPException(status_code=404, detail=f"Unknown agency: {agency}")
+    return agency
+
+
+@router.get("", response_model=List[VehicleProgress])
+def get_vehicles_progress(
+    agency: str = Query("muni"),
+    route: Optional[str] = Query(None, description="Only vehicles on this route_id"),
+):
+    """
+    Every live vehicle of the agency (or one route) projected onto its trip's shape, with
+    its delay and next stop. Needs the agency's GTFS-Realtime vehicle positions (GTFS_RT_VEHICLE_POSITIONS).
+    """
+    agency = _agency(agency)
+    try:
+        vehicles = trip_progress.vehicles(agency, route)
+    except RuntimeError as e:
+        # stop_times index not loaded (feeds without stop_times or warm-up pending)
+        raise HTTPException(status_code=503, detail=str(e))
+    if vehicles is None:
+        raise HTTPException(status_code=503, detail=f"No live vehicle positions for agency: {agency}")
+    return vehicles
+
+
+@router.get("/{trip_id}", response_model=TripProgress)
+def get_trip_progress(
+    trip_id: str,
+    agency: str = Query("muni"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Vehicle position, if the caller has one"),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+):
+    """
+    Where a trip is along its shape: distance travelled, current and next stop, delay, and
+    estimated arrivals at the stops ahead. The position is `lat`/`lon` when given, else the
+    trip's live vehicle, else where the timetable puts it.
+    """
+    agency = _agency(agency)
+    try:
+        progress = trip_progress.trip(agency, trip_id, lat, lon)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Unknown trip: {trip_id}")
+    return progress
@@ -0,0 +1,3 @@
+from .transit import Arrival, MergedStopArrivals, SearchResult, StopArrivals, Stop, Vehicle
+
+__all__ = ["Arrival", "MergedStopArrivals", "SearchResult", "StopArrivals", "Stop", "Vehicle"]
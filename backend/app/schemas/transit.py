@@ -0,0 +1,207 @@
+from typing import Any, Dict, List, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class Vehicle(BaseModel):
+    """Vehicle position as reported with a prediction (SIRI VehicleLocation)."""
+    vehicle_id: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+
+class Arrival(BaseModel):
+    """
+    One predicted (or scheduled) arrival at a stop, in the same shape for Muni and BART.
+    `arrival_time` is ISO 8601; `status` is the display string ("Due", "5 min").
+    BART-only fields stay None for Muni.
+    """
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    route_number: Optional[str] = None
+    destination: Optional[str] = None
+    direction: Literal["inbound", "outbound"]
+    arrival_time: Optional[str] = None
+    scheduled_time: Optional[str] = None
+    minutes_until: Optional[int] = None
+    status: str = "Unknown"
+    is_realtime: bool = True
+    vehicle: Optional[Vehicle] = None
+    trip_id: Optional[str] = None
+    platform: Optional[str] = None
+    color: Optional[str] = None
+    hexcolor: Optional[str] = None
+    length: Optional[str] = None
+    delay_seconds: Optional[int] = None
+
+
+class StopArrivals(BaseModel):
+    """
+    Arrivals at one stop split by direction. `source` says where they came from:
+    the live upstream, the last cached live answer, or the GTFS schedule.
+    """
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    agency: str
+    stop_code: str
+    source: Literal["realtime", "cache", "schedule", "merged"] = "realtime"
+    inbound: List[Arrival] = []
+    outbound: List[Arrival] = []
+
+
+class MergedStopArrivals(StopArrivals):
+    """
+    Live predictions joined to the scheduled trips they run, plus scheduled trips
+    nothing predicts yet. `realtime_source` is where the live half came from
+    (None when neither the upstream nor the cache answered).
+    """
+    source: Literal["merged"] = "merged"
+    realtime_source: Optional[Literal["realtime", "cache"]] = None
+
+
+class BartStationBoard(StopArrivals):
+    """One station's departures on the system-wide BART board."""
+    name: str
+
+
+class BartBoard(BaseModel):
+    """Departures at every BART station from one all-stations snapshot."""
+    fetched_at: str
+    age_seconds: float
+    stations: List[BartStationBoard] = []
+
+
+class Stop(BaseModel):
+    """A GTFS stop as returned by the stop search endpoints."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    stop_id: str
+    stop_code: Optional[str] = None
+    stop_name: str
+    stop_lat: float
+    stop_lon: float
+    agency: str
+    distance_miles: Optional[float] = None
+    bart_lines: List[str] = []
+
+
+class SearchResult(BaseModel):
+    """A stop or route matched by the search endpoint; `code` is the stop code or route number."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    type: Literal["stop", "route"]
+    agency: str
+    id: str
+    name: str
+    code: Optional[str] = None
+    score: float
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    distance_miles: Optional[float] = None
+
+
+class DelayStats(BaseModel):
+    """
+    Delay percentiles (seconds, positive = late) for one group of recorded arrivals.
+    Only the fields named in `group_by` are set; `route` is the Muni line or BART colour.
+    """
+    route: Optional[str] = None
+    stop_code: Optional[str] = None
+    hour: Optional[int] = None
+    weekday: Optional[int] = None
+    observations: int
+    mean_delay_seconds: float
+    p50: float
+    p90: float
+    p95: float
+    on_time_share: float
+
+
+class IsochroneStop(BaseModel):
+    """A stop reachable from the origin, with the earliest arrival and the minutes it takes."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    agency: str
+    stop_id: str
+    stop_code: Optional[str] = None
+    stop_name: str
+    lat: float
+    lon: float
+    minutes: float
+    arrival_time: str
+
+
+class Isochrone(BaseModel):
+    """
+    Everything reachable within `minutes` of leaving the origin at `departure`:
+    the stops (earliest arrival first) and a coarse GeoJSON outline.
+    """
+    origin: Dict[str, float]
+    departure: str
+    minutes: int
+    agencies: List[str]
+    stops: List[IsochroneStop]
+    polygon: Dict[str, Any]
+
+
+class TripStop(BaseModel):
+    """
+    A stop on a trip with its distance along the trip's shape. `estimated_time` is the
+    scheduled time shifted by the trip's current delay, for stops not yet passed.
+    """
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    stop_id: str
+    stop_code: Optional[str] = None
+    stop_name: str
+    stop_sequence: int
+    distance_m: float
+    scheduled_time: str
+    estimated_time: Optional[str] = None
+    minutes_until: Optional[int] = None
+    passed: bool = False
+
+
+class TripProgress(BaseModel):
+    """
+    Where a trip is along its shape. `source` says where the position came from: the
+    agency's vehicle feed, the caller's `lat`/`lon`, or the timetable alone (no position,
+    one too far from the route, or a trip not running at the time). `lat`/`lon` are the
+    position snapped to the shape, `offset_m` how far the vehicle was from it.
+    """
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    agency: str
+    trip_id: str
+    route_id: Optional[str] = None
+    shape_id: str
+    source: Literal["vehicle", "request", "schedule"]
+    vehicle: Optional[Vehicle] = None
+    distance_m: float
+    length_m: float
+    progress: float
+    lat: float
+    lon: float
+    offset_m: Optional[float] = None
+    delay_seconds: Optional[int] = None
+    current_stop: Optional[TripStop] = None
+    next_stop: Optional[TripStop] = None
+    stops: List[TripStop] = []
+
+
+class VehicleProgress(BaseModel):
+    """One live vehicle's position along its trip, as listed for a whole agency or route."""
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    trip_id: str
+    route_id: Optional[str] = None
+    vehicle_id: Optional[str] = None
+    lat: float
+    lon: float
+    distance_m: float
+    progress: float
+    offset_m: float
+    delay_seconds: Optional[int] = None
+    next_stop_id: Optional[str] = None
+    next_stop_name: Optional[str] = None
+    next_stop_eta: Optional[str] = None
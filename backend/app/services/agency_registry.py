@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+from pydantic import BaseModel
+
+from app.config import settings
+from app.services.debug_logger import log_debug
+from app.utils.metrics import record_agencies_loaded
+
+T = TypeVar("T")
+
+
+class Agency(BaseModel):
+    """
+    One transit operator. `key` is our name for it (table prefix `{key}_`, API `agency=`),
+    `operator` its 511 operator id, and `upstream` where live predictions come from:
+    "511" (SIRI StopMonitoring) or "bart" (BART ETD).
+    """
+    key: str
+    operator: str
+    name: str
+    aliases: List[str] = []
+    upstream: str = "511"
+
+    @property
+    def table_prefix(self) -> str:
+        return f"{self.key}_"
+
+
+# Bay Area operators on 511. Only those in AGENCY_ID (with GTFS loaded) are served;
+# more can be added with AGENCY_REGISTRY_EXTRA without a code change.
+BUILTIN_AGENCIES = [
+    Agency(key="muni", operator="SF", name="San Francisco Muni", aliases=["sf", "sfmta"]),
+    Agency(key="bart", operator="BA", name="BART", aliases=["ba"], upstream="bart"),
+    Agency(key="actransit", operator="AC", name="AC Transit", aliases=["ac"]),
+    Agency(key="caltrain", operator="CT", name="Caltrain", aliases=["ct"]),
+    Agency(key="samtrans", operator="SM", name="SamTrans", aliases=["sm"]),
+    Agency(key="vta", operator="SC", name="VTA", aliases=["sc"]),
+    Agency(key="goldengate", operator="GG", name="Golden Gate Transit", aliases=["gg"]),
+    Agency(key="countyconnection", operator="CC", name="County Connection", aliases=["cc"]),
+    Agency(key="marintransit", operator="MA", name="Marin Transit", aliases=["ma"]),
+    Agency(key="sfbayferry", operator="SB", name="San Francisco Bay Ferry", aliases=["sb"]),
+    Agency(key="smart", operator="SA", name="SMART", aliases=["sa"]),
+    Agency(key="tridelta", operator="3D", name="Tri Delta Transit", aliases=["3d"]),
+    Agency(key="westcat", operator="WC", name="WestCAT", aliases=["wc"]),
+    Agency(key="wheels", operator="WH", name="LAVTA Wheels", aliases=["wh"]),
+    Agency(key="soltrans", operator="ST", name="SolTrans", aliases=["st"]),
+    Agency(key="unioncity", operator="UC", name="Union City Transit", aliases=["uc"]),
+    Agency(key="emerygoround", operator="EM", name="Emery Go-Round", aliases=["em"]),
+    Agency(key="santarosa", operator="SR", name="Santa Rosa CityBus", aliases=["sr"]),
+]
+
+_MISSING = object()
+
+
+class AgencyCache(Generic[T]):
+    """
+    One kind of per-agency data (stop catalog, schedule index, ...), loaded by `loader`
+    the first time an agency is asked for and dropped again when the registry evicts
+    the agency. Concurrent first requests for an agency share a single load.
+    """
+
+    def __init__(self, registry: "AgencyRegistry", name: str, loader: Callable[[str], T]):
+        self.registry = registry
+        self.name = name
+        self.loader = loader
+        self._values: Dict[str, T] = {}
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+    def get(self, agency: str) -> T:
+        self.registry.touch(agency)
+        value = self._values.get(agency, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._locks[agency]:
+            value = self._values.get(agency, _MISSING)
+            if value is not _MISSING:
+                return value
+            value = self.loader(agency)
+            self._values[agency] = value
+        log_debug(f"[Agencies] ✓ Loaded {self.name} for {agency}")
+        self.registry.loaded_changed()
+        # A newly loaded agency may push another one over AGENCY_MAX_LOADED
+        self.registry.sweep()
+        return value
+
+    def peek(self, agency: str) -> Optional[T]:
+        """The loaded value, without loading or counting as use."""
+        return self._values.get(agency)
+
+    def set(self, agency: str, value: T):
+        self.registry.touch(agency)
+        self._values[agency] = value
+        self.registry.loaded_changed()
+
+    def evict(self, agency: str) -> bool:
+        return self._values.pop(agency, _MISSING) is not _MISSING
+
+    def loaded(self) -> List[str]:
+        return list(self._values)
+
+
+class AgencyRegistry:
+    """
+    Every operator the app knows, and the lifetime of their in-memory data.
+
+    Agencies are resolved by key, alias or 511 operator id. Per-agency data lives in
+    AgencyCaches created with `cache()`, so nothing is read for an agency until a
+    request needs it. Agencies in AGENCY_PRELOAD are warmed at startup and pinned;
+    any other agency is evicted from every cache once unused for AGENCY_IDLE_SECONDS,
+    or least recently used first when more than AGENCY_MAX_LOADED are held. Memory
+    therefore follows the agencies actually being queried, not the number configured.
+    """
+
+    SWEEP_SECONDS = 60
+
+    def __init__(self, agencies: List[Agency] = BUILTIN_AGENCIES):
+        self._agencies: Dict[str, Agency] = {}
+        self._names: Dict[str, str] = {}
+        self._caches: List[AgencyCache] = []
+        self._last_used: Dict[str, float] = {}
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+        for agency in agencies:
+            self.register(agency)
+        for key, spec in settings.AGENCY_REGISTRY_EXTRA.items():
+            self.register(Agency(key=key, **spec))
+
+    def register(self, agency: Agency):
+        self._agencies[agency.key] = agency
+        for name in (agency.key, agency.operator, *agency.aliases):
+            self._names[name.strip().lower()] = agency.key
+
+    def get(self, name: str) -> Optional[Agency]:
+        return self._agencies.get(self._names.get(name.strip().lower(), ""))
+
+    def normalize(self, name: str) -> str:
+        """Our key for an agency name, alias or 511 id ("SF" -> "muni"); unknown names lowercased."""
+        name = name.strip().lower()
+        return self._names.get(name, name)
+
+    def operator_id(self, name: str) -> str:
+        """511 operator id for an agency ("muni" -> "SF"); unknown names uppercased."""
+        agency = self.get(name)
+        return agency.operator if agency else name.strip().upper()
+
+    def upstream(self, name: str) -> str:
+        agency = self.get(name)
+        return agency.upstream if agency else "511"
+
+    def enabled(self) -> List[str]:
+        """Agencies in AGENCY_ID, normalized and de-duplicated, in configured order."""
+        return list(dict.fromkeys(self.normalize(name) for name in settings.AGENCY_ID))
+
+    def is_enabled(self, name: str) -> bool:
+        return self.normalize(name) in self.enabled()
+
+    def pinned(self) -> List[str]:
+        """Enabled agencies warmed at startup and never evicted."""
+        preload = {self.normalize(name) for name in settings.AGENCY_PRELOAD}
+        return [agency for agency in self.enabled() if agency in preload]
+
+    def cache(self, name: str, loader: Callable[[str], T]) -> AgencyCache[T]:
+        cache = AgencyCache(self, name, loader)
+        self._caches.append(cache)
+        return cache
+
+    def loaded(self) -> List[str]:
+        return sorted({agency for cache in self._caches for agency in cache.loaded()})
+
+    def loaded_changed(self):
+        record_agencies_loaded(len(self.loaded()))
+
+    def touch(self, agency: str):
+        now = time.monotonic()
+        self._last_used[agency] = now
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.SWEEP_SECONDS
+            self.sweep(now)
+
+    def evict(self, agency: str) -> bool:
+        evicted = False
+        for cache in self._caches:
+            evicted = cache.evict(agency) or evicted
+        if evicted:
+            log_debug(f"[Agencies] ⏬ Evicted {agency}")
+            self.loaded_changed()
+        return evicted
+
+    def sweep(self, now: Optional[float] = None) -> List[str]:
+        """Evict idle unpinned agencies, then the least recently used beyond AGENCY_MAX_LOADED."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            pinned = set(self.pinned())
+            candidates = sorted(
+                (agency for agency in self.loaded() if agency not in pinned),
+                key=lambda agency: self._last_used.get(agency, 0.0),
+            )
+            over = max(0, len(candidates) - settings.AGENCY_MAX_LOADED)
+            cold = [
+                agency for i, agency in enumerate(candidates)
+                if i < over or now - self._last_used.get(agency, 0.0) > settings.AGENCY_IDLE_SECONDS
+            ]
+            for agency in cold:
+                self.evict(agency)
+            return cold
+
+    def report(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled(), "pinned": self.pinned(), "loaded": self.loaded()}
+
+
+agency_registry = AgencyRegistry()
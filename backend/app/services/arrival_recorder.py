@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import insert, text
+
+from app.config import settings
+from app.db.database import get_engine
+from app.models.arrival_observation import ArrivalObservation
+from app.schemas.transit import StopArrivals
+from app.services.debug_logger import log_debug
+from app.utils.metrics import record_observations
+
+
+def line_key(agency: str, route_number: Optional[str], color: Optional[str] = None) -> str:
+    """
+    Key shared by a prediction and the scheduled trips it may be running:
+    the Muni line ("14" of "14 MISSION"), or the BART line colour ("YELLOW" of "Yellow-S").
+    """
+    if agency == "bart":
+        return (color or route_number or "").split("-")[0].upper()
+    return (route_number or "").split(" ")[0].upper()
+
+
+def _utc(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value).astimezone(timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+class ArrivalRecorder:
+    """
+    Keeps every live prediction we fetch as history for delay analytics.
+
+    `record()` runs on the request path and only turns a live answer into rows in an
+    in-process buffer. A background task per worker moves the buffer to the
+    arrival_observations table every ARRIVAL_RECORDER_FLUSH_SECONDS in one batched
+    INSERT from a worker thread, creating the monthly PostgreSQL partition first when
+    needed. When the database falls behind the buffer stops at ARRIVAL_RECORDER_MAX_BUFFER
+    rows and newer observations are dropped (and counted) rather than slowing requests.
+    """
+
+    def __init__(self):
+        self._buffer: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._partitions: Set[str] = set()
+
+    def record(self, arrivals: StopArrivals, observed_at: Optional[datetime] = None):
+        if not settings.ARRIVAL_RECORDER_ENABLED or arrivals.source != "realtime":
+            return
+        observed_at = (observed_at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        rows = []
+        for arrival in arrivals.inbound + arrivals.outbound:
+            predicted = _utc(arrival.arrival_time)
+            if not arrival.is_realtime or predicted is None:
+                continue
+            delay = arrival.delay_seconds
+            scheduled = _utc(arrival.scheduled_time)
+            if delay is None and scheduled is not None:
+                delay = round((predicted - scheduled).total_seconds())
+            local = predicted.astimezone()
+            rows.append({
+                "observed_at": observed_at.replace(tzinfo=None),
+                "agency": arrivals.agency,
+                "stop_code": arrivals.stop_code,
+                "line": line_key(arrivals.agency, arrival.route_number, arrival.color),
+                "route": arrival.route_number,
+                "direction": arrival.direction,
+                "trip_id": arrival.trip_id,
+                "vehicle_id": arrival.vehicle.vehicle_id if arrival.vehicle else None,
+                "predicted_at": predicted.replace(tzinfo=None),
+                "minutes_until": arrival.minutes_until,
+                "delay_seconds": delay,
+                "hour": local.hour,
+                "weekday": local.weekday(),
+            })
+        if not rows:
+            return
+        if len(self._buffer) + len(rows) > settings.ARRIVAL_RECORDER_MAX_BUFFER:
+            record_observations("dropped", len(rows))
+            return
+        self._buffer.extend(rows)
+        record_observations("recorded", len(rows))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.ARRIVAL_RECORDER_FLUSH_SECONDS)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows written."""
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except Exception as e:
+            record_observations("failed", len(rows))
+            log_debug(f"[Recorder] ❌ Could not write {len(rows)} arrival observations: {e}")
+            return 0
+        record_observations("written", len(rows))
+        return len(rows)
+
+    def _ensure_partition(self, month: datetime):
+        name = f"{ArrivalObservation.__tablename__}_{month:%Y_%m}"
+        if name in self._partitions:
+            return
+        upper = (month + timedelta(days=32)).replace(day=1)
+        try:
+            with get_engine().begin() as conn:
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {ArrivalObservation.__tablename__} "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+                ))
+        except Exception as e:
+            # Another worker won the race, or the table predates partitioning; not
+            # remembered, so the next flush tries again
+            log_debug(f"[Recorder] ⚠️ Partition {name} not created: {e}")
+            return
+        self._partitions.add(name)
+        log_debug(f"[Recorder] ✓ Partition {name} ready")
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        engine = get_engine()
+        if engine.dialect.name == "postgresql":
+            for month in {row["observed_at"].replace(day=1, hour=0, minute=0, second=0, microsecond=0) for row in rows}:
+                self._ensure_partition(month)
+        with engine.begin() as conn:
+            conn.execute(insert(ArrivalObservation.__table__), rows)
+
+
+arrival_recorder = ArrivalRecorder()
@@ -0,0 +1,247 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.integrations.bart_api import parse_bart_etd
+from app.integrations.rate_limiter import INTERACTIVE, drain_budget
+from app.integrations.resilience import failure_reason
+from app.integrations.siri_api import parse_stop_monitoring
+from app.integrations.upstream import upstream_get
+from app.schemas.transit import Arrival, MergedStopArrivals, StopArrivals
+from app.services.agency_registry import agency_registry
+from app.services.arrival_recorder import arrival_recorder, line_key
+from app.services.bart_board import bart_board
+from app.services.debug_logger import log_debug
+from app.services.realtime_fallback import cached_arrivals, degraded_arrivals, fresh_arrivals, remember_arrivals
+from app.services.realtime_feed import realtime_feed
+from app.services.stop_helper import stop_id_for_code
+from app.utils.lazy import LazyObject
+from app.utils.metrics import record_fallback, time_section
+
+schedule_service = LazyObject("app.services.schedule_service", "schedule_service")
+
+async def fetch_live_arrivals(agency: str, stop_code: str, priority: str = INTERACTIVE) -> StopArrivals:
+    """
+    Live predictions for a stop straight from the agency's upstream.
+    Raises when the upstream cannot be used (budget, circuit open, timeout, HTTP error).
+    Stops listed in a fresh GTFS-Realtime snapshot, and BART stations while the all-stations
+    board is fresh, are answered from memory without a call.
+    """
+    if realtime_feed.enabled_for(agency):
+        arrivals = realtime_feed.arrivals(agency, stop_code)
+        if arrivals is not None:
+            # The feed poller records history, and the snapshot is itself the recent answer
+            return arrivals
+
+    upstream = agency_registry.upstream(agency)
+    if upstream == "bart" and bart_board.enabled:
+        arrivals = bart_board.arrivals(stop_code)
+        if arrivals is not None:
+            return arrivals
+
+    if upstream == "bart":
+        url = f"{settings.BART_API_BASE_URL}/etd.aspx"
+        params = {"cmd": "etd", "orig": stop_code, "key": settings.BART_API_KEY, "json": "y"}
+        response = await upstream_get("bart", "bart", "etd", url, params=params, priority=priority)
+        response.raise_for_status()
+        with time_section("bart_etd_parse"):
+            arrivals = parse_bart_etd(response.json(), stop_code)
+    else:
+        url = f"{settings.TRANSIT_511_BASE_URL}/StopMonitoring"
+        params = {
+            "api_key": settings.API_KEY,
+            "agency": settings.normalize_agency(agency, to_511=True),
+            "stopCode": stop_code,
+            "format": "json"
+        }
+        response = await upstream_get("511", agency, "StopMonitoring", url, params=params, priority=priority)
+        if response.status_code == 429:
+            # 511 quota is gone for this key: stop every worker from calling until it refills
+            await drain_budget("511")
+        response.raise_for_status()
+        with time_section("siri_parse"):
+            arrivals = parse_stop_monitoring(response.json(), stop_code, agency)
+
+    await remember_arrivals(arrivals)
+    arrival_recorder.record(arrivals)
+    return arrivals
+
+
+async def live_arrivals(agency: str, stop_code: str, priority: str = INTERACTIVE) -> StopArrivals:
+    """Live predictions, or the cached/scheduled answer when the upstream cannot be used."""
+    try:
+        return await fetch_live_arrivals(agency, stop_code, priority)
+    except Exception as e:
+        upstream = agency_registry.upstream(agency)
+        log_debug(f"[Arrivals] ⚠️ {upstream} unavailable for {stop_code}: {e}")
+        return await degraded_arrivals(upstream, agency, stop_code, failure_reason(e))
+
+
+async def batch_arrivals(stops: List[Tuple[str, str]],
+                         priority: str = INTERACTIVE) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Arrivals for many (agency, stop_code) pairs, yielded as each stop resolves.
+
+    Duplicates are collapsed, stops with a cached answer younger than
+    ARRIVALS_FRESH_SECONDS are yielded first without an upstream call, and the rest
+    are fetched at most ARRIVALS_BATCH_CONCURRENCY at a time (each with the usual
+    budget, breaker and fallback handling). Stops that fail outright yield an
+    `error` entry instead. Pending fetches are cancelled if the consumer stops early.
+    """
+    unique = list(dict.fromkeys(stops))
+    cached = await fresh_arrivals(unique, settings.ARRIVALS_FRESH_SECONDS)
+    for stop in unique:
+        if stop in cached:
+            yield cached[stop].model_dump()
+
+    semaphore = asyncio.Semaphore(max(1, settings.ARRIVALS_BATCH_CONCURRENCY))
+
+    async def resolve(agency: str, stop_code: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return (await live_arrivals(agency, stop_code, priority)).model_dump()
+            except Exception as e:
+                log_debug(f"[Arrivals] ❌ Batch lookup failed for {agency}:{stop_code}: {e}")
+                return {"agency": agency, "stop_code": stop_code, "error": "unavailable"}
+
+    tasks = [asyncio.create_task(resolve(*stop)) for stop in unique if stop not in cached]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _scheduled_direction(agency: str, entry: Dict[str, Any]) -> str:
+    # BART predictions are split by compass direction, which GTFS encodes in the route id suffix
+    if agency == "bart":
+        return "outbound" if str(entry["route_number"]).upper().endswith("-S") else "inbound"
+    return "inbound" if entry["direction_id"] == 1 else "outbound"
+
+
+def _nearest_slot(slots: List[Dict[str, Any]], line: str, direction: str,
+                  predicted: datetime, window: timedelta) -> Optional[Dict[str, Any]]:
+    best, best_gap = None, window
+    for slot in slots:
+        if slot["taken"] or slot["line"] != line or slot["direction"] != direction:
+            continue
+        gap = abs(slot["when"] - predicted)
+        if gap <= best_gap:
+            best, best_gap = slot, gap
+    return best
+
+
+def merge_arrivals(agency: str, stop_code: str, live: Optional[StopArrivals],
+                   scheduled: List[Dict[str, Any]], now: datetime) -> MergedStopArrivals:
+    """
+    Join live predictions to scheduled trips and fill the gaps with the schedule.
+
+    A prediction is joined by trip id when the upstream reports one that is in the
+    schedule (Muni), otherwise to the nearest unclaimed scheduled trip of the same line
+    and direction within MERGED_MATCH_WINDOW_SECONDS (BART). Joined predictions get the
+    scheduled time and `delay_seconds`. Scheduled trips nothing claimed are added after
+    the last prediction of their line, so a route the upstream is not tracking still
+    shows its next departures.
+    """
+    window = timedelta(seconds=settings.MERGED_MATCH_WINDOW_SECONDS)
+    result = MergedStopArrivals(agency=agency, stop_code=stop_code,
+                                realtime_source=live.source if live is not None else None)
+
+    slots: List[Dict[str, Any]] = []
+    by_trip: Dict[str, Dict[str, Any]] = {}
+    for entry in scheduled:
+        slot = {
+            "entry": entry,
+            "when": entry["arrival"].astimezone(),
+            "line": line_key(agency, entry["route_number"]),
+            "direction": _scheduled_direction(agency, entry),
+            "taken": False,
+        }
+        slots.append(slot)
+        by_trip[str(entry["trip_id"])] = slot
+
+    last_predicted: Dict[Tuple[str, str], datetime] = {}
+    for direction in ("inbound", "outbound"):
+        for arrival in (getattr(live, direction) if live is not None else []):
+            arrival = arrival.model_copy()
+            predicted = _parse_time(arrival.arrival_time)
+            line = line_key(agency, arrival.route_number, arrival.color)
+
+            slot = by_trip.get(arrival.trip_id) if arrival.trip_id else None
+            if (slot is None or slot["taken"]) and predicted is not None:
+                slot = _nearest_slot(slots, line, direction, predicted, window)
+            if slot is not None:
+                slot["taken"] = True
+                arrival.trip_id = str(slot["entry"]["trip_id"])
+                # SIRI's aimed time is the operator's own schedule; GTFS only fills in when it is missing
+                arrival.scheduled_time = arrival.scheduled_time or slot["when"].isoformat(timespec="seconds")
+
+            scheduled_at = _parse_time(arrival.scheduled_time)
+            if arrival.is_realtime and predicted is not None and scheduled_at is not None:
+                arrival.delay_seconds = round((predicted - scheduled_at).total_seconds())
+            if predicted is not None:
+                key = (line, direction)
+                last_predicted[key] = max(predicted, last_predicted.get(key, predicted))
+            getattr(result, direction).append(arrival)
+
+    for slot in slots:
+        if slot["taken"] or slot["when"] < now:
+            continue
+        last = last_predicted.get((slot["line"], slot["direction"]))
+        if last is not None and slot["when"] <= last:
+            continue
+        entry = slot["entry"]
+        minutes = max(0, round((slot["when"] - now).total_seconds() / 60))
+        getattr(result, slot["direction"]).append(Arrival(
+            route_number=entry["route_number"],
+            destination=entry["destination"],
+            direction=slot["direction"],
+            arrival_time=slot["when"].isoformat(timespec="seconds"),
+            scheduled_time=slot["when"].isoformat(timespec="seconds"),
+            minutes_until=minutes,
+            status="Scheduled",
+            is_realtime=False,
+            trip_id=str(entry["trip_id"]),
+        ))
+
+    unknown = float("inf")
+    for direction in ("inbound", "outbound"):
+        getattr(result, direction).sort(key=lambda a: unknown if a.minutes_until is None else a.minutes_until)
+    return result
+
+
+async def merged_arrivals(agency: str, stop_code: str) -> MergedStopArrivals:
+    """
+    Live predictions joined with the schedule for one stop. The schedule lookup runs in a
+    worker thread while the upstream call is in flight, so the response costs one round trip.
+    If the upstream fails the last cached live answer is merged instead, or the schedule alone.
+    """
+    upstream = agency_registry.upstream(agency)
+    horizon = timedelta(minutes=settings.MERGED_SCHEDULE_HORIZON_MINUTES)
+    stop_id = stop_id_for_code(agency, stop_code)
+
+    scheduled, live = await asyncio.gather(
+        asyncio.to_thread(schedule_service.get_upcoming, stop_id, agency, None, horizon),
+        fetch_live_arrivals(agency, stop_code),
+        return_exceptions=True,
+    )
+    if isinstance(scheduled, Exception):
+        log_debug(f"[Arrivals] ⚠️ Schedule lookup failed for {stop_code}: {scheduled}")
+        scheduled = []
+    if isinstance(live, Exception):
+        log_debug(f"[Arrivals] ⚠️ {upstream} unavailable for {stop_code}: {live}")
+        reason = failure_reason(live)
+        live = await cached_arrivals(agency, stop_code)
+        record_fallback(upstream, "cache" if live is not None else "schedule", reason)
+
+    with time_section("arrivals_merge"):
+        return merge_arrivals(agency, stop_code, live, scheduled, datetime.now().astimezone())
@@ -0,0 +1,133 @@
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.integrations.bart_api import (
+    ARRIVAL, COLOR, DELAY, DESTINATION, DIRECTION, HEXCOLOR, LENGTH, PLATFORM, ROUTE, parse_bart_board,
+)
+from app.integrations.rate_limiter import BACKGROUND
+from app.integrations.upstream import upstream_get
+from app.schemas.transit import Arrival, StopArrivals
+from app.services.debug_logger import log_debug
+from app.services.shared_snapshots import SharedSnapshots, record_due
+from app.utils.metrics import record_bart_board, time_section
+
+# The one snapshot, shared as `bartetd:all`
+SNAPSHOT = "all"
+
+
+class BartBoardService:
+    """
+    Departures for every BART station from one etd.aspx?orig=ALL call, served from memory.
+
+    The leader fetches the whole system every BART_BOARD_POLL_SECONDS and parses it once
+    into per-station arrays of departures (epoch time, line, destination, direction,
+    platform, ...), then shares that snapshot with every worker (SharedSnapshots), each
+    of which loads it within BART_BOARD_SYNC_SECONDS. Per-station lookups and the
+    system-wide board are then dict reads, so BART is called once per interval however
+    many riders ask. `arrivals()` returns None once the snapshot is older than
+    BART_BOARD_MAX_AGE_SECONDS so callers fall back to a per-station call.
+    """
+
+    def __init__(self):
+        # {"fetched_at", "names": {abbr: name}, "stations": {abbr: [entry, ...]}}
+        self.snapshots = SharedSnapshots(
+            "BART board", "bartetd",
+            names=lambda: [SNAPSHOT],
+            max_age=lambda: settings.BART_BOARD_MAX_AGE_SECONDS,
+            sync_seconds=lambda: settings.BART_BOARD_SYNC_SECONDS,
+            on_load=self._loaded,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return settings.BART_BOARD_ENABLED
+
+    # --- Fetch (leader) ---
+
+    async def poll(self):
+        """Leader job: refresh the snapshot."""
+        try:
+            await self.refresh()
+        except Exception as e:
+            log_debug(f"[BART board] ❌ Refresh failed: {e}")
+
+    async def refresh(self) -> int:
+        """Fetch and parse every station's departures, then publish the snapshot. Returns the departure count."""
+        url = f"{settings.BART_API_BASE_URL}/etd.aspx"
+        params = {"cmd": "etd", "orig": "ALL", "key": settings.BART_API_KEY, "json": "y"}
+        response = await upstream_get("bart", "bart", "etd_all", url, params=params, priority=BACKGROUND, hedge=False)
+        response.raise_for_status()
+        fetched_at = time.time()
+        with time_section("bart_board_parse"):
+            names, stations = parse_bart_board(response.json(), fetched_at)
+        snapshot = {"fetched_at": fetched_at, "names": names, "stations": stations}
+        await self.snapshots.publish(SNAPSHOT, snapshot)
+        record_due(fetched_at, stations, self._stop_arrivals)
+        count = sum(len(entries) for entries in stations.values())
+        log_debug(f"[BART board] ✓ {count} departures at {len(stations)} stations")
+        return count
+
+    # --- Share (all workers) ---
+
+    @staticmethod
+    def _loaded(_: str, snapshot: Dict[str, Any]):
+        departures = sum(len(entries) for entries in snapshot["stations"].values())
+        record_bart_board(departures, time.time() - snapshot["fetched_at"])
+
+    # --- Serve ---
+
+    @staticmethod
+    def _stop_arrivals(stop_code: str, entries: List[list], now: float) -> StopArrivals:
+        result = StopArrivals(agency="bart", stop_code=stop_code, source="realtime")
+        for entry in entries:
+            minutes = round((entry[ARRIVAL] - now) / 60)
+            if minutes < 0:
+                continue
+            getattr(result, entry[DIRECTION]).append(Arrival(
+                route_number=entry[ROUTE],
+                destination=entry[DESTINATION],
+                direction=entry[DIRECTION],
+                arrival_time=datetime.fromtimestamp(entry[ARRIVAL], timezone.utc).isoformat(timespec="seconds"),
+                minutes_until=minutes,
+                status="Due" if minutes == 0 else f"{minutes} min",
+                platform=entry[PLATFORM],
+                color=entry[COLOR],
+                hexcolor=entry[HEXCOLOR],
+                length=entry[LENGTH],
+                delay_seconds=entry[DELAY],
+            ))
+        return result
+
+    def arrivals(self, stop_code: str) -> Optional[StopArrivals]:
+        """
+        Departures at a station from the snapshot, or None when there is no fresh snapshot
+        or the snapshot does not list the station (the caller then asks BART directly).
+        """
+        now = time.time()
+        snapshot = self.snapshots.get(SNAPSHOT, now)
+        entries = snapshot["stations"].get(stop_code.upper()) if snapshot is not None else None
+        if entries is None:
+            return None
+        return self._stop_arrivals(stop_code, entries, now)
+
+    def board(self, stations: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Every station's departures (or only `stations`), or None when there is no fresh snapshot."""
+        now = time.time()
+        snapshot = self.snapshots.get(SNAPSHOT, now)
+        if snapshot is None:
+            return None
+        codes = [code.upper() for code in stations] if stations else sorted(snapshot["stations"])
+        return {
+            "fetched_at": datetime.fromtimestamp(snapshot["fetched_at"], timezone.utc).isoformat(timespec="seconds"),
+            "age_seconds": round(now - snapshot["fetched_at"], 1),
+            "stations": [
+                {"name": snapshot["names"].get(code, code),
+                 **self._stop_arrivals(code, snapshot["stations"][code], now).model_dump()}
+                for code in codes if code in snapshot["stations"]
+            ],
+        }
+
+
+bart_board = BartBoardService()
@@ -1,7 +1,13 @@
-from colorama import Fore, Style, init
+_colors = None
 
-# Initialize colorama for Windows compatibility
-init(autoreset=True)
+
+def _init_colors():
+    # colorama is loaded on the first message rather than with the app, and initialized
+    # for Windows compatibility then
+    from colorama import Fore, Style, init
+
+    init(autoreset=True)
+    return Fore.CYAN, Style.RESET_ALL
 
 def log_debug(message: str):
     """
@@ -10,4 +16,8 @@ def log_debug(message: str):
     Args:
         message (str): The debug message to print.
     """
-    print(f"{Fore.CYAN}[DEBUG] {message}{Style.RESET_ALL}")
+    global _colors
+    if _colors is None:
+        _colors = _init_colors()
+    cyan, reset = _colors
+    print(f"{cyan}[DEBUG] {message}{reset}")
@@ -0,0 +1,112 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app.config import settings
+from app.db.database import get_engine
+from app.models.arrival_observation import ArrivalObservation
+from app.services.debug_logger import log_debug
+from app.utils.metrics import time_section
+
+# group_by name -> column of arrival_observations
+GROUP_COLUMNS = {"route": "line", "stop": "stop_code", "hour": "hour", "weekday": "weekday"}
+PERCENTILES = (0.5, 0.9, 0.95)
+# SFMTA's on-time window: no more than 1 minute early or 4 minutes late
+ON_TIME_EARLY, ON_TIME_LATE = -60, 240
+
+
+class DelayAnalytics:
+    """
+    Delay statistics over the recorded arrival history.
+
+    Only predictions made within DELAY_ARRIVAL_MINUTES of arrival count: by then the
+    prediction is close to when the vehicle actually came, so its delay is the delay
+    the rider saw. Rows are read with only the columns needed and aggregated in one
+    pandas groupby (percentiles, mean, on-time share) per call. The scheduled fallback is
+    shifted by `typical_delays`, the median delay of a line and hour over
+    DELAY_HISTORY_DAYS once DELAY_MIN_SAMPLES observations back it.
+    """
+
+    def __init__(self):
+        # (agency, stop_code) -> (expires at, {(line, hour): median delay seconds})
+        self._typical: Dict[Tuple[str, str], Tuple[float, Dict[Tuple[str, int], int]]] = {}
+        # One lock per stop, so a slow history read only holds up callers of that stop
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _observations(self, agency: str, days: int, stop_code: Optional[str] = None,
+                      line: Optional[str] = None) -> pd.DataFrame:
+        table = ArrivalObservation.__table__
+        query = select(table.c.stop_code, table.c.line, table.c.hour, table.c.weekday, table.c.delay_seconds).where(
+            table.c.agency == agency,
+            table.c.observed_at >= datetime.utcnow() - timedelta(days=days),
+            table.c.minutes_until <= settings.DELAY_ARRIVAL_MINUTES,
+            table.c.delay_seconds.is_not(None),
+        )
+        if stop_code:
+            query = query.where(table.c.stop_code == stop_code)
+        if line:
+            query = query.where(table.c.line == line.upper())
+        with time_section("delay_history_load"):
+            return pd.read_sql(query, con=get_engine())
+
+    def percentiles(self, agency: str, stop_code: Optional[str] = None, route: Optional[str] = None,
+                    days: int = 7, group_by: Sequence[str] = ("route", "hour")) -> List[Dict[str, Any]]:
+        """Delay percentiles (seconds, late is positive) per group, busiest groups first."""
+        df = self._observations(agency, days, stop_code, route)
+        if df.empty:
+            return []
+
+        keys = [GROUP_COLUMNS[name] for name in group_by]
+        with time_section("delay_aggregate"):
+            delays = df["delay_seconds"].to_numpy(dtype=np.float64)
+            df["on_time"] = (delays >= ON_TIME_EARLY) & (delays <= ON_TIME_LATE)
+            grouped = df.groupby(keys, sort=False)
+            stats = grouped["delay_seconds"].quantile(list(PERCENTILES)).unstack()
+            stats.columns = [f"p{round(q * 100)}" for q in PERCENTILES]
+            stats["observations"] = grouped.size()
+            stats["mean_delay_seconds"] = grouped["delay_seconds"].mean()
+            stats["on_time_share"] = grouped["on_time"].mean()
+            stats = stats.reset_index().sort_values(["observations", *keys], ascending=[False] + [True] * len(keys))
+
+        stats = stats.rename(columns={"line": "route"}).round(
+            {"mean_delay_seconds": 1, "on_time_share": 3, **{f"p{round(q * 100)}": 1 for q in PERCENTILES}}
+        )
+        return stats.to_dict("records")
+
+    def typical_delays(self, agency: str, stop_code: str) -> Dict[Tuple[str, int], int]:
+        """
+        Median delay per (line, local hour) at a stop over DELAY_HISTORY_DAYS, for
+        groups with at least DELAY_MIN_SAMPLES observations. Cached per stop for
+        DELAY_CACHE_SECONDS; empty when there is no history (or no table yet).
+        Reads the database on a miss, so call it from a worker thread.
+        """
+        key = (agency, stop_code)
+        cached = self._typical.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            cached = self._typical.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            try:
+                df = self._observations(agency, settings.DELAY_HISTORY_DAYS, stop_code)
+                grouped = df.groupby(["line", "hour"])["delay_seconds"]
+                medians = grouped.median()[grouped.size() >= settings.DELAY_MIN_SAMPLES]
+                typical = {(line, int(hour)): int(round(delay)) for (line, hour), delay in medians.items()}
+            except Exception as e:
+                log_debug(f"[Delays] ⚠️ No delay history for {agency}:{stop_code}: {e}")
+                typical = {}
+            self._typical[key] = (time.monotonic() + settings.DELAY_CACHE_SECONDS, typical)
+            return typical
+
+
+delay_analytics = DelayAnalytics()
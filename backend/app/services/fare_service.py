@@ -0,0 +1,183 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.debug_logger import log_debug
+from app.services.gtfs_service import GTFSService
+
+ADULT_CATEGORY = "adult"
+
+
+def _as_key(value: Any) -> str:
+    """Normalize ids read from GTFS (ints, floats like 76968.0, strings) to plain strings."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class FareService:
+    """
+    BART fare engine.
+
+    At feed load the GTFS fare tables (fare_attributes, fare_rules by origin/destination
+    zone, fare_rider_categories) are compiled into a dense float32 matrix indexed
+    [origin station, destination station, rider category], so a single or batch O-D
+    query is an array lookup instead of a join over the fare tables.
+    """
+
+    def __init__(self, agency: str = "bart"):
+        self.service = GTFSService(agency)
+        self.matrix: Optional[np.ndarray] = None
+        self.currency = "USD"
+        self.stations: List[Dict[str, Any]] = []
+        self.station_index: Dict[str, int] = {}
+        self.categories: List[Dict[str, str]] = []
+        self.category_index: Dict[str, int] = {}
+
+    def preload(self) -> int:
+        """Compile the fare matrix. Returns the number of priced O-D pairs."""
+        stops = self.service.get_stops()
+        fares = self.service.get_fare_attributes()
+        rules = self.service.get_fare_rules()
+        rider_fares = self.service.get_fare_rider_categories()
+        rider_categories = self.service.get_rider_categories()
+
+        stops = stops.assign(
+            stop_id=stops["stop_id"].map(_as_key),
+            zone_id=stops["zone_id"].map(_as_key),
+            parent_station=stops["parent_station"].map(_as_key) if "parent_station" in stops else "",
+            location_type=pd.to_numeric(stops.get("location_type", 0), errors="coerce").fillna(0).astype(int),
+        )
+        rules = rules.assign(
+            fare_id=rules["fare_id"].map(_as_key),
+            origin_id=rules["origin_id"].map(_as_key),
+            destination_id=rules["destination_id"].map(_as_key),
+        )
+        priced_zones = set(rules["origin_id"]) | set(rules["destination_id"])
+
+        # One matrix row per platform-level station whose zone is priced
+        stations = stops[(stops["location_type"] == 0) & stops["zone_id"].isin(priced_zones)]
+        stations = stations.drop_duplicates("zone_id").reset_index(drop=True)
+        zone_to_idx = pd.Series(stations.index.values, index=stations["zone_id"])
+
+        station_index = {sid.upper(): i for i, sid in enumerate(stations["stop_id"])}
+        # Entrances and parent "place_" stops resolve to their station
+        parent_to_idx = {p: i for i, p in enumerate(stations["parent_station"]) if p}
+        for _, child in stops[stops["parent_station"] != ""].iterrows():
+            idx = parent_to_idx.get(child["parent_station"])
+            if idx is not None:
+                station_index.setdefault(child["stop_id"].upper(), idx)
+        for parent, idx in parent_to_idx.items():
+            station_index.setdefault(parent.upper(), idx)
+
+        categories = [{"id": ADULT_CATEGORY, "description": "Adult Clipper"}]
+        for _, row in rider_categories.iterrows():
+            categories.append({"id": _as_key(row["rider_category_id"]),
+                               "description": str(row["rider_category_description"])})
+        category_index = {c["id"]: i for i, c in enumerate(categories)}
+
+        n, c = len(stations), len(categories)
+        matrix = np.full((n, n, c), np.nan, dtype=np.float32)
+
+        origin = rules["origin_id"].map(zone_to_idx)
+        destination = rules["destination_id"].map(zone_to_idx)
+        valid = origin.notna() & destination.notna()
+        rules = rules[valid]
+        o_idx = origin[valid].astype(int).to_numpy()
+        d_idx = destination[valid].astype(int).to_numpy()
+
+        base_price = pd.to_numeric(
+            rules["fare_id"].map(pd.Series(fares["price"].values, index=fares["fare_id"].map(_as_key))),
+            errors="coerce",
+        ).to_numpy(dtype=np.float32)
+        matrix[o_idx, d_idx, 0] = base_price
+
+        if not rider_fares.empty:
+            rider_fares = rider_fares.assign(
+                fare_id=rider_fares["fare_id"].map(_as_key),
+                rider_category_id=rider_fares["rider_category_id"].map(_as_key),
+            )
+            by_category = rider_fares.pivot_table(
+                index="fare_id", columns="rider_category_id", values="price", aggfunc="first"
+            )
+            for category_id, column in by_category.items():
+                ci = category_index.get(category_id)
+                if ci is None:
+                    continue
+                prices = pd.to_numeric(rules["fare_id"].map(column), errors="coerce").to_numpy(dtype=np.float32)
+                matrix[o_idx, d_idx, ci] = prices
+
+        if "currency_type" in fares and not fares.empty:
+            self.currency = str(fares["currency_type"].iloc[0])
+
+        self.stations = [
+            {"index": i, "stop_id": row["stop_id"], "stop_name": row["stop_name"], "zone_id": row["zone_id"]}
+            for i, row in stations.iterrows()
+        ]
+        self.station_index = station_index
+        self.categories = categories
+        self.category_index = category_index
+        self.matrix = matrix
+
+        priced = int(np.count_nonzero(~np.isnan(matrix[:, :, 0])))
+        log_debug(f"[FareService] ✓ Compiled {n}x{n}x{c} fare matrix ({priced} priced O-D pairs)")
+        return priced
+
+    def _ensure_loaded(self):
+        if self.matrix is None:
+            self.preload()
+
+    def resolve_category(self, category: Optional[str]) -> Optional[int]:
+        self._ensure_loaded()
+        key = (category or ADULT_CATEGORY).strip().lower()
+        if key in self.category_index:
+            return self.category_index[key]
+        for i, c in enumerate(self.categories):
+            if c["description"].lower() == key:
+                return i
+        return None
+
+    def lookup(self, origin_idx: np.ndarray, destination_idx: np.ndarray, category_idx: int) -> np.ndarray:
+        """Vectorized fare lookup for arrays of station indices (NaN where no fare exists)."""
+        self._ensure_loaded()
+        return self.matrix[origin_idx, destination_idx, category_idx]
+
+    def get_fares(self, pairs: List[Tuple[str, str]], category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Answer a batch of (origin, destination) station codes in one array lookup.
+        Unknown stations or pairs without a fare get `fare: None` and an `error`.
+        """
+        ci = self.resolve_category(category)
+        if ci is None:
+            raise ValueError(f"Unknown rider category: {category}")
+
+        missing = -1
+        o_idx = np.array([self.station_index.get(o.strip().upper(), missing) for o, _ in pairs], dtype=np.int64)
+        d_idx = np.array([self.station_index.get(d.strip().upper(), missing) for _, d in pairs], dtype=np.int64)
+        known = (o_idx >= 0) & (d_idx >= 0)
+
+        prices = np.full(len(pairs), np.nan, dtype=np.float32)
+        if known.any():
+            prices[known] = self.lookup(o_idx[known], d_idx[known], ci)
+
+        results = []
+        for (origin, destination), ok, price in zip(pairs, known, prices.tolist()):
+            entry = {
+                "origin": origin.upper(),
+                "destination": destination.upper(),
+                "rider_category": self.categories[ci]["id"],
+                "fare": None if np.isnan(price) else round(price, 2),
+                "currency": self.currency,
+            }
+            if not ok:
+                entry["error"] = "Unknown station"
+            elif entry["fare"] is None:
+                entry["error"] = "No fare for this origin/destination"
+            results.append(entry)
+        return results
+
+
+fare_service = FareService()
@@ -1,7 +1,8 @@
 from typing import Optional, List
 import pandas as pd
 from sqlalchemy import text
-from app.db.database import engine
+from app.db.database import get_engine
+from app.utils.metrics import track_db
 
 class GTFSService:
     def __init__(self, agency: str = "muni"):
@@ -13,27 +14,66 @@ class GTFSService:
         query = f"SELECT * FROM {full_table}"
         if where:
             query += f" WHERE {where}"
-        return pd.read_sql(text(query), con=engine, params=params)
+        return pd.read_sql(text(query), con=get_engine(), params=params)
 
+    @track_db
     def get_routes(self) -> pd.DataFrame:
         return self._query("routes")
 
+    @track_db
     def get_route_by_id(self, route_id: str) -> pd.DataFrame:
         return self._query("routes", "route_id = :route_id", {"route_id": route_id})
 
+    @track_db
     def get_trips_by_route(self, route_id: str) -> pd.DataFrame:
         return self._query("trips", "route_id = :route_id", {"route_id": route_id})
 
+    @track_db
+    def get_trips(self) -> pd.DataFrame:
+        return self._query("trips")
+
+    @track_db
+    def get_stop_times(self) -> pd.DataFrame:
+        return self._query("stop_times")
+
+    @track_db
+    def get_timepoints(self) -> pd.DataFrame:
+        return self._query("timepoints")
+
+    @track_db
+    def get_stop_times_for_stop(self, stop_id: str) -> pd.DataFrame:
+        return self._query("stop_times", "stop_id = :stop_id", {"stop_id": stop_id})
+
+    @track_db
     def get_trip_stop_times(self, trip_id: str) -> pd.DataFrame:
         return self._query("stop_times", "trip_id = :trip_id ORDER BY stop_sequence", {"trip_id": trip_id})
 
+    @track_db
     def get_stops(self) -> pd.DataFrame:
         return self._query("stops")
 
+    @track_db
+    def get_stop_bounds(self) -> pd.DataFrame:
+        """One row with the stops' min/max latitude and longitude, without reading the stops."""
+        query = f"""
+            SELECT MIN(stop_lat) AS min_lat, MAX(stop_lat) AS max_lat,
+                   MIN(stop_lon) AS min_lon, MAX(stop_lon) AS max_lon
+            FROM {self.prefix}stops
+        """
+        return pd.read_sql(text(query), con=get_engine())
+
+    @track_db
     def get_stop_by_id(self, stop_id: str) -> pd.DataFrame:
         return self._query("stops", "stop_id = :stop_id", {"stop_id": stop_id})
 
+    @track_db
     def get_stops_for_trip(self, trip_id: str) -> pd.DataFrame:
+        # Served from the compact in-memory stop_times once warm-up has built it
+        from app.services.stop_times_index import get_stop_times_index
+        index = get_stop_times_index(self.agency)
+        if index is not None:
+            return index.trip_frame(trip_id)
+
         query = f"""
             SELECT s.stop_id, s.stop_name, st.arrival_time, st.departure_time, st.stop_sequence
             FROM {self.prefix}stop_times st
@@ -41,21 +81,63 @@ class GTFSService:
             WHERE st.trip_id = :trip_id
             ORDER BY st.stop_sequence
         """
-        return pd.read_sql(text(query), con=engine, params={"trip_id": trip_id})
+        return pd.read_sql(text(query), con=get_engine(), params={"trip_id": trip_id})
 
+    @track_db
     def get_shapes_by_trip(self, shape_id: str) -> pd.DataFrame:
         return self._query("shapes", "shape_id = :shape_id ORDER BY shape_pt_sequence", {"shape_id": shape_id})
 
+    @track_db
+    def get_shapes(self) -> pd.DataFrame:
+        return self._query("shapes")
+
+    @track_db
+    def get_stop_routes(self) -> pd.DataFrame:
+        """Distinct (stop_id, route_id) pairs: which routes serve each stop."""
+        query = f"""
+            SELECT DISTINCT st.stop_id, t.route_id
+            FROM {self.prefix}stop_times st
+            JOIN {self.prefix}trips t ON st.trip_id = t.trip_id
+        """
+        return pd.read_sql(text(query), con=get_engine())
+
+    @track_db
+    def get_feed_info(self) -> pd.DataFrame:
+        return self._query("feed_info")
+
+    @track_db
+    def get_fare_attributes(self) -> pd.DataFrame:
+        return self._query("fare_attributes")
+
+    @track_db
+    def get_fare_rules(self) -> pd.DataFrame:
+        return self._query("fare_rules")
+
+    @track_db
+    def get_fare_rider_categories(self) -> pd.DataFrame:
+        return self._query("fare_rider_categories")
+
+    @track_db
+    def get_rider_categories(self) -> pd.DataFrame:
+        return self._query("rider_categories")
+
+    @track_db
+    def get_directions(self) -> pd.DataFrame:
+        return self._query("directions")
+
+    @track_db
     def get_calendar(self) -> pd.DataFrame:
         return self._query("calendar")
 
+    @track_db
     def get_calendar_dates(self) -> pd.DataFrame:
         return self._query("calendar_dates")
 
+    @track_db
     def list_tables(self) -> List[str]:
         like_prefix = f"{self.prefix}%"
         query = """
             SELECT table_name FROM information_schema.tables
             WHERE table_schema = 'public' AND table_name LIKE :like_prefix
         """
-        return pd.read_sql(text(query), con=engine, params={"like_prefix": like_prefix})["table_name"].tolist()
+        return pd.read_sql(text(query), con=get_engine(), params={"like_prefix": like_prefix})["table_name"].tolist()
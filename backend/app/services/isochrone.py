@@ -0,0 +1,317 @@
+import math
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.debug_logger import log_debug
+from app.services.schedule_service import schedule_service
+from app.services.stop_helper import load_stops
+from app.services.stop_times_index import CompactStopTimes, get_stop_times_index, preload_stop_times
+from app.utils.metrics import time_section
+
+WALK_SPEED = 1.25  # m/s, about 4.5 km/h
+# Longest walk to the first stop, from the last one, and between stops when changing
+MAX_WALK_METERS = 800.0
+TRANSFER_METERS = 250.0
+# Time to get off one vehicle and onto another at the same stop
+CHANGE_SECONDS = 60
+# Directions sampled for the outline polygon
+BEARINGS = 72
+
+_EARTH_RADIUS_M = 6371000.0
+
+
+class TransitNetwork:
+    """
+    One service day of the combined timetable as flat arrays, for connection scans.
+
+    Every trip running that day (plus the after-midnight tail of the previous day's
+    trips) is cut into elementary connections (stop → next stop), sorted by departure:
+    departure/arrival stop, departure/arrival seconds after midnight and trip, one NumPy
+    array each. Stops of all agencies share one index space with planar coordinates in
+    meters, and walking transfers between stops within TRANSFER_METERS are a CSR
+    adjacency (ptr/to/seconds).
+    """
+
+    def __init__(self, day: date):
+        self.day = day
+        self.agencies: List[str] = []
+        self.stop_agency = np.array([], dtype=object)
+        self.stop_ids = np.array([], dtype=object)
+        self.stop_codes = np.array([], dtype=object)
+        self.stop_names = np.array([], dtype=object)
+        self.lat = np.array([])
+        self.lon = np.array([])
+        self.x = np.array([])
+        self.y = np.array([])
+        self.served = np.array([], dtype=bool)
+        self.trip_count = 0
+        self.dep_stop = np.array([], dtype=np.int32)
+        self.arr_stop = np.array([], dtype=np.int32)
+        self.dep_time = np.array([], dtype=np.int32)
+        self.arr_time = np.array([], dtype=np.int32)
+        self.trip = np.array([], dtype=np.int32)
+        self.transfer_ptr = np.zeros(1, dtype=np.int64)
+        self.transfer_to = np.array([], dtype=np.int32)
+        self.transfer_seconds = np.array([], dtype=np.int32)
+
+    @staticmethod
+    def _connections(agency: str, compact: CompactStopTimes, services: list,
+                     shift: int) -> Tuple[np.ndarray, ...]:
+        """(dep stop, arr stop, dep time, arr time, trip) for the trips of `services`, times moved by `shift`."""
+        service_of_trip = schedule_service.aligned_trips(agency, compact)["service_id"]
+        trips = np.flatnonzero(np.isin(service_of_trip, services)).astype(np.int32)
+        profiles = compact.trip_profile[trips]
+        patterns = compact.profile_pattern[profiles]
+        hops = (compact.pattern_ptr[patterns + 1] - compact.pattern_ptr[patterns] - 1).clip(min=0)
+
+        # Position of every connection within its trip: 0..hops-1, trip after trip
+        trip_of = np.repeat(np.arange(len(trips)), hops)
+        first = np.concatenate([[0], np.cumsum(hops)[:-1]]) if len(hops) else np.array([], dtype=np.int64)
+        position = np.arange(int(hops.sum())) - np.repeat(first, hops)
+
+        stop_at = compact.pattern_ptr[patterns][trip_of] + position
+        time_at = compact.profile_ptr[profiles][trip_of] + position
+        start = compact.trip_start[trips][trip_of] + shift
+        return (
+            compact.pattern_stops[stop_at],
+            compact.pattern_stops[stop_at + 1],
+            (compact.profile_departure[time_at] + start).astype(np.int32),
+            (compact.profile_arrival[time_at + 1] + start).astype(np.int32),
+            trips[trip_of],
+        )
+
+    @classmethod
+    def build(cls, day: date) -> "TransitNetwork":
+        network = cls(day)
+        moment = datetime(day.year, day.month, day.day)
+        parts = {name: [] for name in ("dep_stop", "arr_stop", "dep_time", "arr_time", "trip")}
+        stop_agency, stop_ids, stop_codes, stop_names, lat, lon, served = [], [], [], [], [], [], []
+        stop_offset = trip_offset = 0
+
+        for agency in settings.GTFS_AGENCIES:
+            compact = get_stop_times_index(agency)
+            if compact is None and preload_stop_times(agency)["rows"]:
+                compact = get_stop_times_index(agency)
+            if compact is None:
+                continue
+
+            catalog = {str(s["stop_id"]): s for s in load_stops(agency)}
+            for stop_id in compact.stop_ids:
+                stop = catalog.get(stop_id, {})
+                stop_agency.append(agency)
+                stop_ids.append(stop_id)
+                stop_codes.append(stop.get("stop_code") or stop_id)
+                stop_names.append(stop.get("stop_name") or "")
+                lat.append(stop.get("stop_lat", math.nan))
+                lon.append(stop.get("stop_lon", math.nan))
+
+            today = schedule_service.active_service_ids(agency, moment)
+            yesterday = schedule_service.active_service_ids(agency, moment - timedelta(days=1))
+            for services, shift in ((today, 0), (yesterday, -86400)):
+                dep_stop, arr_stop, dep_time, arr_time, trip = cls._connections(agency, compact, services, shift)
+                keep = arr_time >= 0
+                parts["dep_stop"].append(dep_stop[keep] + stop_offset)
+                parts["arr_stop"].append(arr_stop[keep] + stop_offset)
+                parts["dep_time"].append(dep_time[keep])
+                parts["arr_time"].append(arr_time[keep])
+                parts["trip"].append(trip[keep] + trip_offset)
+
+            # Entrances and parent stations have no stop_times; they are never reported
+            served.append(np.diff(compact.stop_event_ptr) > 0)
+            network.agencies.append(agency)
+            stop_offset += len(compact.stop_ids)
+            trip_offset += len(compact.trip_ids)
+
+        if not network.agencies:
+            raise RuntimeError("No agency has a stop_times index to build the network from")
+
+        order = np.argsort(np.concatenate(parts["dep_time"]), kind="stable")
+        for name, chunks in parts.items():
+            setattr(network, name, np.concatenate(chunks)[order].astype(np.int32))
+        network.trip_count = trip_offset
+        network.stop_agency = np.array(stop_agency, dtype=object)
+        network.stop_ids = np.array(stop_ids, dtype=object)
+        network.stop_codes = np.array(stop_codes, dtype=object)
+        network.stop_names = np.array(stop_names, dtype=object)
+        network.lat = np.array(lat, dtype=np.float64)
+        network.lon = np.array(lon, dtype=np.float64)
+        network.x, network.y = project(network.lat, network.lon)
+        network.served = np.concatenate(served)
+        network._build_transfers()
+        return network
+
+    def _build_transfers(self, chunk: int = 256):
+        located = np.flatnonzero(self.served & ~np.isnan(self.x))
+        # Sorted by x, a chunk of stops only needs comparing with the band of stops within reach in x
+        located = located[np.argsort(self.x[located], kind="stable")]
+        xs, ys = self.x[located], self.y[located]
+        sources, targets, meters = [], [], []
+        for start in range(0, len(located), chunk):
+            end = min(start + chunk, len(located))
+            lo = int(np.searchsorted(xs, xs[start] - TRANSFER_METERS, side="left"))
+            hi = int(np.searchsorted(xs, xs[end - 1] + TRANSFER_METERS, side="right"))
+            distance = np.hypot(xs[start:end, None] - xs[None, lo:hi], ys[start:end, None] - ys[None, lo:hi])
+            rows, cols = np.nonzero(distance <= TRANSFER_METERS)
+            source, target = located[rows + start], located[cols + lo]
+            different = source != target
+            sources.append(source[different])
+            targets.append(target[different])
+            meters.append(distance[rows, cols][different])
+
+        source = np.concatenate(sources) if sources else np.array([], dtype=np.int64)
+        order = np.argsort(source, kind="stable")
+        self.transfer_to = np.concatenate(targets)[order].astype(np.int32) if targets else self.transfer_to
+        self.transfer_seconds = np.ceil(np.concatenate(meters)[order] / WALK_SPEED).astype(np.int32) if meters else self.transfer_seconds
+        self.transfer_ptr = np.searchsorted(source[order], np.arange(len(self.x) + 1)).astype(np.int64)
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.dep_time)
+
+
+def project(lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular projection to meters around the Bay Area; accurate to well under 1% here."""
+    lat0 = math.radians(37.77)
+    x = np.radians(np.asarray(lon, dtype=np.float64)) * _EARTH_RADIUS_M * math.cos(lat0)
+    y = np.radians(np.asarray(lat, dtype=np.float64)) * _EARTH_RADIUS_M
+    return x, y
+
+
+def unproject(x, y) -> Tuple[np.ndarray, np.ndarray]:
+    lat0 = math.radians(37.77)
+    return np.degrees(y / _EARTH_RADIUS_M), np.degrees(x / (_EARTH_RADIUS_M * math.cos(lat0)))
+
+
+class IsochroneService:
+    """
+    "Where can I get in N minutes from here", answered with a connection scan.
+
+    From the origin, every stop within MAX_WALK_METERS is reached on foot. The scan
+    then walks the day's connections departing inside [departure, departure + budget]
+    once, in departure order, boarding a connection when its trip is already boarded or
+    its stop is reached in time (CHANGE_SECONDS after arriving by another vehicle), and
+    relaxes walking transfers from every improved stop. The result is the earliest
+    arrival at every reachable stop; the outline polygon is the farthest point reachable
+    in each of BEARINGS directions, walking the remaining time from a reached stop.
+    """
+
+    def __init__(self):
+        self._networks: "OrderedDict[date, TransitNetwork]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def network(self, day: date) -> TransitNetwork:
+        network = self._networks.get(day)
+        if network is None:
+            with self._lock:
+                network = self._networks.get(day)
+                if network is None:
+                    with time_section("isochrone_network_build"):
+                        network = TransitNetwork.build(day)
+                    log_debug(f"[Isochrone] ✓ {day}: {network.connection_count} connections, "
+                              f"{len(network.stop_ids)} stops, {len(network.transfer_to)} transfers")
+                    self._networks[day] = network
+                    while len(self._networks) > 2:
+                        self._networks.popitem(last=False)
+        return network
+
+    def _scan(self, network: TransitNetwork, origin_x: float, origin_y: float,
+              start: int, limit: int) -> np.ndarray:
+        walk = np.hypot(network.x - origin_x, network.y - origin_y)
+        walk = np.where(network.served & (walk <= MAX_WALK_METERS), walk, np.inf)
+        arrival = (start + np.ceil(walk / WALK_SPEED)).tolist()
+        ready = list(arrival)
+        boarded = [False] * network.trip_count
+
+        lo = int(np.searchsorted(network.dep_time, start, side="left"))
+        hi = int(np.searchsorted(network.dep_time, limit, side="right"))
+        transfer_ptr = network.transfer_ptr.tolist()
+        transfer_to = network.transfer_to.tolist()
+        transfer_seconds = network.transfer_seconds.tolist()
+
+        for dep_stop, arr_stop, dep_time, arr_time, trip in zip(
+            network.dep_stop[lo:hi].tolist(), network.arr_stop[lo:hi].tolist(),
+            network.dep_time[lo:hi].tolist(), network.arr_time[lo:hi].tolist(), network.trip[lo:hi].tolist(),
+        ):
+            if not boarded[trip]:
+                if ready[dep_stop] > dep_time:
+                    continue
+                boarded[trip] = True
+            if arr_time >= arrival[arr_stop] or arr_time > limit:
+                continue
+            arrival[arr_stop] = arr_time
+            if arr_time + CHANGE_SECONDS < ready[arr_stop]:
+                ready[arr_stop] = arr_time + CHANGE_SECONDS
+            for k in range(transfer_ptr[arr_stop], transfer_ptr[arr_stop + 1]):
+                other = transfer_to[k]
+                walked = arr_time + transfer_seconds[k]
+                if walked < arrival[other]:
+                    arrival[other] = walked
+                if walked < ready[other]:
+                    ready[other] = walked
+        return np.array(arrival, dtype=np.float64)
+
+    def _outline(self, origin_x: float, origin_y: float, x: np.ndarray, y: np.ndarray,
+                 radius: np.ndarray) -> List[List[float]]:
+        """Ring of the farthest reachable point per bearing, as [lon, lat] pairs."""
+        angles = np.linspace(0, 2 * math.pi, BEARINGS, endpoint=False)
+        ux, uy = np.cos(angles), np.sin(angles)
+        cx, cy = (x - origin_x)[:, None], (y - origin_y)[:, None]
+        along = cx * ux + cy * uy
+        # Where the ray leaves each circle: along + sqrt(r^2 - perpendicular^2)
+        disc = radius[:, None] ** 2 - (cx * cx + cy * cy - along * along)
+        with np.errstate(invalid="ignore"):
+            reach = np.where(disc >= 0, along + np.sqrt(disc), 0.0)
+        farthest = reach.max(axis=0).clip(min=0)
+        lat, lon = unproject(origin_x + farthest * ux, origin_y + farthest * uy)
+        ring = [[round(float(a), 6), round(float(b), 6)] for a, b in zip(lon, lat)]
+        return ring + ring[:1]
+
+    def isochrone(self, lat: float, lon: float, minutes: int, departure: datetime) -> Dict[str, Any]:
+        network = self.network(departure.date())
+        origin_x, origin_y = (float(v) for v in project(lat, lon))
+        start = departure.hour * 3600 + departure.minute * 60 + departure.second
+        limit = start + minutes * 60
+
+        with time_section("isochrone_scan"):
+            arrival = self._scan(network, origin_x, origin_y, start, limit)
+        reached = np.flatnonzero((arrival <= limit) & network.served)
+        reached = reached[np.argsort(arrival[reached], kind="stable")]
+
+        remaining = (limit - arrival[reached]) * WALK_SPEED
+        radius = np.minimum(remaining, MAX_WALK_METERS)
+        # The origin itself, walking the whole budget (capped like any other walk)
+        x = np.concatenate([[origin_x], network.x[reached]])
+        y = np.concatenate([[origin_y], network.y[reached]])
+        radius = np.concatenate([[min(minutes * 60 * WALK_SPEED, MAX_WALK_METERS)], radius])
+        outline = self._outline(origin_x, origin_y, x, y, radius)
+
+        midnight = datetime(departure.year, departure.month, departure.day)
+        stops = [
+            {
+                "agency": network.stop_agency[s],
+                "stop_id": network.stop_ids[s],
+                "stop_code": network.stop_codes[s],
+                "stop_name": network.stop_names[s],
+                "lat": float(network.lat[s]),
+                "lon": float(network.lon[s]),
+                "minutes": round(float(arrival[s] - start) / 60, 1),
+                "arrival_time": (midnight + timedelta(seconds=int(arrival[s]))).isoformat(timespec="seconds"),
+            }
+            for s in reached.tolist()
+        ]
+        return {
+            "origin": {"lat": lat, "lon": lon},
+            "departure": departure.isoformat(timespec="seconds"),
+            "minutes": minutes,
+            "agencies": network.agencies,
+            "stops": stops,
+            "polygon": {"type": "Polygon", "coordinates": [outline]},
+        }
+
+
+isochrone_service = IsochroneService()
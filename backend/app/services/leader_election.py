@@ -0,0 +1,117 @@
+import asyncio
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.services.debug_logger import log_debug
+from app.utils.cache import get_async_redis
+
+LEADER_KEY = "munibuddy:leader"
+
+# Renew only if we still own the lock
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Release only if we still own the lock
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElection:
+    """
+    Redis lease-based leader election across worker processes.
+    One worker holds `munibuddy:leader` (SET NX PX) and renews it every ttl/3;
+    if it dies the lease expires and another worker takes over.
+    """
+
+    def __init__(self, key: str = LEADER_KEY, ttl: int = settings.LEADER_LOCK_TTL):
+        self.key = key
+        self.ttl_ms = ttl * 1000
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    async def try_acquire(self) -> bool:
+        """Acquire or renew the lease. Returns whether this process is the leader."""
+        try:
+            client = get_async_redis()
+            if self.is_leader:
+                renewed = await client.eval(_RENEW_SCRIPT, 1, self.key, self.identity, self.ttl_ms)
+                self.is_leader = bool(renewed)
+            if not self.is_leader:
+                acquired = await client.set(self.key, self.identity, nx=True, px=self.ttl_ms)
+                self.is_leader = bool(acquired)
+        except Exception as e:
+            # Without Redis there is nobody to coordinate with: a single worker may lead
+            self.is_leader = settings.WEB_CONCURRENCY <= 1
+            log_debug(f"[Leader] ⚠️ Redis unavailable ({e}); leader={self.is_leader}")
+        return self.is_leader
+
+    async def release(self):
+        if not self.is_leader:
+            return
+        try:
+            await get_async_redis().eval(_RELEASE_SCRIPT, 1, self.key, self.identity)
+        except Exception as e:
+            log_debug(f"[Leader] ⚠️ Failed to release lease: {e}")
+        self.is_leader = False
+
+
+class LeaderTaskRunner:
+    """
+    Runs registered periodic jobs (pollers, feed reloads) only on the elected leader.
+    Every worker runs the election loop; followers just keep trying to acquire the lease.
+    """
+
+    def __init__(self, election: Optional[LeaderElection] = None):
+        self.election = election or LeaderElection()
+        self.jobs: Dict[str, Dict] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, name: str, interval: float, job: Callable[[], Awaitable[None]]):
+        """Register an async job to run every `interval` seconds on the leader only."""
+        self.jobs[name] = {"interval": interval, "job": job}
+
+    async def _election_loop(self):
+        period = max(self.election.ttl_ms / 3000, 1)
+        while True:
+            was_leader = self.election.is_leader
+            is_leader = await self.election.try_acquire()
+            if is_leader != was_leader:
+                log_debug(f"[Leader] {'👑 Acquired' if is_leader else '⏬ Lost'} leadership ({self.election.identity})")
+            await asyncio.sleep(period)
+
+    async def _job_loop(self, name: str, interval: float, job: Callable[[], Awaitable[None]]):
+        while True:
+            if self.election.is_leader:
+                try:
+                    await job()
+                except Exception as e:
+                    log_debug(f"[Leader] ❌ Job {name} failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self):
+        if self._tasks or not self.jobs:
+            return
+        self._tasks.append(asyncio.create_task(self._election_loop()))
+        for name, spec in self.jobs.items():
+            self._tasks.append(asyncio.create_task(self._job_loop(name, spec["interval"], spec["job"])))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.election.release()
+
+
+leader_tasks = LeaderTaskRunner()
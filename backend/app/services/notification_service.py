@@ -1,10 +1,277 @@
-def send_notification(user_id, message):
-    """Send a push notification."""
-    print(f"Sending notification to {user_id}: {message}")
-
-    # Placeholder: Simulate notification sending
-    return {
-        "user_id": user_id,
-        "message": message,
-        "status": "Notification sent successfully"
-    }
+import asyncio
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Protocol, Set, Tuple
+
+from app.config import settings
+from app.db.database import SessionLocal
+from app.integrations.rate_limiter import BACKGROUND
+from app.integrations.upstream import get_client
+from app.models.notification import Notification, NotificationSubscription
+from app.services.arrivals_service import batch_arrivals
+from app.services.debug_logger import log_debug
+from app.utils.metrics import record_notification, record_watched_stops
+
+DELIVERY_WORKERS = 4
+# Pending notifications older than this are not resent after a leader change
+RECOVERY_WINDOW = timedelta(minutes=10)
+
+
+class NotificationSink(Protocol):
+    async def send(self, user_id: str, message: str, payload: Dict[str, Any]) -> None:
+        """Deliver one notification; raise to have it retried."""
+
+
+class LogSink:
+    """Writes notifications to the debug log (default)."""
+
+    async def send(self, user_id: str, message: str, payload: Dict[str, Any]) -> None:
+        log_debug(f"[Notify] 📣 {user_id}: {message}")
+
+
+class MemorySink:
+    """Keeps delivered notifications in memory, for local testing."""
+
+    def __init__(self):
+        self.delivered: List[Dict[str, Any]] = []
+
+    async def send(self, user_id: str, message: str, payload: Dict[str, Any]) -> None:
+        self.delivered.append({"user_id": user_id, "message": message, **payload})
+
+
+class WebhookSink:
+    """POSTs each notification as JSON to a URL (a push gateway, a chat hook, ...)."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def send(self, user_id: str, message: str, payload: Dict[str, Any]) -> None:
+        response = await get_client().post(self.url, json={"user_id": user_id, "message": message, **payload})
+        response.raise_for_status()
+
+
+def _default_sink() -> NotificationSink:
+    if settings.NOTIFICATION_SINK == "memory":
+        return MemorySink()
+    if settings.NOTIFICATION_SINK == "webhook" and settings.NOTIFICATION_WEBHOOK_URL:
+        return WebhookSink(settings.NOTIFICATION_WEBHOOK_URL)
+    return LogSink()
+
+
+def _arrival_routes(arrival: Dict[str, Any]) -> List[str]:
+    """Route keys a subscription can name: Muni line ("14"), BART colour or destination code."""
+    keys = {(arrival.get("route_number") or "").split(" ")[0].upper()}
+    if arrival.get("color"):
+        keys.add(arrival["color"].upper())
+    keys.discard("")
+    return list(keys) + ["*"]
+
+
+def _arrival_id(arrival: Dict[str, Any]) -> str:
+    """Stable identity of one vehicle's arrival so a subscription is notified once per vehicle."""
+    vehicle = (arrival.get("vehicle") or {}).get("vehicle_id")
+    return arrival.get("trip_id") or vehicle or f"{arrival.get('route_number')}|{arrival.get('destination')}"
+
+
+def _message(arrival: Dict[str, Any], stop_code: str, minutes: int) -> str:
+    route = arrival.get("route_number") or "Your bus"
+    when = "is due" if minutes == 0 else f"arrives in {minutes} min"
+    scheduled = "" if arrival.get("is_realtime", True) else " (scheduled)"
+    return f"{route} to {arrival.get('destination') or 'N/A'} {when} at stop {stop_code}{scheduled}"
+
+
+class NotificationService:
+    """
+    Arrival notifications for subscribed users.
+
+    `evaluate()` runs on the leader every NOTIFICATION_POLL_SECONDS: it loads active
+    subscriptions grouped by stop, fetches arrivals once per distinct watched stop
+    (background budget, fresh cache first), and matches every subscription at that stop
+    against them, so the cost grows with watched stops, not subscribers. Matches are
+    stored as Notification rows and handed to an in-process delivery queue whose workers
+    call the configured sink, retrying failures with exponential backoff.
+    """
+
+    def __init__(self, sink: Optional[NotificationSink] = None):
+        self.sink = sink or _default_sink()
+        self.queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+        # (subscription id, arrival id) -> monotonic time after which it may fire again
+        self._notified: Dict[Tuple[int, str], float] = {}
+        self._recovered = False
+
+    def set_sink(self, sink: NotificationSink):
+        self.sink = sink
+
+    def start(self):
+        if self._workers:
+            return
+        self.queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._deliver_loop()) for _ in range(DELIVERY_WORKERS)]
+
+    async def stop(self):
+        tasks = self._workers + list(self._retries)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._retries, self.queue = [], set(), None
+
+    # --- evaluation ---------------------------------------------------------------
+
+    def _load_subscriptions(self) -> Dict[Tuple[str, str], Dict[str, List[Any]]]:
+        """Active subscriptions as {(agency, stop_code): {route key or "*": [rows]}}."""
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                NotificationSubscription.id,
+                NotificationSubscription.user_id,
+                NotificationSubscription.agency,
+                NotificationSubscription.stop_code,
+                NotificationSubscription.route,
+                NotificationSubscription.lead_minutes,
+            ).filter(NotificationSubscription.active.is_(True)).all()
+        finally:
+            db.close()
+
+        watched: Dict[Tuple[str, str], Dict[str, List[Any]]] = defaultdict(lambda: defaultdict(list))
+        for row in rows:
+            watched[(row.agency, row.stop_code)][(row.route or "*").upper()].append(row)
+        return watched
+
+    def _store(self, due: List[Tuple[Any, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            notifications = [
+                Notification(user_id=sub.user_id, subscription_id=sub.id, message=message, payload=payload)
+                for sub, message, payload in due
+            ]
+            db.add_all(notifications)
+            db.commit()
+            return [
+                {"id": n.id, "user_id": n.user_id, "message": n.message, "payload": payload, "attempts": 0}
+                for n, (_, _, payload) in zip(notifications, due)
+            ]
+        finally:
+            db.close()
+
+    def _load_pending(self) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            rows = db.query(Notification).filter(
+                Notification.status == "pending",
+                Notification.created_at >= datetime.utcnow() - RECOVERY_WINDOW,
+            ).all()
+            return [
+                {"id": n.id, "user_id": n.user_id, "message": n.message, "payload": n.payload or {}, "attempts": n.attempts}
+                for n in rows
+            ]
+        finally:
+            db.close()
+
+    async def evaluate(self) -> int:
+        """One evaluation pass; returns the number of notifications queued."""
+        self.start()
+        if not self._recovered:
+            # A new leader picks up whatever the previous one stored but never delivered
+            self._recovered = True
+            for item in await asyncio.to_thread(self._load_pending):
+                self.queue.put_nowait(item)
+
+        watched = await asyncio.to_thread(self._load_subscriptions)
+        record_watched_stops(len(watched))
+        if not watched:
+            return 0
+
+        now = time.monotonic()
+        self._notified = {key: until for key, until in self._notified.items() if until > now}
+
+        due: List[Tuple[Any, str, Dict[str, Any]]] = []
+        async for result in batch_arrivals(list(watched), priority=BACKGROUND):
+            if "error" in result:
+                continue
+            stop_code = result["stop_code"]
+            by_route = watched[(result["agency"], stop_code)]
+            for arrival in result["inbound"] + result["outbound"]:
+                minutes = arrival.get("minutes_until")
+                if minutes is None:
+                    continue
+                for route in _arrival_routes(arrival):
+                    for sub in by_route.get(route, ()):
+                        key = (sub.id, _arrival_id(arrival))
+                        if minutes > sub.lead_minutes or key in self._notified:
+                            continue
+                        # Quiet until this vehicle has passed the stop
+                        self._notified[key] = now + (minutes + 2) * 60
+                        payload = {
+                            "agency": result["agency"],
+                            "stop_code": stop_code,
+                            "route": arrival.get("route_number"),
+                            "destination": arrival.get("destination"),
+                            "minutes_until": minutes,
+                            "trip_id": arrival.get("trip_id"),
+                        }
+                        due.append((sub, _message(arrival, stop_code, minutes), payload))
+
+        if not due:
+            return 0
+        for item in await asyncio.to_thread(self._store, due):
+            self.queue.put_nowait(item)
+        record_notification("queued", len(due))
+        log_debug(f"[Notify] ✓ {len(due)} notifications queued from {len(watched)} stops")
+        return len(due)
+
+    # --- delivery -----------------------------------------------------------------
+
+    def _mark(self, notification_id: int, status: str, attempts: int):
+        db = SessionLocal()
+        try:
+            notification = db.get(Notification, notification_id)
+            if notification is not None:
+                notification.status = status
+                notification.attempts = attempts
+                if status == "sent":
+                    notification.sent_at = datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+
+    async def _deliver_loop(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self._deliver(item)
+            except Exception as e:
+                log_debug(f"[Notify] ❌ Delivery bookkeeping failed for {item['id']}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _requeue_later(self, item: Dict[str, Any], delay: float):
+        await asyncio.sleep(delay)
+        self.queue.put_nowait(item)
+
+    async def _deliver(self, item: Dict[str, Any]):
+        item["attempts"] += 1
+        try:
+            await self.sink.send(item["user_id"], item["message"], item["payload"])
+        except Exception as e:
+            if item["attempts"] >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                log_debug(f"[Notify] ❌ Giving up on notification {item['id']} after {item['attempts']} attempts: {e}")
+                record_notification("failed")
+                await asyncio.to_thread(self._mark, item["id"], "failed", item["attempts"])
+                return
+            delay = settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (item["attempts"] - 1)
+            log_debug(f"[Notify] ⚠️ Notification {item['id']} failed ({e}); retrying in {delay:.1f}s")
+            record_notification("retried")
+            retry = asyncio.create_task(self._requeue_later(item, delay))
+            self._retries.add(retry)
+            retry.add_done_callback(self._retries.discard)
+            await asyncio.to_thread(self._mark, item["id"], "pending", item["attempts"])
+            return
+        record_notification("sent")
+        await asyncio.to_thread(self._mark, item["id"], "sent", item["attempts"])
+
+
+notification_service = NotificationService()
+
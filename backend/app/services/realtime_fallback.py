@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.schemas.transit import Arrival, StopArrivals
+from app.services.arrival_recorder import line_key
+from app.services.debug_logger import log_debug
+from app.services.stop_helper import stop_id_for_code
+from app.utils.cache import get_async_redis
+from app.utils.lazy import LazyObject
+from app.utils.metrics import record_cache, record_fallback
+
+schedule_service = LazyObject("app.services.schedule_service", "schedule_service")
+delay_analytics = LazyObject("app.services.delay_analytics", "delay_analytics")
+
+
+def _cache_key(agency: str, stop_code: str) -> str:
+    return f"arrivals:{agency}:{stop_code}"
+
+
+async def remember_arrivals(arrivals: StopArrivals):
+    """Keep the latest live answer for a stop so degraded responses have something recent."""
+    try:
+        await get_async_redis().setex(
+            _cache_key(arrivals.agency, arrivals.stop_code),
+            settings.REALTIME_FALLBACK_TTL,
+            arrivals.model_dump_json(),
+        )
+    except Exception as e:
+        log_debug(f"[Fallback] ⚠️ Could not cache arrivals for {arrivals.stop_code}: {e}")
+
+
+def _revive(raw: str) -> StopArrivals:
+    """Cached answer with minutes recomputed and departed vehicles dropped."""
+    cached = StopArrivals.model_validate_json(raw)
+    now = datetime.now(timezone.utc)
+    for direction in ("inbound", "outbound"):
+        fresh = []
+        for arrival in getattr(cached, direction):
+            if arrival.arrival_time:
+                minutes = round((datetime.fromisoformat(arrival.arrival_time) - now).total_seconds() / 60)
+                if minutes < 0:
+                    continue
+                arrival.minutes_until = minutes
+                arrival.status = "Due" if minutes == 0 else f"{minutes} min"
+            fresh.append(arrival)
+        setattr(cached, direction, fresh)
+    cached.source = "cache"
+    return cached
+
+
+async def cached_arrivals(agency: str, stop_code: str) -> Optional[StopArrivals]:
+    """Last live answer for a stop with minutes recomputed and departed vehicles dropped."""
+    try:
+        raw = await get_async_redis().get(_cache_key(agency, stop_code))
+    except Exception as e:
+        record_cache("arrivals", "error")
+        log_debug(f"[Fallback] ⚠️ Arrival cache unavailable: {e}")
+        return None
+    record_cache("arrivals", "hit" if raw else "miss")
+    if not raw:
+        return None
+    return _revive(raw)
+
+
+async def fresh_arrivals(stops: List[Tuple[str, str]], max_age: int) -> Dict[Tuple[str, str], StopArrivals]:
+    """
+    Cached live answers no older than `max_age` seconds for many (agency, stop_code)
+    pairs, read in one Redis round trip. Stops without a fresh entry are left out.
+    """
+    if not stops or max_age <= 0:
+        return {}
+    try:
+        pipe = get_async_redis().pipeline(transaction=False)
+        for agency, stop_code in stops:
+            pipe.get(_cache_key(agency, stop_code))
+            pipe.ttl(_cache_key(agency, stop_code))
+        replies = await pipe.execute()
+    except Exception as e:
+        record_cache("arrivals_fresh", "error")
+        log_debug(f"[Fallback] ⚠️ Arrival cache unavailable: {e}")
+        return {}
+
+    found = {}
+    for stop, raw, ttl in zip(stops, replies[0::2], replies[1::2]):
+        # Entries are written with REALTIME_FALLBACK_TTL, so the time already spent is their age
+        if raw and ttl is not None and settings.REALTIME_FALLBACK_TTL - ttl <= max_age:
+            found[stop] = _revive(raw)
+    record_cache("arrivals_fresh", "hit", len(found))
+    record_cache("arrivals_fresh", "miss", len(stops) - len(found))
+    return found
+
+
+def scheduled_arrivals(agency: str, stop_code: str) -> StopArrivals:
+    """
+    Arrivals from the GTFS schedule, in the same shape as live predictions. Where the
+    recorded history has a typical delay for the line at that hour, `arrival_time` is
+    shifted by it (and reported as `delay_seconds`); `scheduled_time` stays as timetabled.
+    Both the timetable and the delay history may be read from the database, so this
+    blocks: call it from a worker thread (as degraded_arrivals does).
+    """
+    result = StopArrivals(agency=agency, stop_code=stop_code, source="schedule")
+    now = datetime.now()
+    typical = delay_analytics.typical_delays(agency, stop_code)
+    for entry in schedule_service.get_upcoming(stop_id_for_code(agency, stop_code), agency):
+        delay = typical.get((line_key(agency, entry["route_number"]), entry["arrival"].hour))
+        expected = entry["arrival"] + timedelta(seconds=delay or 0)
+        minutes = max(0, round((expected - now).total_seconds() / 60))
+        direction = "inbound" if entry["direction_id"] == 1 else "outbound"
+        getattr(result, direction).append(Arrival(
+            route_number=entry["route_number"],
+            destination=entry["destination"],
+            direction=direction,
+            arrival_time=expected.astimezone().isoformat(timespec="seconds"),
+            scheduled_time=entry["arrival"].astimezone().isoformat(timespec="seconds"),
+            minutes_until=minutes,
+            status="Scheduled",
+            is_realtime=False,
+            trip_id=entry["trip_id"],
+            delay_seconds=delay,
+        ))
+    return result
+
+
+async def degraded_arrivals(upstream: str, agency: str, stop_code: str, reason: str) -> StopArrivals:
+    """
+    Answer without the upstream: the cached live response if there is one,
+    otherwise the schedule. `reason` is a metric label (budget, rate_limited, ...).
+    The schedule lookup can query the database, so it runs in a worker thread.
+    """
+    cached = await cached_arrivals(agency, stop_code)
+    if cached is not None:
+        record_fallback(upstream, "cache", reason)
+        return cached
+    record_fallback(upstream, "schedule", reason)
+    return await asyncio.to_thread(scheduled_arrivals, agency, stop_code)
@@ -0,0 +1,325 @@
+import asyncio
+import math
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.integrations.gtfs_rt import decode_feed
+from app.integrations.rate_limiter import BACKGROUND, drain_budget
+from app.integrations.upstream import upstream_get
+from app.schemas.transit import Arrival, StopArrivals, Vehicle
+from app.services.debug_logger import log_debug
+from app.services.shared_snapshots import SharedSnapshots, record_due
+from app.services.stop_helper import load_stops
+from app.utils.lazy import LazyObject
+from app.utils.metrics import record_realtime_feed, time_section
+
+schedule_service = LazyObject("app.services.schedule_service", "schedule_service")
+
+# Snapshot entry per prediction, in arrival order within a stop
+ARRIVAL, SCHEDULED, DELAY, TRIP, ROUTE, DESTINATION, DIRECTION, VEHICLE, LAT, LON, COLOR = range(11)
+
+
+def _direction(agency: str, route_number: Optional[str], direction_id: Optional[int]) -> str:
+    # BART splits by compass direction, which its GTFS encodes in the route suffix
+    if agency == "bart":
+        return "outbound" if str(route_number or "").upper().endswith("-S") else "inbound"
+    return "inbound" if direction_id == 1 else "outbound"
+
+
+def _text(value: Any) -> str:
+    # GTFS columns come back as str, int or NaN depending on the feed
+    return "" if value is None or value != value else str(value)
+
+
+def service_midnight(start_date: Optional[str], now: float) -> float:
+    """Epoch seconds of local midnight on the trip's service day (today if the feed leaves it out)."""
+    day = datetime.strptime(start_date, "%Y%m%d") if start_date else datetime.fromtimestamp(now)
+    return day.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+class RealtimeFeedService:
+    """
+    Live predictions for a whole agency from its GTFS-Realtime feeds, served from memory.
+
+    Instead of one SIRI StopMonitoring call per stop, the leader fetches the agency's
+    TripUpdates (and VehiclePositions, if enabled) every poll_seconds(),
+    decodes them in a worker thread, and joins every trip to the static trip index by
+    trip_id for its route, headsign and direction. With the compact stop_times index a
+    trip's latest delay is carried on to the stops after its last update, as GTFS-RT
+    consumers are expected to. The result is one snapshot keyed by stop code that the
+    leader shares with every worker (SharedSnapshots, `gtfsrt:{agency}`) and each picks
+    up within GTFS_RT_SYNC_SECONDS. `arrivals()` is then a dict lookup, and
+    returns None once the snapshot is older than GTFS_RT_MAX_AGE_SECONDS so callers
+    fall back to the per-stop upstream.
+
+    Every 511 feed costs one request of UPSTREAM_511_QUOTA per poll, so polling may
+    spend at most GTFS_RT_BUDGET_SHARE of the background part of the quota and
+    poll_seconds() stretches a shorter GTFS_RT_POLL_SECONDS. The defaults fit the
+    standard 60 requests an hour: one feed every 180s is 20 of the 45 background ones.
+    """
+
+    def __init__(self):
+        # agency -> {"fetched_at", "feed_timestamp", "stops": {stop_code: [entry, ...]},
+        #            "vehicles": {trip_id: [vehicle_id, lat, lon]}}
+        self.snapshots = SharedSnapshots(
+            "GTFS-RT", "gtfsrt",
+            names=lambda: settings.GTFS_RT_AGENCIES,
+            max_age=lambda: settings.GTFS_RT_MAX_AGE_SECONDS,
+            sync_seconds=lambda: settings.GTFS_RT_SYNC_SECONDS,
+            on_load=self._loaded,
+        )
+        # agency -> (source trips frame, {trip_id: (route_number, destination, direction_id, color)})
+        self._trips: Dict[str, Tuple[Any, Dict[str, Tuple[str, str, Optional[int], Optional[str]]]]] = {}
+
+    def enabled_for(self, agency: str) -> bool:
+        return settings.GTFS_RT_ENABLED and agency in settings.GTFS_RT_AGENCIES
+
+    # --- Fetch (leader) ---
+
+    def _feeds(self, agency: str) -> List[Tuple[str, str, str, Dict[str, Any]]]:
+        """(upstream, endpoint, url, params) per feed; the TripUpdates feed comes first."""
+        if agency == "bart":
+            base = settings.BART_API_BASE_URL.rstrip("/").removesuffix("/api")
+            return [("bart", "gtfsrt_tripupdates", f"{base}/gtfsrt/tripupdate.aspx", {})]
+        params = {"api_key": settings.API_KEY, "agency": settings.normalize_agency(agency, to_511=True)}
+        feeds = [("511", "tripupdates", f"{settings.TRANSIT_511_BASE_URL}/tripupdates", params)]
+        if settings.GTFS_RT_VEHICLE_POSITIONS:
+            feeds.append(("511", "vehiclepositions", f"{settings.TRANSIT_511_BASE_URL}/vehiclepositions", params))
+        return feeds
+
+    def poll_seconds(self) -> int:
+        """
+        GTFS_RT_POLL_SECONDS, stretched if polling every 511 feed that often would spend
+        more than GTFS_RT_BUDGET_SHARE of the quota left after UPSTREAM_BACKGROUND_RESERVE.
+        """
+        interval = settings.GTFS_RT_POLL_SECONDS
+        feeds = sum(upstream == "511" for agency in settings.GTFS_RT_AGENCIES for upstream, *_ in self._feeds(agency))
+        if feeds == 0 or settings.UPSTREAM_511_QUOTA <= 0:
+            return interval
+        allowed = settings.UPSTREAM_511_QUOTA * (1 - settings.UPSTREAM_BACKGROUND_RESERVE) * settings.GTFS_RT_BUDGET_SHARE
+        if allowed <= 0:
+            log_debug("[GTFS-RT] ⚠️ No 511 background budget is left for GTFS-Realtime; its polls will be denied")
+            return interval
+        minimum = math.ceil(feeds * settings.UPSTREAM_511_QUOTA_WINDOW / allowed)
+        if interval < minimum:
+            log_debug(f"[GTFS-RT] ⚠️ Polling {feeds} 511 feed(s) every {interval}s exceeds the quota share; "
+                      f"polling every {minimum}s instead")
+            interval = minimum
+        if interval + settings.GTFS_RT_SYNC_SECONDS >= settings.GTFS_RT_MAX_AGE_SECONDS:
+            log_debug(f"[GTFS-RT] ⚠️ GTFS_RT_MAX_AGE_SECONDS ({settings.GTFS_RT_MAX_AGE_SECONDS}s) is shorter than "
+                      f"the poll interval ({interval}s); stops will fall back to SIRI between polls")
+        return interval
+
+    async def _fetch(self, agency: str, upstream: str, endpoint: str, url: str, params: Dict[str, Any]) -> bytes:
+        response = await upstream_get(upstream, agency, endpoint, url, params=params, priority=BACKGROUND, hedge=False)
+        if response.status_code == 429 and upstream == "511":
+            await drain_budget("511")
+        response.raise_for_status()
+        return response.content
+
+    async def poll(self):
+        """Leader job: refresh every enabled agency's snapshot."""
+        for agency in settings.GTFS_RT_AGENCIES:
+            try:
+                await self.refresh(agency)
+            except Exception as e:
+                log_debug(f"[GTFS-RT] ❌ {agency} refresh failed: {e}")
+
+    async def refresh(self, agency: str) -> int:
+        """Fetch, decode and index an agency's feeds, then publish the snapshot. Returns its prediction count."""
+        feeds = self._feeds(agency)
+        payloads = await asyncio.gather(*(self._fetch(agency, *feed) for feed in feeds), return_exceptions=True)
+        if isinstance(payloads[0], Exception):
+            raise payloads[0]
+        vehicles = payloads[1] if len(payloads) > 1 else None
+        if isinstance(vehicles, Exception):
+            # Predictions are still good without positions
+            log_debug(f"[GTFS-RT] ⚠️ {agency} vehicle positions unavailable: {vehicles}")
+            vehicles = None
+
+        snapshot = await asyncio.to_thread(self._build, agency, payloads[0], vehicles)
+        count = sum(len(entries) for entries in snapshot["stops"].values())
+        await self.snapshots.publish(agency, snapshot)
+        record_due(snapshot["fetched_at"], snapshot["stops"],
+                   lambda stop_code, due, now: self._stop_arrivals(agency, stop_code, due, now))
+        log_debug(f"[GTFS-RT] ✓ {agency}: {count} predictions at {len(snapshot['stops'])} stops")
+        return count
+
+    # --- Index ---
+
+    def _static_trips(self, agency: str) -> Dict[str, Tuple[str, str, Optional[int], Optional[str]]]:
+        """trip_id -> (route_number, destination, direction_id, colour), rebuilt when the schedule index is."""
+        frame = schedule_service.trips_frame(agency)
+        cached = self._trips.get(agency)
+        if cached is not None and cached[0] is frame:
+            return cached[1]
+        trips = {}
+        for trip_id, short, long, headsign, direction_id in zip(
+            frame["trip_id"].astype(str), frame["route_short_name"], frame["route_long_name"],
+            frame["trip_headsign"], frame["direction_id"],
+        ):
+            short, long, headsign = _text(short), _text(long), _text(headsign)
+            if agency == "bart":
+                route_number, color = short, short.split("-")[0].upper() or None
+            else:
+                # Same shape as SIRI's "LINE NAME" ("14 MISSION")
+                route_number = f"{short} {long.upper()}".strip() if long and long.upper() != short else short
+                color = None
+            destination = headsign or long or "N/A"
+            try:
+                direction = int(direction_id)
+            except (TypeError, ValueError):
+                direction = None
+            trips[trip_id] = (route_number, destination, direction, color)
+        self._trips[agency] = (frame, trips)
+        return trips
+
+    def _trip_predictions(self, compact: Any, update: Dict[str, Any],
+                          now: float) -> Iterator[Tuple[str, int, Optional[int], Optional[int]]]:
+        """
+        (stop_id, predicted epoch, scheduled epoch, delay) for each stop a trip update covers.
+        `compact` is the agency's CompactStopTimes, or None before (or without) one.
+        """
+        trip = update["trip"]
+        times = compact.trip_times(trip.get("trip_id", "")) if compact is not None else None
+        if times is None:
+            # No static stop times for the trip: only what the feed states explicitly
+            for stop in update["stop_time_updates"]:
+                if stop["skipped"] or not stop["stop_id"] or stop["time"] is None:
+                    continue
+                delay = stop["delay"]
+                yield stop["stop_id"], stop["time"], None if delay is None else stop["time"] - delay, delay
+            return
+
+        midnight = service_midnight(trip.get("start_date"), now)
+        stop_ids = compact.stop_ids[times["stops"]].tolist()
+        sequences = times["stop_sequence"].tolist()
+        scheduled = (times["arrival"] + midnight).astype("int64").tolist()
+        by_sequence = {s["stop_sequence"]: s for s in update["stop_time_updates"] if s["stop_sequence"] is not None}
+        by_stop = {s["stop_id"]: s for s in update["stop_time_updates"] if s["stop_sequence"] is None and s["stop_id"]}
+        # A trip-level delay applies until a stop-level update says otherwise
+        delay = update["delay"] if not update["stop_time_updates"] else None
+        for stop_id, sequence, planned in zip(stop_ids, sequences, scheduled):
+            stop = by_sequence.get(sequence) or by_stop.get(stop_id)
+            if stop is not None:
+                if stop["skipped"]:
+                    continue
+                if stop["time"] is not None:
+                    delay = stop["time"] - planned
+                elif stop["delay"] is not None:
+                    delay = stop["delay"]
+            if delay is None:
+                continue
+            yield stop_id, planned + delay, planned, delay
+
+    def _build(self, agency: str, trip_updates: bytes, vehicle_positions: Optional[bytes]) -> Dict[str, Any]:
+        # Kept out of module import: it pulls in NumPy and pandas
+        from app.services.stop_times_index import get_stop_times_index
+
+        now = time.time()
+        with time_section("gtfsrt_decode"):
+            feed = decode_feed(trip_updates)
+            vehicles = decode_feed(vehicle_positions)["vehicles"] if vehicle_positions else []
+
+        with time_section("gtfsrt_index"):
+            trips = self._static_trips(agency)
+            compact = get_stop_times_index(agency)
+            codes = {str(stop["stop_id"]): stop.get("stop_code") or str(stop["stop_id"]) for stop in load_stops(agency)}
+            positions = {v["trip"]["trip_id"]: v for v in vehicles if v["trip"].get("trip_id")}
+            earliest, latest = now - 60, now + settings.GTFS_RT_HORIZON_MINUTES * 60
+
+            stops: Dict[str, List[list]] = defaultdict(list)
+            for update in feed["trip_updates"]:
+                trip_id = update["trip"].get("trip_id")
+                if not trip_id:
+                    continue
+                static = trips.get(trip_id)
+                if static is not None:
+                    route_number, destination, direction_id, color = static
+                else:
+                    route_number, destination, color = update["trip"].get("route_id"), None, None
+                    direction_id = update["trip"].get("direction_id")
+                direction = _direction(agency, route_number, direction_id)
+                position = positions.get(trip_id, {})
+                vehicle_id = update["vehicle_id"] or position.get("vehicle_id")
+                lat, lon = position.get("lat"), position.get("lon")
+                for stop_id, predicted, scheduled, delay in self._trip_predictions(compact, update, now):
+                    if earliest <= predicted <= latest:
+                        stops[codes.get(stop_id, stop_id)].append([
+                            predicted, scheduled, delay, trip_id, route_number, destination,
+                            direction, vehicle_id, lat, lon, color,
+                        ])
+            for entries in stops.values():
+                entries.sort(key=lambda entry: entry[ARRIVAL])
+
+            # Where each trip's vehicle is, for trip progress along its shape
+            located = {
+                trip_id: [position.get("vehicle_id"), position["lat"], position["lon"]]
+                for trip_id, position in positions.items()
+                if position.get("lat") is not None and position.get("lon") is not None
+            }
+
+        return {"fetched_at": now, "feed_timestamp": feed["timestamp"], "stops": dict(stops), "vehicles": located}
+
+    # --- Share (all workers) ---
+
+    @staticmethod
+    def _loaded(agency: str, snapshot: Dict[str, Any]):
+        predictions = sum(len(entries) for entries in snapshot["stops"].values())
+        record_realtime_feed(agency, predictions, time.time() - snapshot["fetched_at"])
+
+    # --- Serve ---
+
+    def _stop_arrivals(self, agency: str, stop_code: str, entries: List[list], now: float) -> StopArrivals:
+        result = StopArrivals(agency=agency, stop_code=stop_code, source="realtime")
+        for entry in entries:
+            minutes = round((entry[ARRIVAL] - now) / 60)
+            if minutes < 0:
+                continue
+            vehicle = None
+            if entry[LAT] is not None and entry[LON] is not None:
+                vehicle = Vehicle(vehicle_id=entry[VEHICLE], lat=entry[LAT], lon=entry[LON])
+            getattr(result, entry[DIRECTION]).append(Arrival(
+                route_number=entry[ROUTE],
+                destination=entry[DESTINATION],
+                direction=entry[DIRECTION],
+                arrival_time=datetime.fromtimestamp(entry[ARRIVAL]).astimezone().isoformat(timespec="seconds"),
+                scheduled_time=(datetime.fromtimestamp(entry[SCHEDULED]).astimezone().isoformat(timespec="seconds")
+                                if entry[SCHEDULED] is not None else None),
+                minutes_until=minutes,
+                status="Due" if minutes == 0 else f"{minutes} min",
+                is_realtime=True,
+                vehicle=vehicle,
+                trip_id=entry[TRIP],
+                color=entry[COLOR],
+                delay_seconds=entry[DELAY],
+            ))
+        return result
+
+    def arrivals(self, agency: str, stop_code: str) -> Optional[StopArrivals]:
+        """
+        Predictions for a stop from the in-memory snapshot, or None when there is no fresh
+        snapshot or the snapshot does not list the stop (the caller then asks SIRI), so a
+        stop the join missed is not reported as having no service.
+        """
+        now = time.time()
+        snapshot = self.snapshots.get(agency, now)
+        if snapshot is None:
+            return None
+        entries = snapshot["stops"].get(stop_code)
+        if entries is None:
+            return None
+        return self._stop_arrivals(agency, stop_code, entries, now)
+
+    def vehicles(self, agency: str) -> Optional[Tuple[float, Dict[str, list]]]:
+        """(fetched_at, {trip_id: [vehicle_id, lat, lon]}) from a fresh snapshot, or None."""
+        snapshot = self.snapshots.get(agency)
+        if snapshot is None:
+            return None
+        return snapshot["fetched_at"], snapshot.get("vehicles", {})
+
+
+realtime_feed = RealtimeFeedService()
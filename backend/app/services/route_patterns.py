@@ -0,0 +1,244 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.debug_logger import log_debug
+from app.services.gtfs_service import GTFSService
+from app.services.stop_times_index import CompactStopTimes, format_gtfs_time, get_stop_times_index
+
+# (name, start hour, end hour); GTFS service days run past 24:00
+TIME_BANDS: List[Tuple[str, int, int]] = [
+    ("early", 0, 6),
+    ("am_peak", 6, 9),
+    ("midday", 9, 15),
+    ("pm_peak", 15, 19),
+    ("evening", 19, 22),
+    ("late_night", 22, 30),
+]
+
+
+def summarize_headways(starts: np.ndarray) -> List[Dict[str, Any]]:
+    """Trip count, trips/hour and headway stats (minutes) per time band for sorted start seconds."""
+    bands = []
+    for name, start_hour, end_hour in TIME_BANDS:
+        in_band = starts[(starts >= start_hour * 3600) & (starts < end_hour * 3600)]
+        entry: Dict[str, Any] = {
+            "band": name,
+            "start": f"{start_hour:02d}:00",
+            "end": f"{end_hour:02d}:00",
+            "trips": int(len(in_band)),
+            "trips_per_hour": round(len(in_band) / (end_hour - start_hour), 2),
+            "headway_min": None,
+            "headway_median": None,
+            "headway_max": None,
+        }
+        if len(in_band) >= 2:
+            gaps = np.diff(in_band) / 60.0
+            entry.update(
+                headway_min=round(float(gaps.min()), 1),
+                headway_median=round(float(np.median(gaps)), 1),
+                headway_max=round(float(gaps.max()), 1),
+            )
+        bands.append(entry)
+    return bands
+
+
+class RoutePatternService:
+    """
+    Stop patterns and headway summaries per route and direction.
+
+    Patterns come from the compact stop_times index (trips with identical stop
+    sequences already share one pattern there); this groups them by route and
+    direction (named from directions.txt) and keeps each direction's trips as
+    arrays of (compact trip index, service_id, first departure) so timetables
+    and headways for a service day are array slices. Summaries are memoized per
+    set of active service_ids.
+    """
+
+    def __init__(self):
+        self._agencies: Dict[str, Dict[str, Any]] = {}
+
+    def preload(self, agency: str) -> int:
+        """Group the agency's patterns by route/direction. Returns the number of route patterns."""
+        agency = agency.lower()
+        compact = get_stop_times_index(agency)
+        if compact is None:
+            raise RuntimeError(f"stop_times index is not loaded for agency: {agency}")
+
+        service = GTFSService(agency)
+        routes = service.get_routes()
+        trips = service.get_trips()
+        try:
+            directions = service.get_directions()
+        except Exception:
+            directions = pd.DataFrame(columns=["route_id", "direction_id", "direction"])
+
+        trips = trips.assign(trip_id=trips["trip_id"].astype(str), route_id=trips["route_id"].astype(str))
+        trips = trips.drop_duplicates("trip_id").set_index("trip_id").reindex(compact.trip_ids)
+        known = trips["route_id"].notna().to_numpy()
+
+        frame = pd.DataFrame({
+            "trip": np.arange(len(compact.trip_ids), dtype=np.int32),
+            "route_id": trips["route_id"].to_numpy(dtype=object),
+            "direction_id": pd.to_numeric(trips["direction_id"], errors="coerce").fillna(0).astype(int).to_numpy(),
+            "service_id": trips["service_id"].to_numpy(dtype=object),
+            "headsign": trips["trip_headsign"].fillna("").to_numpy(dtype=object),
+            "pattern": compact.profile_pattern[compact.trip_profile],
+            "start": compact.trip_start,
+        })[known]
+
+        direction_names = {
+            (str(row.route_id), int(row.direction_id)): str(row.direction)
+            for row in directions.itertuples(index=False)
+        }
+        route_info = {
+            str(row.route_id): {"route_short_name": row.route_short_name, "route_long_name": row.route_long_name}
+            for row in routes.itertuples(index=False)
+        }
+
+        by_route: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        pattern_count = 0
+        for (route_id, direction_id), group in frame.groupby(["route_id", "direction_id"], sort=True):
+            group = group.sort_values("start", kind="stable")
+            patterns = []
+            for pattern_id, pattern_trips in group.groupby("pattern", sort=False):
+                patterns.append({
+                    "pattern_id": int(pattern_id),
+                    "trip_count": len(pattern_trips),
+                    "headsigns": sorted(h for h in pattern_trips["headsign"].unique() if h),
+                })
+            patterns.sort(key=lambda p: -p["trip_count"])
+            pattern_count += len(patterns)
+            by_route.setdefault(route_id, {})[int(direction_id)] = {
+                "direction": direction_names.get((route_id, int(direction_id)), str(direction_id)),
+                "patterns": patterns,
+                "trips": group["trip"].to_numpy(dtype=np.int32),
+                "service_id": group["service_id"].to_numpy(dtype=object),
+                "pattern": group["pattern"].to_numpy(dtype=np.int32),
+                "start": group["start"].to_numpy(dtype=np.int32),
+            }
+
+        self._agencies[agency] = {
+            "compact": compact,
+            "routes": route_info,
+            "by_route": by_route,
+            "summaries": {},
+        }
+        log_debug(
+            f"[RoutePatterns] ✓ {agency}: {len(by_route)} routes, {pattern_count} route patterns "
+            f"for {int(known.sum())} trips"
+        )
+        return pattern_count
+
+    def _get(self, agency: str) -> Optional[Dict[str, Any]]:
+        agency = agency.lower()
+        data = self._agencies.get(agency)
+        compact = get_stop_times_index(agency)
+        if compact is None:
+            return None
+        if data is None or data["compact"] is not compact:
+            self.preload(agency)
+            data = self._agencies[agency]
+        return data
+
+    def _pattern_stops(self, compact: CompactStopTimes, pattern_id: int) -> List[Dict[str, str]]:
+        stops = compact.pattern_stops[compact.pattern_ptr[pattern_id]:compact.pattern_ptr[pattern_id + 1]]
+        return [
+            {"stop_id": stop_id, "stop_name": name}
+            for stop_id, name in zip(compact.stop_ids[stops].tolist(), compact.stop_names[stops].tolist())
+        ]
+
+    def _timetable(self, compact: CompactStopTimes, trips: np.ndarray) -> List[Dict[str, Any]]:
+        """Departure times per stop for trips that share one pattern (one row per trip)."""
+        if len(trips) == 0:
+            return []
+        profiles = compact.trip_profile[trips]
+        length = int(compact.profile_ptr[profiles[0] + 1] - compact.profile_ptr[profiles[0]])
+        positions = compact.profile_ptr[profiles][:, None] + np.arange(length)
+        departures = compact.profile_departure[positions] + compact.trip_start[trips][:, None]
+        return [
+            {"trip_id": trip_id, "times": [format_gtfs_time(s)[:-3] for s in row]}
+            for trip_id, row in zip(compact.trip_ids[trips].tolist(), departures.tolist())
+        ]
+
+    def get_route_timetable(
+        self,
+        agency: str,
+        route_id: str,
+        service_ids: List[Any],
+        direction_id: Optional[int] = None,
+        service_date: Optional[datetime] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Patterns, per-band headways and the main-pattern timetable for each direction of a
+        route on a service day. Returns None when the route is unknown.
+        """
+        data = self._get(agency)
+        if data is None:
+            raise RuntimeError(f"No stop_times available for agency: {agency}")
+        route_id = str(route_id)
+        directions = data["by_route"].get(route_id)
+        if directions is None:
+            return None
+
+        compact = data["compact"]
+        services = frozenset(service_ids)
+        result_directions = []
+        for d_id, direction in sorted(directions.items()):
+            if direction_id is not None and d_id != direction_id:
+                continue
+
+            key = (route_id, d_id, services)
+            summary = data["summaries"].get(key)
+            if summary is None:
+                active = np.isin(direction["service_id"], list(services))
+                summary = {
+                    "active": active,
+                    "headways": summarize_headways(direction["start"][active]),
+                }
+                data["summaries"][key] = summary
+            active = summary["active"]
+
+            patterns = []
+            for pattern in direction["patterns"]:
+                in_pattern = active & (direction["pattern"] == pattern["pattern_id"])
+                patterns.append({
+                    **pattern,
+                    "trips_today": int(in_pattern.sum()),
+                    "stops": self._pattern_stops(compact, pattern["pattern_id"]),
+                })
+            running = [p for p in patterns if p["trips_today"]]
+            main = max(running, key=lambda p: p["trips_today"]) if running else None
+            timetable = None
+            if main is not None:
+                trips = direction["trips"][active & (direction["pattern"] == main["pattern_id"])]
+                timetable = {
+                    "pattern_id": main["pattern_id"],
+                    "stops": [s["stop_id"] for s in main["stops"]],
+                    "trips": self._timetable(compact, trips),
+                }
+
+            result_directions.append({
+                "direction_id": d_id,
+                "direction": direction["direction"],
+                "trips_today": int(active.sum()),
+                "patterns": patterns,
+                "headways": summary["headways"],
+                "timetable": timetable,
+            })
+
+        info = data["routes"].get(route_id, {})
+        return {
+            "agency": agency.lower(),
+            "route_id": route_id,
+            "route_short_name": info.get("route_short_name"),
+            "route_long_name": info.get("route_long_name"),
+            "service_date": service_date.strftime("%Y-%m-%d") if service_date else None,
+            "service_ids": sorted(str(s) for s in services),
+            "directions": result_directions,
+        }
+
+
+route_pattern_service = RoutePatternService()
@@ -1,86 +1,187 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
+from app.services.agency_registry import agency_registry
 from app.services.gtfs_service import GTFSService
 from app.services.debug_logger import log_debug
+from app.services.stop_times_index import CompactStopTimes, get_stop_times_index
+from app.utils.metrics import time_section
 
 class SchedulerService:
     def __init__(self):
-        self.services = {
-            "muni": GTFSService("muni"),
-            "bart": GTFSService("bart")
-        }
+        # Per-agency static schedule index: calendar plus trips joined with routes.
+        # Loaded on first use (or by warm-up) and evicted with the agency when it goes cold.
+        self._indexes = agency_registry.cache("schedule", self._build_index)
 
-    def get_schedule(self, stop_id: str, agency: str = "muni") -> Dict[str, Any]:
-        agency = agency.lower()
-        log_debug(f"[SchedulerService] Looking up schedule for stop: {stop_id}, agency: {agency}")
+    def service(self, agency: str) -> GTFSService:
+        return GTFSService(agency)
 
-        service = self.services.get(agency)
-        if not service:
-            log_debug(f"Unsupported agency: {agency}")
-            return {"inbound": [], "outbound": []}
+    def preload(self, agency: str) -> int:
+        """
+        Build the static schedule index for an agency (calendar, trips joined with routes).
+        Returns the number of indexed trips.
+        """
+        agency = agency.lower()
+        index = self._build_index(agency)
+        self._indexes.set(agency, index)
+        return len(index["trips"])
 
-        now = datetime.now()
-        current_time = now.strftime("%H:%M:%S")
-        weekday = now.strftime("%A").lower()
+    def _build_index(self, agency: str) -> Dict[str, pd.DataFrame]:
+        service = self.service(agency)
+        calendar = service.get_calendar()
+        routes = service.get_routes()
+        trips = service.get_trips()
+        if trips.empty:
+            raise RuntimeError(f"GTFS trips table is empty for agency: {agency}")
 
-        try:
-            stop_times = service._query("stop_times", "stop_id = :stop_id", {"stop_id": stop_id})
-            if stop_times.empty:
-                return {"inbound": [], "outbound": []}
+        trip_index = trips[["trip_id", "route_id", "service_id", "direction_id", "trip_headsign"]].merge(
+            routes[["route_id", "route_short_name", "route_long_name"]], on="route_id"
+        )
+        return {"calendar": calendar, "trips": trip_index}
 
-            calendar = service.get_calendar()
-            routes = service.get_routes()
-            trips = service._query("trips")
+    def _get_index(self, agency: str) -> Dict[str, pd.DataFrame]:
+        return self._indexes.get(agency)
 
-            active_services = calendar[
-                (calendar[weekday] == 1) &
-                (pd.to_numeric(calendar["start_date"]) <= int(now.strftime("%Y%m%d"))) &
-                (pd.to_numeric(calendar["end_date"]) >= int(now.strftime("%Y%m%d")))
-            ]["service_id"].tolist()
+    def trips_frame(self, agency: str) -> pd.DataFrame:
+        """
+        The agency's trips joined with their routes (trip_id, route_id, service_id, direction_id,
+        trip_headsign, route_short_name, route_long_name). A new frame whenever the index is rebuilt.
+        """
+        return self._get_index(agency)["trips"]
 
-            active_trips = trips[trips["service_id"].isin(active_services)]
+    def active_service_ids(self, agency: str, day: datetime) -> list:
+        """service_ids running on a given day according to calendar.txt."""
+        calendar = self._get_index(agency)["calendar"]
+        weekday = day.strftime("%A").lower()
+        date = int(day.strftime("%Y%m%d"))
+        return calendar[
+            (calendar[weekday] == 1) &
+            (pd.to_numeric(calendar["start_date"]) <= date) &
+            (pd.to_numeric(calendar["end_date"]) >= date)
+        ]["service_id"].tolist()
 
-            merged = (
-                stop_times
-                .merge(active_trips[["trip_id", "route_id", "direction_id", "trip_headsign"]], on="trip_id")
-                .merge(routes[["route_id", "route_short_name", "route_long_name"]], on="route_id")
+    def aligned_trips(self, agency: str, compact: CompactStopTimes) -> Dict[str, Any]:
+        """Trip attributes as arrays aligned with the compact stop_times trip order (cached)."""
+        index = self._get_index(agency)
+        aligned = index.get("aligned")
+        if aligned is None or aligned["source"] is not compact:
+            trips = index["trips"].assign(trip_id=index["trips"]["trip_id"].astype(str))
+            trips = trips.drop_duplicates("trip_id").set_index("trip_id").reindex(compact.trip_ids)
+            destination = trips["trip_headsign"].where(
+                trips["trip_headsign"].notna() & (trips["trip_headsign"] != ""), trips["route_long_name"]
             )
+            aligned = {
+                "source": compact,
+                "service_id": trips["service_id"].to_numpy(dtype=object),
+                "direction_id": pd.to_numeric(trips["direction_id"], errors="coerce").to_numpy(),
+                "route_short_name": trips["route_short_name"].to_numpy(dtype=object),
+                "destination": destination.fillna("N/A").to_numpy(dtype=object),
+            }
+            index["aligned"] = aligned
+        return aligned
+
+    def _upcoming_from_index(self, agency: str, compact: CompactStopTimes, stop_id: str, now: datetime,
+                             active_services: list, horizon: timedelta) -> List[Dict[str, Any]]:
+        """Upcoming departures from the compact stop_times arrays; no per-request DB query."""
+        trips, arrivals, _ = compact.stop_events(stop_id)
+        if len(trips) == 0:
+            return []
+
+        aligned = self.aligned_trips(agency, compact)
+        now_sec = now.hour * 3600 + now.minute * 60 + now.second
+        with time_section("schedule_merge"):
+            # GTFS times past 24:00 belong to the next calendar day, as in the DB path
+            upcoming = (arrivals >= now_sec) & (arrivals < now_sec + horizon.total_seconds())
+            upcoming &= np.isin(aligned["service_id"][trips], active_services)
+            trips, arrivals = trips[upcoming], arrivals[upcoming]
+            order = np.argsort(arrivals, kind="stable")
+            trips, arrivals = trips[order], arrivals[order]
 
-            future = []
-            for _, row in merged.iterrows():
-                try:
-                    h, m, s = map(int, row["arrival_time"].split(":"))
-                    arrival = datetime(now.year, now.month, now.day, h % 24, m, s)
-                    if h >= 24:
-                        arrival += timedelta(days=1)
-
-                    if arrival >= now and arrival - now < timedelta(hours=2):
-                        future.append((row, arrival.strftime("%I:%M %p").lstrip("0")))
-                except Exception as e:
-                    log_debug(f"Time parsing failed: {e}")
-
-            inbound, outbound = [], []
-            for row, arrival_str in future:
-                bus = {
-                    "route_number": row["route_short_name"],
-                    "destination": row.get("trip_headsign") or row.get("route_long_name", "N/A"),
-                    "arrival_time": arrival_str,
-                    "status": "Scheduled"
-                }
-                if row["direction_id"] == 1:
-                    inbound.append(bus)
-                else:
-                    outbound.append(bus)
-
-            inbound.sort(key=lambda x: datetime.strptime(x["arrival_time"], "%I:%M %p"))
-            outbound.sort(key=lambda x: datetime.strptime(x["arrival_time"], "%I:%M %p"))
-
-            return {
-                "inbound": inbound[:3],
-                "outbound": outbound[:3]
+        midnight = datetime(now.year, now.month, now.day)
+        return [
+            {
+                "trip_id": compact.trip_ids[trip],
+                "route_number": aligned["route_short_name"][trip],
+                "destination": aligned["destination"][trip],
+                "direction_id": aligned["direction_id"][trip],
+                "arrival": midnight + timedelta(seconds=seconds),
             }
+            for trip, seconds in zip(trips.tolist(), arrivals.tolist())
+        ]
+
+    def _upcoming_from_db(self, agency: str, stop_id: str, now: datetime,
+                          active_services: list, horizon: timedelta) -> List[Dict[str, Any]]:
+        """Upcoming departures from a stop_times query (feeds without a compact index)."""
+        stop_times = self.service(agency).get_stop_times_for_stop(stop_id)
+        if stop_times.empty:
+            return []
+
+        trips = self.trips_frame(agency)
+        with time_section("schedule_merge"):
+            active_trips = trips[trips["service_id"].isin(active_services)]
+            merged = stop_times.merge(active_trips, on="trip_id")
 
+        future = []
+        for _, row in merged.iterrows():
+            try:
+                h, m, s = map(int, row["arrival_time"].split(":"))
+                arrival = datetime(now.year, now.month, now.day, h % 24, m, s)
+                if h >= 24:
+                    arrival += timedelta(days=1)
+
+                if arrival >= now and arrival - now < horizon:
+                    future.append({
+                        "trip_id": str(row["trip_id"]),
+                        "route_number": row["route_short_name"],
+                        "destination": row.get("trip_headsign") or row.get("route_long_name", "N/A"),
+                        "direction_id": row["direction_id"],
+                        "arrival": arrival,
+                    })
+            except Exception as e:
+                log_debug(f"Time parsing failed: {e}")
+
+        future.sort(key=lambda x: x["arrival"])
+        return future
+
+    def get_upcoming(self, stop_id: str, agency: str = "muni", now: Optional[datetime] = None,
+                     horizon: timedelta = timedelta(hours=2)) -> List[Dict[str, Any]]:
+        """
+        Scheduled departures from a stop within `horizon`, sorted by time. Each entry has
+        trip_id, route_number, destination, direction_id and `arrival` (datetime).
+        """
+        agency = agency_registry.normalize(agency)
+        if not agency_registry.is_enabled(agency):
+            log_debug(f"Unsupported agency: {agency}")
+            return []
+
+        now = now or datetime.now()
+        try:
+            active_services = self.active_service_ids(agency, now)
+            compact = get_stop_times_index(agency)
+            if compact is not None:
+                return self._upcoming_from_index(agency, compact, stop_id, now, active_services, horizon)
+            return self._upcoming_from_db(agency, stop_id, now, active_services, horizon)
         except Exception as e:
             log_debug(f"[SchedulerService Error] {e}")
-            return {"inbound": [], "outbound": []}
+            return []
+
+    def get_schedule(self, stop_id: str, agency: str = "muni") -> Dict[str, Any]:
+        agency = agency.lower()
+        log_debug(f"[SchedulerService] Looking up schedule for stop: {stop_id}, agency: {agency}")
+
+        result = {"inbound": [], "outbound": []}
+        for entry in self.get_upcoming(stop_id, agency):
+            bucket = result["inbound"] if entry["direction_id"] == 1 else result["outbound"]
+            if len(bucket) >= 3:
+                continue
+            bucket.append({
+                "route_number": entry["route_number"],
+                "destination": entry["destination"],
+                "arrival_time": entry["arrival"].strftime("%I:%M %p").lstrip("0"),
+                "status": "Scheduled"
+            })
+        return result
+
+
+schedule_service = SchedulerService()
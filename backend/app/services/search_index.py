@@ -0,0 +1,283 @@
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services.agency_registry import agency_registry
+from app.services.debug_logger import log_debug
+from app.services.gtfs_service import GTFSService
+from app.services.stop_helper import load_stops
+
+# Street-name words folded to one spelling so "19th avenue" finds "19th Ave"
+_SYNONYMS = {
+    "street": "st", "avenue": "ave", "av": "ave", "boulevard": "blvd", "drive": "dr",
+    "road": "rd", "place": "pl", "terrace": "ter", "court": "ct", "lane": "ln",
+    "highway": "hwy", "center": "ctr", "centre": "ctr", "station": "sta",
+    "north": "n", "south": "s", "east": "e", "west": "w", "saint": "st", "mount": "mt",
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Score weights: a full token beats a prefix beats a fuzzy (trigram) match
+EXACT, PREFIX, FUZZY = 1.0, 0.75, 0.5
+FUZZY_MIN_SIMILARITY = 0.35
+# How much being close to the user can add to the text score, and over what distance it fades
+DISTANCE_WEIGHT = 0.5
+DISTANCE_SCALE_MILES = 1.0
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercase, strip accents, split on punctuation and fold street-name synonyms."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode().lower()
+    return [_SYNONYMS.get(token, token) for token in _TOKEN_RE.findall(text)]
+
+
+def _trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    In-memory typeahead index over stops and routes of every agency.
+
+    Documents are rows of flat arrays (kind, agency, id, name, code, lat, lon). Every
+    normalized token goes into a sorted vocabulary; a query token is matched as a whole
+    token or as a prefix by bisecting that vocabulary (the array form of a prefix trie),
+    and, when neither matches, through a trigram index over the vocabulary so typos like
+    "holoway" still find "holloway". Each vocabulary token has a postings set of
+    document ids. A document must match every query token; its score is the mean of the
+    per-token match weights, plus a bonus for an exact stop code or route number and,
+    when the caller's position is known, a proximity bonus.
+    """
+
+    def __init__(self):
+        self.kinds: List[str] = []
+        self.agencies: List[str] = []
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.codes: List[Optional[str]] = []
+        self.lat = np.empty(0)
+        self.lon = np.empty(0)
+        self.vocabulary: List[str] = []
+        self.postings: List[Set[int]] = []
+        self.trigram_index: Dict[str, List[int]] = {}
+        # Agencies whose stops and routes were read into the index
+        self.indexed_agencies: List[str] = []
+        self._cache: "OrderedDict[Tuple, List[Tuple[int, float]]]" = OrderedDict()
+        # /search runs in the threadpool: lookups, LRU moves and evictions are taken together
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, stops: List[Dict[str, Any]], routes: List[Dict[str, Any]]) -> "SearchIndex":
+        index = cls()
+        lat, lon = [], []
+        doc_tokens: List[Set[str]] = []
+
+        for stop in stops:
+            # BART parent places and station entrances share the station's name
+            if "_" in str(stop["stop_id"]):
+                continue
+            index.kinds.append("stop")
+            index.agencies.append(stop["agency"])
+            index.ids.append(str(stop["stop_id"]))
+            index.names.append(stop["stop_name"].strip())
+            index.codes.append(stop.get("stop_code"))
+            lat.append(stop["stop_lat"])
+            lon.append(stop["stop_lon"])
+            doc_tokens.append(set(normalize(stop["stop_name"])) | set(normalize(stop.get("stop_code") or "")))
+
+        for route in routes:
+            index.kinds.append("route")
+            index.agencies.append(route["agency"])
+            index.ids.append(str(route["route_id"]))
+            index.names.append(route["route_long_name"] or route["route_short_name"] or str(route["route_id"]))
+            index.codes.append(route["route_short_name"])
+            lat.append(math.nan)
+            lon.append(math.nan)
+            doc_tokens.append(set(normalize(route["route_short_name"] or "")) | set(normalize(route["route_long_name"] or "")))
+
+        postings: Dict[str, Set[int]] = defaultdict(set)
+        for doc, tokens in enumerate(doc_tokens):
+            for token in tokens:
+                postings[token].add(doc)
+
+        index.vocabulary = sorted(postings)
+        index.postings = [postings[token] for token in index.vocabulary]
+        trigram_index: Dict[str, List[int]] = defaultdict(list)
+        for token_id, token in enumerate(index.vocabulary):
+            for gram in _trigrams(token):
+                trigram_index[gram].append(token_id)
+        index.trigram_index = dict(trigram_index)
+        index.lat = np.array(lat, dtype=np.float64)
+        index.lon = np.array(lon, dtype=np.float64)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _token_matches(self, token: str) -> Dict[int, float]:
+        """Document id -> best weight for one query token."""
+        matches: Dict[int, float] = {}
+        start = bisect_left(self.vocabulary, token)
+        for token_id in range(start, len(self.vocabulary)):
+            candidate = self.vocabulary[token_id]
+            if not candidate.startswith(token):
+                break
+            weight = EXACT if candidate == token else PREFIX * (0.5 + 0.5 * len(token) / len(candidate))
+            for doc in self.postings[token_id]:
+                if matches.get(doc, 0.0) < weight:
+                    matches[doc] = weight
+        if matches or len(token) < 3:
+            return matches
+
+        grams = _trigrams(token)
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for token_id in self.trigram_index.get(gram, ()):
+                overlap[token_id] += 1
+        for token_id, shared in overlap.items():
+            similarity = shared / (len(grams) + len(_trigrams(self.vocabulary[token_id])) - shared)
+            if similarity < FUZZY_MIN_SIMILARITY:
+                continue
+            weight = FUZZY * similarity
+            for doc in self.postings[token_id]:
+                if matches.get(doc, 0.0) < weight:
+                    matches[doc] = weight
+        return matches
+
+    def _text_search(self, query: str) -> List[Tuple[int, float]]:
+        """(doc, text score) for every document matching all query tokens; memoized per query."""
+        with self._cache_lock:
+            cached = self._cache.get(query)
+            if cached is not None:
+                self._cache.move_to_end(query)
+                return cached
+
+        tokens = normalize(query)
+        scored: Dict[int, float] = {}
+        if tokens:
+            per_token = sorted((self._token_matches(token) for token in tokens), key=len)
+            scored = dict(per_token[0])
+            for matches in per_token[1:]:
+                scored = {doc: score + matches[doc] for doc, score in scored.items() if doc in matches}
+            compact = query.strip().upper()
+            for doc in scored:
+                scored[doc] /= len(tokens)
+                if self.codes[doc] and self.codes[doc].upper() == compact:
+                    scored[doc] += EXACT
+        result = list(scored.items())
+
+        with self._cache_lock:
+            self._cache[query] = result
+            if len(self._cache) > 1024:
+                self._cache.popitem(last=False)
+        return result
+
+    def search(self, query: str, limit: int = 10, agency: Optional[str] = None, kind: Optional[str] = None,
+               lat: Optional[float] = None, lon: Optional[float] = None) -> List[Dict[str, Any]]:
+        matches = [
+            (doc, score) for doc, score in self._text_search(query.lower())
+            if (agency is None or self.agencies[doc] == agency) and (kind is None or self.kinds[doc] == kind)
+        ]
+        if not matches:
+            return []
+
+        docs = np.fromiter((doc for doc, _ in matches), dtype=np.int64, count=len(matches))
+        scores = np.fromiter((score for _, score in matches), dtype=np.float64, count=len(matches))
+        distances = None
+        if lat is not None and lon is not None:
+            # Equirectangular distance in miles; plenty for ranking within a metro area
+            dlat = np.radians(self.lat[docs] - lat)
+            dlon = np.radians(self.lon[docs] - lon) * math.cos(math.radians(lat))
+            distances = 3958.8 * np.sqrt(dlat * dlat + dlon * dlon)
+            scores = scores + np.nan_to_num(DISTANCE_WEIGHT * np.exp(-distances / DISTANCE_SCALE_MILES))
+
+        order = np.argsort(-scores, kind="stable")[:limit]
+        results = []
+        for i in order:
+            doc = int(docs[i])
+            result = {
+                "type": self.kinds[doc],
+                "agency": self.agencies[doc],
+                "id": self.ids[doc],
+                "name": self.names[doc],
+                "code": self.codes[doc],
+                "score": round(float(scores[i]), 3),
+            }
+            if self.kinds[doc] == "stop":
+                result["lat"] = float(self.lat[doc])
+                result["lon"] = float(self.lon[doc])
+                if distances is not None:
+                    result["distance_miles"] = round(float(distances[i]), 3)
+            results.append(result)
+        return results
+
+
+_index: Optional[SearchIndex] = None
+_lock = threading.Lock()
+
+
+def _read_routes(agency: str) -> List[Dict[str, Any]]:
+    routes = GTFSService(agency).get_routes()
+    return [
+        {
+            "agency": agency,
+            "route_id": row["route_id"],
+            "route_short_name": row.get("route_short_name"),
+            "route_long_name": row.get("route_long_name"),
+        }
+        for row in routes.to_dict("records")
+    ]
+
+
+def _build(agencies: List[str]) -> SearchIndex:
+    routes, stops = [], []
+    for agency in agencies:
+        stops.extend(load_stops(agency))
+        try:
+            routes.extend(_read_routes(agency))
+        except Exception as e:
+            log_debug(f"[Search] ⚠️ No routes for {agency}: {e}")
+    index = SearchIndex.build(stops, routes)
+    index.indexed_agencies = list(agencies)
+    return index
+
+
+def preload_search_index() -> int:
+    """
+    Build the index from the stop catalogs and routes tables of the preloaded agencies,
+    so startup does not read every enabled agency just to make it searchable. Other
+    enabled agencies are added by `get_search_index` the first time a search names them.
+    """
+    global _index
+    index = _build(agency_registry.pinned())
+    if not len(index):
+        raise RuntimeError("Search index is empty: no stops or routes loaded")
+    _index = index
+    log_debug(f"[Search] ✓ Indexed {len(index)} stops/routes, {len(index.vocabulary)} tokens")
+    return len(index)
+
+
+def get_search_index(agency: Optional[str] = None) -> SearchIndex:
+    """
+    The shared index, built on first use if warm-up has not done it yet. When `agency`
+    (normalized) is enabled but not indexed yet, the index is rebuilt with it added;
+    indexed agencies stay searchable after their stop catalogs are evicted.
+    """
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                preload_search_index()
+    if agency is not None and agency not in _index.indexed_agencies and agency_registry.is_enabled(agency):
+        with _lock:
+            if agency not in _index.indexed_agencies:
+                index = _build(_index.indexed_agencies + [agency])
+                _index = index
+                log_debug(f"[Search] ✓ Added {agency}: {len(index)} stops/routes indexed")
+    return _index
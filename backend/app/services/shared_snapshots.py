@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import orjson
+
+from app.config import settings
+from app.schemas.transit import StopArrivals
+from app.services.arrival_recorder import arrival_recorder
+from app.services.debug_logger import log_debug
+from app.utils.cache import get_async_redis
+
+
+class SharedSnapshots:
+    """
+    Snapshots built by the leader and served from memory on every worker.
+
+    A snapshot is a dict with "fetched_at" (epoch seconds). `publish` keeps it in this
+    worker and writes it to Redis as `{prefix}:{name}`, with its fetched_at under
+    `{prefix}:{name}:version`, in one transaction; both expire after `max_age()`.
+    Every worker's sync loop reads the version of each of `names()` every
+    `sync_seconds()` and fetches and parses the snapshot only when it is newer than its
+    own copy. `get` returns a snapshot only while it is younger than `max_age()`, so
+    callers fall back to their upstream once the leader stops publishing. `on_load`
+    sees each snapshot as it is loaded (to export its size and age).
+    """
+
+    def __init__(self, label: str, prefix: str, names: Callable[[], Iterable[str]],
+                 max_age: Callable[[], int], sync_seconds: Callable[[], int],
+                 on_load: Callable[[str, Dict[str, Any]], None]):
+        self.label = label
+        self.prefix = prefix
+        self.names = names
+        self.max_age = max_age
+        self.sync_seconds = sync_seconds
+        self.on_load = on_load
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    def _load(self, name: str, snapshot: Dict[str, Any]):
+        self._snapshots[name] = snapshot
+        self.on_load(name, snapshot)
+
+    def get(self, name: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The snapshot for `name`, or None when there is none younger than max_age()."""
+        snapshot = self._snapshots.get(name)
+        now = time.time() if now is None else now
+        if snapshot is None or now - snapshot["fetched_at"] > self.max_age():
+            return None
+        return snapshot
+
+    # --- Leader ---
+
+    async def publish(self, name: str, snapshot: Dict[str, Any]):
+        """Serve a new snapshot here and hand it to the other workers."""
+        self._load(name, snapshot)
+        try:
+            pipe = get_async_redis().pipeline(transaction=True)
+            pipe.setex(self.key(name), self.max_age(), orjson.dumps(snapshot))
+            pipe.setex(f"{self.key(name)}:version", self.max_age(), repr(snapshot["fetched_at"]))
+            await pipe.execute()
+        except Exception as e:
+            log_debug(f"[{self.label}] ⚠️ Could not publish {name} snapshot: {e}")
+
+    # --- Every worker ---
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sync_loop(self):
+        while True:
+            for name in self.names():
+                try:
+                    await self.sync(name)
+                except Exception as e:
+                    log_debug(f"[{self.label}] ⚠️ {name} snapshot sync failed: {e}")
+            await asyncio.sleep(self.sync_seconds())
+
+    async def sync(self, name: str) -> bool:
+        """Load the leader's latest snapshot if it is newer than ours. Returns whether it was."""
+        client = get_async_redis()
+        version = await client.get(f"{self.key(name)}:version")
+        current = self._snapshots.get(name)
+        if not version or (current is not None and float(version) <= current["fetched_at"]):
+            return False
+        raw = await client.get(self.key(name))
+        if not raw:
+            return False
+        self._load(name, await asyncio.to_thread(orjson.loads, raw))
+        return True
+
+
+def record_due(fetched_at: float, entries_by_stop: Dict[str, List[list]],
+               stop_arrivals: Callable[[str, List[list], float], StopArrivals]):
+    """
+    Hand snapshot entries close to arrival (entry[0] is the arrival epoch) to the arrival
+    recorder. Stops answered from a snapshot never reach the per-stop recording path,
+    and these are the only predictions delay analytics reads.
+    """
+    if not settings.ARRIVAL_RECORDER_ENABLED:
+        return
+    cutoff = fetched_at + (settings.DELAY_ARRIVAL_MINUTES + 0.5) * 60
+    for stop_code, entries in entries_by_stop.items():
+        due = [entry for entry in entries if entry[0] <= cutoff]
+        if due:
+            arrival_recorder.record(stop_arrivals(stop_code, due, fetched_at))
@@ -0,0 +1,334 @@
+"""
+Static export of the map data that only changes with the GTFS feed.
+
+Per agency and feed version this writes stops per z/x/y tile, route metadata, route
+shapes and (for BART) the line topology as JSON files under STATIC_TILES_DIR, each
+with a content hash in its name and .gz/.br siblings next to it. Caddy serves them
+at STATIC_TILES_URL straight from disk (precompressed, cached as immutable), so map
+loads never reach the API; /api/v1/tiles/manifest tells clients the current names.
+Unchanged files keep their names across feed versions and stay cached.
+
+Tiles are written for each zoom in STATIC_TILES_ZOOMS. With STATIC_TILES_ENABLED the
+leader re-exports an agency whenever its feed_version changes, checking every
+STATIC_TILES_CHECK_SECONDS; otherwise run `python scripts/export_static_tiles.py`
+after loading GTFS.
+"""
+import asyncio
+import gzip
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import orjson
+
+from app.config import settings
+from app.services.agency_registry import agency_registry
+from app.services.debug_logger import log_debug
+
+try:
+    import brotli
+except ImportError:  # optional: .gz siblings only
+    brotli = None
+
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 12
+COORD_DIGITS = 6
+
+
+def tile_for(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """Web Mercator (slippy map) x/y of the tile containing (lat, lon) at `zoom`."""
+    n = 1 << zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", value)
+
+
+def _text(value: Any) -> Optional[str]:
+    # pandas hands back NaN for empty cells and numbers for numeric-looking columns
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+class TileWriter:
+    """Content-addressed writes: `{name}.{hash}.json` plus .gz and .br, skipped if present."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.written = 0
+        self.reused = 0
+
+    def write(self, name: str, content: Any) -> str:
+        body = orjson.dumps(content)
+        digest = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+        relative = f"{name}.{digest}.json"
+        path = os.path.join(self.root, relative)
+        if os.path.exists(path):
+            self.reused += 1
+            return relative
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_file(path + ".gz", gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            self._write_file(path + ".br", brotli.compress(body, quality=11))
+        # The plain file last: its presence means the set is complete
+        self._write_file(path, body)
+        self.written += 1
+        return relative
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+class StaticTileExporter:
+    """
+    Builds the static bundle and the manifest naming its files. `export()` runs the
+    whole pipeline (a script or the leader job calls it); `manifest()` is what the
+    API serves, re-read only when the manifest file changes on disk.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._manifest_mtime: Optional[float] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(settings.STATIC_TILES_DIR, MANIFEST_NAME)
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        """The current manifest, or None before the first export."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except FileNotFoundError:
+            return None
+        if mtime != self._manifest_mtime:
+            with open(self.manifest_path, "rb") as f:
+                self._manifest = orjson.loads(f.read())
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def feed_version(self, agency: str) -> Optional[str]:
+        """feed_info.feed_version of the loaded GTFS, if the feed has one."""
+        from app.services.gtfs_service import GTFSService
+
+        try:
+            feed_info = GTFSService(agency).get_feed_info()
+        except Exception:
+            return None
+        if feed_info.empty or "feed_version" not in feed_info.columns:
+            return None
+        return _text(feed_info["feed_version"].iloc[0])
+
+    def export(self, agencies: Optional[List[str]] = None, force: bool = False) -> Dict[str, Any]:
+        """
+        Export every enabled agency (or `agencies`) whose feed version differs from the
+        manifest's, write the new manifest and remove files neither it nor the previous
+        manifest refers to. Agencies that fail keep their previous entry.
+        """
+        with self._lock:
+            start = time.perf_counter()
+            previous = self.manifest() or {}
+            previous_agencies = previous.get("agencies", {})
+            entries = dict(previous_agencies)
+            writer = TileWriter(settings.STATIC_TILES_DIR)
+
+            for agency in agencies or agency_registry.enabled():
+                agency = agency_registry.normalize(agency)
+                version = self.feed_version(agency)
+                current = previous_agencies.get(agency)
+                if (not force and version and current and current.get("feed_version") == version
+                        and current.get("zooms") == settings.STATIC_TILES_ZOOMS):
+                    continue
+                try:
+                    entries[agency] = self._export_agency(writer, agency, version)
+                    log_debug(f"[Tiles] ✓ Exported {agency} (feed {entries[agency]['feed_version']})")
+                except Exception as e:
+                    log_debug(f"[Tiles] ✗ Export failed for {agency}: {e}")
+
+            manifest = {
+                "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "base_url": settings.STATIC_TILES_URL.rstrip("/"),
+                "agencies": entries,
+            }
+            if entries != previous_agencies or not previous:
+                os.makedirs(settings.STATIC_TILES_DIR, exist_ok=True)
+                TileWriter._write_file(self.manifest_path, orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+            else:
+                manifest = previous
+            removed = self._prune(_referenced(manifest) | _referenced(previous))
+            log_debug(
+                f"[Tiles] ✓ Export done in {time.perf_counter() - start:.2f}s "
+                f"({writer.written} written, {writer.reused} unchanged, {removed} removed)"
+            )
+            return manifest
+
+    async def poll(self):
+        """Leader job: re-export agencies whose feed version changed."""
+        await asyncio.to_thread(self.export)
+
+    def _export_agency(self, writer: TileWriter, agency: str, version: Optional[str]) -> Dict[str, Any]:
+        from app.services.gtfs_service import GTFSService
+
+        service = GTFSService(agency)
+        routes = service.get_routes()
+        trips = service.get_trips()
+        stops = service.get_stops()
+        try:
+            stop_routes = service.get_stop_routes()
+        except Exception:
+            # Feeds loaded without stop_times: tiles carry no route list per stop
+            stop_routes = None
+
+        routes_by_stop: Dict[str, List[str]] = {}
+        if stop_routes is not None:
+            for stop_id, route_id in zip(stop_routes["stop_id"].astype(str), stop_routes["route_id"].astype(str)):
+                routes_by_stop.setdefault(stop_id, []).append(route_id)
+
+        shape_ids: Dict[str, List[str]] = {}
+        if "shape_id" in trips.columns:
+            pairs = trips[["route_id", "shape_id"]].dropna().astype(str).drop_duplicates()
+            for route_id, shape_id in zip(pairs["route_id"], pairs["shape_id"]):
+                shape_ids.setdefault(route_id, []).append(shape_id)
+
+        prefix = _safe_name(agency)
+        entry: Dict[str, Any] = {
+            "feed_version": version,
+            "zooms": settings.STATIC_TILES_ZOOMS,
+            "stops": self._write_stop_tiles(writer, prefix, stops, routes_by_stop),
+            "routes": writer.write(f"{prefix}/routes", self._route_metadata(routes, shape_ids)),
+            "shapes": self._write_shapes(writer, prefix, service, shape_ids),
+        }
+        if agency == "bart":
+            entry["topology"] = writer.write(f"{prefix}/topology", self._bart_topology())
+        if not version:
+            # No feed_info: the content itself identifies the version
+            content = orjson.dumps({k: entry[k] for k in ("stops", "routes", "shapes")}, option=orjson.OPT_SORT_KEYS)
+            entry["feed_version"] = "content-" + hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+        return entry
+
+    def _write_stop_tiles(self, writer: TileWriter, prefix: str, stops, routes_by_stop: Dict[str, List[str]]) -> Dict[str, str]:
+        """One file per non-empty z/x/y tile: [stop_id, stop_code, name, lat, lon, route_ids] rows."""
+        has_code = "stop_code" in stops.columns
+        rows = []
+        for stop in stops.itertuples(index=False):
+            stop_id = str(stop.stop_id)
+            lat, lon = float(stop.stop_lat), float(stop.stop_lon)
+            rows.append([
+                stop_id,
+                _text(stop.stop_code) if has_code else None,
+                _text(stop.stop_name),
+                round(lat, COORD_DIGITS),
+                round(lon, COORD_DIGITS),
+                sorted(routes_by_stop.get(stop_id, [])),
+            ])
+
+        tiles: Dict[str, str] = {}
+        for zoom in settings.STATIC_TILES_ZOOMS:
+            by_tile: Dict[Tuple[int, int], List[list]] = {}
+            for row in rows:
+                by_tile.setdefault(tile_for(row[3], row[4], zoom), []).append(row)
+            for (x, y), tile_rows in sorted(by_tile.items()):
+                tile_rows.sort(key=lambda row: row[0])
+                content = {"z": zoom, "x": x, "y": y,
+                           "fields": ["stop_id", "stop_code", "name", "lat", "lon", "routes"], "stops": tile_rows}
+                tiles[f"{zoom}/{x}/{y}"] = writer.write(f"{prefix}/stops/{zoom}/{x}/{y}", content)
+        return tiles
+
+    @staticmethod
+    def _route_metadata(routes, shape_ids: Dict[str, List[str]]) -> Dict[str, Any]:
+        result = []
+        for route in routes.to_dict("records"):
+            route_id = str(route["route_id"])
+            result.append({
+                "route_id": route_id,
+                "short_name": _text(route.get("route_short_name")),
+                "long_name": _text(route.get("route_long_name")),
+                "type": _text(route.get("route_type")),
+                "color": _text(route.get("route_color")),
+                "text_color": _text(route.get("route_text_color")),
+                "shape_ids": sorted(shape_ids.get(route_id, [])),
+            })
+        result.sort(key=lambda route: route["route_id"])
+        return {"routes": result}
+
+    def _write_shapes(self, writer: TileWriter, prefix: str, service, shape_ids: Dict[str, List[str]]) -> Dict[str, str]:
+        """One file per route with each of its shapes as [[lat, lon], ...]; {} for feeds without shapes."""
+        if not shape_ids:
+            return {}
+        try:
+            shapes = service.get_shapes()
+        except Exception:
+            return {}
+        shapes = shapes.assign(
+            shape_id=shapes["shape_id"].astype(str),
+            shape_pt_sequence=shapes["shape_pt_sequence"].astype(int),
+        ).sort_values(["shape_id", "shape_pt_sequence"])
+        points: Dict[str, List[List[float]]] = {}
+        for shape_id, group in shapes.groupby("shape_id", sort=False):
+            lats = group["shape_pt_lat"].astype(float).round(COORD_DIGITS).tolist()
+            lons = group["shape_pt_lon"].astype(float).round(COORD_DIGITS).tolist()
+            points[shape_id] = [list(point) for point in zip(lats, lons)]
+
+        files: Dict[str, str] = {}
+        for route_id, ids in sorted(shape_ids.items()):
+            route_shapes = {shape_id: points[shape_id] for shape_id in sorted(ids) if shape_id in points}
+            if route_shapes:
+                files[route_id] = writer.write(f"{prefix}/shapes/{_safe_name(route_id)}",
+                                               {"route_id": route_id, "shapes": route_shapes})
+        return files
+
+    @staticmethod
+    def _bart_topology() -> Dict[str, Any]:
+        """Lines as ordered station lists, station coordinates and station -> lines."""
+        from app.services.stations_data import lines_for_station, routes, stations
+
+        codes = sorted({code for line in routes.values() for code in line["stations"]})
+        return {
+            "lines": routes,
+            "stations": stations,
+            "station_lines": {code: lines_for_station(code) for code in codes},
+        }
+
+    def _prune(self, keep: Set[str]) -> int:
+        """Delete hashed files (and their .gz/.br) that no kept manifest names."""
+        root = settings.STATIC_TILES_DIR
+        if not os.path.isdir(root):
+            return 0
+        removed = 0
+        for directory, _, files in os.walk(root):
+            for name in files:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, root).replace(os.sep, "/")
+                if relative == MANIFEST_NAME:
+                    continue
+                base = re.sub(r"\.(gz|br|tmp\d+)$", "", relative)
+                if base not in keep:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+def _referenced(manifest: Dict[str, Any]) -> Set[str]:
+    files: Set[str] = set()
+    for entry in manifest.get("agencies", {}).values():
+        files.update(entry.get("stops", {}).values())
+        files.update(entry.get("shapes", {}).values())
+        files.update(entry[key] for key in ("routes", "topology") if entry.get(key))
+    return files
+
+
+static_tiles = StaticTileExporter()
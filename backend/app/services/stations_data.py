@@ -12,8 +12,25 @@ stations = {
     "OAKL": {"lat": 37.713238, "lng": -122.212191, "name": "Oakland International Airport", "iconAbbreviation": "OA"},
 }
 
+# Filled by build_station_to_lines() during warm-up, or on the first lookup
 station_to_lines = {}
 
-for line, info in routes.items():
-    for station in info["stations"]:
-        station_to_lines.setdefault(station, []).append(line)
+
+def build_station_to_lines() -> int:
+    """(Re)build the BART station -> lines topology from the route definitions."""
+    global station_to_lines
+    built = {}
+    for line, info in routes.items():
+        for station in info["stations"]:
+            built.setdefault(station, []).append(line)
+    # Swapped in whole, so concurrent lookups never see a partly built map
+    station_to_lines = built
+    return len(built)
+
+
+def lines_for_station(code: str) -> list:
+    """BART lines serving a station code ([] for Muni stops and unknown codes)."""
+    if not station_to_lines:
+        build_station_to_lines()
+    return station_to_lines.get(code, [])
+
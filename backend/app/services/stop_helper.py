@@ -1,10 +1,10 @@
-from typing import List, Dict, Any, Optional
+from collections import defaultdict
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple
 import math
-import pandas as pd
+import threading
 
+from app.services.agency_registry import agency_registry
 from app.services.debug_logger import log_debug
-from app.services.gtfs_service import GTFSService
-from app.config import settings
 
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -49,49 +49,237 @@ def find_nearby_stops(
     return sorted(results, key=lambda s: s["distance_miles"])[:limit]
 
 
+# Grid cell for radius queries within an agency (~1.1 km north-south), and the coarser
+# cell of the cross-agency coverage index (~5.5 km)
+CELL_DEGREES = 0.01
+COVERAGE_DEGREES = 0.05
+MILES_PER_DEGREE_LAT = 69.0
+
+Cell = Tuple[int, int]
+
+
+def _cell(lat: float, lon: float, size: float) -> Cell:
+    return math.floor(lat / size), math.floor(lon / size)
+
+
+def _cells_around(lat: float, lon: float, radius_miles: float, size: float) -> Iterator[Cell]:
+    """Every cell of `size` degrees touching the box of `radius_miles` around a point."""
+    dlat = radius_miles / MILES_PER_DEGREE_LAT
+    dlon = radius_miles / (MILES_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    y0, x0 = _cell(lat - dlat, lon - dlon, size)
+    y1, x1 = _cell(lat + dlat, lon + dlon, size)
+    for y in range(y0, y1 + 1):
+        for x in range(x0, x1 + 1):
+            yield y, x
+
+
+class StopCatalog:
+    """One agency's stops, with lookups by stop code and stop id and a grid for radius queries."""
+
+    def __init__(self, agency: str, stops: List[Dict[str, Any]]):
+        self.agency = agency
+        self.stops = stops
+        self.by_code: Dict[str, Dict[str, Any]] = {}
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.grid: Dict[Cell, List[Dict[str, Any]]] = defaultdict(list)
+        for stop in stops:
+            self.by_id.setdefault(str(stop["stop_id"]), stop)
+            if stop.get("stop_code"):
+                self.by_code.setdefault(stop["stop_code"], stop)
+            self.grid[_cell(stop["stop_lat"], stop["stop_lon"], CELL_DEGREES)].append(stop)
+
+    def near(self, lat: float, lon: float, radius_miles: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """(distance in miles, stop) for stops within the radius, reading only the grid cells it covers."""
+        found = []
+        for cell in _cells_around(lat, lon, radius_miles, CELL_DEGREES):
+            for stop in self.grid.get(cell, ()):
+                distance = calculate_distance(lat, lon, stop["stop_lat"], stop["stop_lon"])
+                if distance <= radius_miles:
+                    found.append((distance, stop))
+        return found
+
+    def coverage(self) -> Set[Cell]:
+        return {_cell(stop["stop_lat"], stop["stop_lon"], COVERAGE_DEGREES) for stop in self.stops}
+
+
+def _read_stops(agency: str) -> List[Dict[str, Any]]:
+    """Read the stops table for one normalized agency from the database."""
+    from app.services.gtfs_service import GTFSService
+
+    service = GTFSService(agency)
+    stops_df = service.get_stops()
+    stops = []
+    for _, row in stops_df.iterrows():
+        stops.append({
+            "stop_id": row["stop_id"],
+            "stop_name": row["stop_name"],
+            "stop_lat": float(row["stop_lat"]),
+            "stop_lon": float(row["stop_lon"]),
+            "agency": agency,
+            "stop_code": str(row["stop_code"]) if "stop_code" in row and row["stop_code"] else None
+        })
+    return stops
+
+
+def _load_catalog(agency: str) -> StopCatalog:
+    stops = _read_stops(agency)
+    if not stops:
+        log_debug(f"✗ GTFS stops table is empty for agency: {agency}")
+    catalog = StopCatalog(agency, stops)
+    _coverage.update(agency, catalog.coverage())
+    return catalog
+
+
+class CoverageIndex:
+    """
+    Which agencies have stops in each coarse cell, so a nearby query only opens the
+    catalogs of agencies around the point however many are enabled. An agency first
+    covers the cells of its stops' bounding box (one aggregate query, no stops read)
+    and its exact cells once its catalog has been loaded; cells are kept after the
+    catalog is evicted, as they are small.
+    """
+
+    def __init__(self):
+        self._cells: Dict[Cell, Set[str]] = defaultdict(set)
+        self._agency_cells: Dict[str, Set[Cell]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, agency: str, cells: Set[Cell]):
+        with self._lock:
+            for cell in self._agency_cells.get(agency, ()):
+                self._cells[cell].discard(agency)
+            for cell in cells:
+                self._cells[cell].add(agency)
+            self._agency_cells[agency] = cells
+
+    def _bounding_cells(self, agency: str) -> Optional[Set[Cell]]:
+        """Cells of the stops' bounding box; empty for an empty stops table, None if it cannot be read."""
+        from app.services.gtfs_service import GTFSService
+
+        try:
+            bounds = GTFSService(agency).get_stop_bounds().iloc[0]
+        except Exception as e:
+            log_debug(f"[Stops] ⚠️ No stop bounds for {agency}: {e}")
+            return None
+        # MIN/MAX over no rows are NULL
+        if bounds.isna().any():
+            return set()
+        y0, x0 = _cell(float(bounds["min_lat"]), float(bounds["min_lon"]), COVERAGE_DEGREES)
+        y1, x1 = _cell(float(bounds["max_lat"]), float(bounds["max_lon"]), COVERAGE_DEGREES)
+        return {(y, x) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)}
+
+    def agencies_near(self, lat: float, lon: float, radius_miles: float, agencies: List[str]) -> List[str]:
+        for agency in agencies:
+            if agency not in self._agency_cells:
+                catalog = _catalogs.peek(agency)
+                cells = catalog.coverage() if catalog is not None else self._bounding_cells(agency)
+                # Not recorded when the bounds query failed, so the next query retries it
+                if cells is not None:
+                    self.update(agency, cells)
+        around = set()
+        for cell in _cells_around(lat, lon, radius_miles, COVERAGE_DEGREES):
+            around |= self._cells.get(cell, set())
+        return [agency for agency in agencies if agency in around]
+
+
+# Stop catalogs by normalized agency. Pinned agencies are filled by preload_stops() during
+# startup warm-up; others load on first use and are evicted by the agency registry when cold.
+_catalogs = agency_registry.cache("stops", _load_catalog)
+_coverage = CoverageIndex()
+
+
+def _agency_keys(agency: Optional[str] = None) -> List[str]:
+    """Return the de-duplicated, normalized agency keys to load."""
+    return [agency_registry.normalize(agency)] if agency else agency_registry.enabled()
+
+
+def preload_stops(agency: str) -> int:
+    """
+    Load one agency's stops into the in-memory catalog.
+    Raises if the table is missing or empty so warm-up can report the failure.
+    """
+    normalized = agency_registry.normalize(agency)
+    stops = _read_stops(normalized)
+    if not stops:
+        raise RuntimeError(f"GTFS stops table is empty for agency: {normalized}")
+    catalog = StopCatalog(normalized, stops)
+    _catalogs.set(normalized, catalog)
+    _coverage.update(normalized, catalog.coverage())
+    return len(stops)
+
+
+def stop_catalog(agency: str) -> StopCatalog:
+    """
+    An agency's catalog, loaded from the database on first use; empty for agencies that
+    are not enabled. Raises if an enabled agency's stops cannot be read.
+    """
+    normalized = agency_registry.normalize(agency)
+    if not agency_registry.is_enabled(normalized):
+        return StopCatalog(normalized, [])
+    return _catalogs.get(normalized)
+
+
 def load_stops(agency: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Load stops from GTFS for one or all agencies."""
-    try:
-        agencies = [agency] if agency else settings.AGENCY_ID
-        all_stops = []
-
-        for ag in agencies:
-            normalized = settings.normalize_agency(ag)
-            service = GTFSService(normalized)
-            stops_df = service.get_stops()
-            if stops_df.empty:
-                log_debug(f"✗ GTFS stops table is empty for agency: {normalized}")
-                continue
-
-            for _, row in stops_df.iterrows():
-                stop = {
-                    "stop_id": row["stop_id"],
-                    "stop_name": row["stop_name"],
-                    "stop_lat": float(row["stop_lat"]),
-                    "stop_lon": float(row["stop_lon"]),
-                    "agency": normalized,
-                    "stop_code": str(row["stop_code"]) if "stop_code" in row and row["stop_code"] else None
-                }
-                all_stops.append(stop)
-
-        log_debug(f"✓ Loaded {len(all_stops)} stops for agency={agency or 'ALL'}")
-        return all_stops
+    """
+    Load stops from GTFS for one agency, or every enabled agency when none is given
+    (which loads all of them; prefer `nearby_stops` or `find_stop` where they fit).
+    Served from the in-memory catalog; agencies that fail to load are left out.
+    The returned dicts are shared, so callers must copy before mutating them.
+    """
+    all_stops = []
+    for normalized in _agency_keys(agency):
+        try:
+            all_stops.extend(stop_catalog(normalized).stops)
+        except Exception as e:
+            log_debug(f"✗ Error loading stops for {normalized}: {str(e)}")
+    return all_stops
 
+
+def find_stop(agency: str, stop_code: str) -> Optional[Dict[str, Any]]:
+    """The stop with a public stop code, or None (also when the agency cannot be loaded)."""
+    try:
+        return stop_catalog(agency).by_code.get(stop_code)
     except Exception as e:
-        log_debug(f"✗ Error loading stops: {str(e)}")
-        return []
+        log_debug(f"✗ Error loading stops for {agency}: {str(e)}")
+        return None
+
+
+def stop_id_for_code(agency: str, stop_code: str) -> str:
+    """GTFS stop_id for a public stop code (the code itself if no stop has it)."""
+    stop = find_stop(agency, stop_code)
+    return str(stop["stop_id"]) if stop is not None else stop_code
+
+
+def nearby_stops(lat: float, lon: float, radius: float = 0.15, agency: Optional[str] = None,
+                 limit: Optional[int] = None) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    (distance in miles, stop) for stops within `radius` miles, nearest first, across every
+    enabled agency or just one. Only agencies with stops around the point are loaded, and
+    only the grid cells the radius covers are read, so the cost does not grow with the
+    number of agencies or stops.
+    """
+    found = []
+    for candidate in _coverage.agencies_near(lat, lon, radius, _agency_keys(agency)):
+        try:
+            found.extend(stop_catalog(candidate).near(lat, lon, radius))
+        except Exception as e:
+            log_debug(f"✗ Error loading stops for {candidate}: {str(e)}")
+    found.sort(key=lambda item: item[0])
+    return found[:limit] if limit is not None else found
 
 
 def get_nearby_stops(lat: float, lon: float, radius: float = 0.15, limit: int = 20) -> List[Dict[str, Any]]:
     """Unified function to get nearby stops across all agencies (if agency not specified)."""
     log_debug(f"[Unified] Searching for nearby stops at ({lat}, {lon}) across all agencies")
-    all_nearby = []
-    for agency in settings.AGENCY_ID:
-        stops = load_stops(agency)
-        if not stops:
-            continue
-        nearby = find_nearby_stops(lat, lon, stops, radius, limit)
-        all_nearby.extend(nearby)
-
-    all_nearby.sort(key=lambda x: x["distance_miles"])
-    return all_nearby[:limit]
\ No newline at end of file
+    return [
+        {
+            "stop_id": stop["stop_id"],
+            "stop_code": stop.get("stop_code"),
+            "stop_name": stop["stop_name"],
+            "stop_lat": stop["stop_lat"],
+            "stop_lon": stop["stop_lon"],
+            "agency": stop["agency"],
+            "distance_miles": round(distance, 2)
+        }
+        for distance, stop in nearby_stops(lat, lon, radius, limit=limit)
+    ]
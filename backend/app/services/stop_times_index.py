@@ -0,0 +1,299 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.debug_logger import log_debug
+from app.services.gtfs_service import GTFSService
+
+
+def parse_gtfs_seconds(values: pd.Series) -> np.ndarray:
+    """Vectorized 'H:MM:SS' -> seconds after midnight (float, NaN where blank). Hours may exceed 24."""
+    parts = values.astype("string").str.strip().str.split(":", expand=True)
+    if parts.shape[1] < 3:
+        return np.full(len(values), np.nan)
+    numbers = parts.iloc[:, :3].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    return numbers[:, 0] * 3600 + numbers[:, 1] * 60 + numbers[:, 2]
+
+
+def format_gtfs_time(seconds: int) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def _interpolate_within_trips(times: np.ndarray, trip_codes: np.ndarray, distance: np.ndarray) -> np.ndarray:
+    """
+    Fill NaN times linearly between the surrounding timed stops of the same trip,
+    weighted by `distance` (shape_dist_traveled, or stop position when absent).
+    Leading/trailing gaps take the nearest known time.
+    """
+    missing = np.isnan(times)
+    if not missing.any():
+        return times
+
+    frame = pd.DataFrame({"trip": trip_codes, "t": times, "x": np.where(missing, np.nan, distance)})
+    grouped = frame.groupby("trip", sort=False)
+    prev_t, next_t = grouped["t"].ffill().to_numpy(), grouped["t"].bfill().to_numpy()
+    prev_x, next_x = grouped["x"].ffill().to_numpy(), grouped["x"].bfill().to_numpy()
+
+    span = next_x - prev_x
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(span > 0, (distance - prev_x) / span, 0.0)
+    filled = prev_t + (next_t - prev_t) * ratio
+    filled = np.where(np.isnan(prev_t), next_t, filled)
+    filled = np.where(np.isnan(next_t), prev_t, filled)
+    return np.where(missing, filled, times)
+
+
+class CompactStopTimes:
+    """
+    Pattern-compressed stop_times for one agency.
+
+    Trips with the same stop sequence share a pattern (one int32 stop-index array);
+    trips with the same running times within a pattern share a timing profile
+    (int32 arrival/departure offsets from the trip start). Each trip is then just
+    (profile, start seconds), and a trip's stop times are an array slice plus its start.
+    Everything is stored in flat NumPy arrays (CSR style) so it stays copy-on-write
+    friendly across forked workers.
+    """
+
+    def __init__(self, agency: str):
+        self.agency = agency
+        self.stop_ids = np.array([], dtype=object)
+        self.stop_names = np.array([], dtype=object)
+        self.stop_index: Dict[str, int] = {}
+        # patterns: stop sequences
+        self.pattern_ptr = np.zeros(1, dtype=np.int64)
+        self.pattern_stops = np.array([], dtype=np.int32)
+        self.pattern_sequence = np.array([], dtype=np.int32)
+        # timing profiles: offsets per pattern position
+        self.profile_pattern = np.array([], dtype=np.int32)
+        self.profile_ptr = np.zeros(1, dtype=np.int64)
+        self.profile_arrival = np.array([], dtype=np.int32)
+        self.profile_departure = np.array([], dtype=np.int32)
+        self.profile_timepoint = np.array([], dtype=bool)
+        # trips
+        self.trip_ids = np.array([], dtype=object)
+        self.trip_index: Dict[str, int] = {}
+        self.trip_profile = np.array([], dtype=np.int32)
+        self.trip_start = np.array([], dtype=np.int32)
+        # inverted index: stop -> (trip, position) events, CSR by stop index
+        self.stop_event_ptr = np.zeros(1, dtype=np.int64)
+        self.stop_event_trip = np.array([], dtype=np.int32)
+        self.stop_event_pos = np.array([], dtype=np.int32)
+
+    @classmethod
+    def build(
+        cls,
+        agency: str,
+        stop_times: pd.DataFrame,
+        stops: pd.DataFrame,
+        timepoints: Optional[pd.DataFrame] = None,
+    ) -> "CompactStopTimes":
+        index = cls(agency)
+        st = stop_times.assign(
+            trip_id=stop_times["trip_id"].astype(str),
+            stop_id=stop_times["stop_id"].astype(str),
+            stop_sequence=pd.to_numeric(stop_times["stop_sequence"], errors="coerce").fillna(0).astype(np.int32),
+        ).sort_values(["trip_id", "stop_sequence"], kind="stable").reset_index(drop=True)
+
+        stop_ids = pd.Index(pd.unique(pd.concat([stops["stop_id"].astype(str), st["stop_id"]])))
+        names = stops.assign(stop_id=stops["stop_id"].astype(str)).drop_duplicates("stop_id")
+        names = names.set_index("stop_id")["stop_name"].reindex(stop_ids)
+        index.stop_ids = stop_ids.to_numpy(dtype=object)
+        index.stop_names = names.fillna("").to_numpy(dtype=object)
+        index.stop_index = {sid: i for i, sid in enumerate(index.stop_ids)}
+
+        trip_codes, trip_ids = pd.factorize(st["trip_id"], sort=False)
+        stop_idx = stop_ids.get_indexer(st["stop_id"]).astype(np.int32)
+        bounds = np.flatnonzero(np.diff(trip_codes)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(st)]])
+        position = np.arange(len(st)) - np.repeat(starts, ends - starts)
+
+        arrival = parse_gtfs_seconds(st["arrival_time"])
+        departure = parse_gtfs_seconds(st["departure_time"]) if "departure_time" in st else arrival.copy()
+        departure = np.where(np.isnan(departure), arrival, departure)
+        timed = ~np.isnan(arrival)
+
+        if "timepoint" in st.columns:
+            flag = pd.to_numeric(st["timepoint"], errors="coerce").fillna(1).to_numpy() == 1
+            timepoint = timed & flag
+        elif timepoints is not None and not timepoints.empty:
+            marked = set(zip(timepoints["trip_id"].astype(str), timepoints["stop_id"].astype(str)))
+            timepoint = timed & np.fromiter(
+                ((t, s) in marked for t, s in zip(st["trip_id"], st["stop_id"])), dtype=bool, count=len(st)
+            )
+        else:
+            timepoint = timed
+
+        distance = position.astype(np.float64)
+        if "shape_dist_traveled" in st.columns:
+            shape_dist = pd.to_numeric(st["shape_dist_traveled"], errors="coerce").to_numpy(dtype=np.float64)
+            if not np.isnan(shape_dist).all():
+                distance = np.where(np.isnan(shape_dist), distance, shape_dist)
+
+        arrival = _interpolate_within_trips(arrival, trip_codes, distance)
+        departure = np.where(timed, departure, arrival)
+        arrival = np.nan_to_num(arrival).astype(np.int32)
+        departure = np.nan_to_num(departure).astype(np.int32)
+
+        pattern_keys: Dict[bytes, int] = {}
+        pattern_chunks, pattern_seq_chunks = [], []
+        profile_keys: Dict[Tuple[int, bytes], int] = {}
+        profile_pattern, arr_chunks, dep_chunks, tp_chunks = [], [], [], []
+        trip_profile = np.empty(len(trip_ids), dtype=np.int32)
+        trip_start = np.empty(len(trip_ids), dtype=np.int32)
+
+        for t, (a, b) in enumerate(zip(starts, ends)):
+            stops_key = stop_idx[a:b].tobytes()
+            p = pattern_keys.get(stops_key)
+            if p is None:
+                p = pattern_keys[stops_key] = len(pattern_chunks)
+                pattern_chunks.append(stop_idx[a:b])
+                pattern_seq_chunks.append(st["stop_sequence"].to_numpy()[a:b])
+
+            start = arrival[a]
+            arr_off = arrival[a:b] - start
+            dep_off = departure[a:b] - start
+            tp = timepoint[a:b]
+            profile_key = (p, arr_off.tobytes() + dep_off.tobytes() + tp.tobytes())
+            q = profile_keys.get(profile_key)
+            if q is None:
+                q = profile_keys[profile_key] = len(profile_pattern)
+                profile_pattern.append(p)
+                arr_chunks.append(arr_off)
+                dep_chunks.append(dep_off)
+                tp_chunks.append(tp)
+            trip_profile[t] = q
+            trip_start[t] = start
+
+        def _concat(chunks, dtype):
+            return np.concatenate(chunks).astype(dtype) if chunks else np.array([], dtype=dtype)
+
+        def _ptr(chunks):
+            return np.concatenate([[0], np.cumsum([len(c) for c in chunks])]).astype(np.int64)
+
+        index.pattern_ptr = _ptr(pattern_chunks)
+        index.pattern_stops = _concat(pattern_chunks, np.int32)
+        index.pattern_sequence = _concat(pattern_seq_chunks, np.int32)
+        index.profile_pattern = np.array(profile_pattern, dtype=np.int32)
+        index.profile_ptr = _ptr(arr_chunks)
+        index.profile_arrival = _concat(arr_chunks, np.int32)
+        index.profile_departure = _concat(dep_chunks, np.int32)
+        index.profile_timepoint = _concat(tp_chunks, bool)
+        index.trip_ids = trip_ids.to_numpy(dtype=object)
+        index.trip_index = {tid: i for i, tid in enumerate(index.trip_ids)}
+        index.trip_profile = trip_profile
+        index.trip_start = trip_start
+
+        order = np.argsort(stop_idx, kind="stable")
+        index.stop_event_trip = trip_codes[order].astype(np.int32)
+        index.stop_event_pos = position[order].astype(np.int32)
+        index.stop_event_ptr = np.searchsorted(stop_idx[order], np.arange(len(stop_ids) + 1)).astype(np.int64)
+        return index
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            value.nbytes for value in vars(self).values()
+            if isinstance(value, np.ndarray) and value.dtype != object
+        )
+
+    @property
+    def pattern_count(self) -> int:
+        return len(self.pattern_ptr) - 1
+
+    def pattern_of_trip(self, trip: int) -> int:
+        return int(self.profile_pattern[self.trip_profile[trip]])
+
+    def trip_times(self, trip_id: str) -> Optional[Dict[str, np.ndarray]]:
+        """Stop indices, sequences, arrival/departure seconds and timepoint flags for one trip."""
+        t = self.trip_index.get(str(trip_id))
+        if t is None:
+            return None
+        q = self.trip_profile[t]
+        p = self.profile_pattern[q]
+        ps, pe = self.pattern_ptr[p], self.pattern_ptr[p + 1]
+        qs, qe = self.profile_ptr[q], self.profile_ptr[q + 1]
+        start = self.trip_start[t]
+        return {
+            "stops": self.pattern_stops[ps:pe],
+            "stop_sequence": self.pattern_sequence[ps:pe],
+            "arrival": self.profile_arrival[qs:qe] + start,
+            "departure": self.profile_departure[qs:qe] + start,
+            "timepoint": self.profile_timepoint[qs:qe],
+        }
+
+    def trip_frame(self, trip_id: str) -> pd.DataFrame:
+        """Same columns as GTFSService.get_stops_for_trip, built from array slices."""
+        times = self.trip_times(trip_id)
+        columns = ["stop_id", "stop_name", "arrival_time", "departure_time", "stop_sequence", "timepoint"]
+        if times is None:
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame({
+            "stop_id": self.stop_ids[times["stops"]],
+            "stop_name": self.stop_names[times["stops"]],
+            "arrival_time": [format_gtfs_time(s) for s in times["arrival"]],
+            "departure_time": [format_gtfs_time(s) for s in times["departure"]],
+            "stop_sequence": times["stop_sequence"],
+            "timepoint": times["timepoint"].astype(int),
+        })
+
+    def stop_events(self, stop_id: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(trip indices, arrival seconds, departure seconds) for every visit to a stop."""
+        s = self.stop_index.get(str(stop_id))
+        if s is None:
+            empty = np.array([], dtype=np.int32)
+            return empty, empty, empty
+        a, b = self.stop_event_ptr[s], self.stop_event_ptr[s + 1]
+        trips = self.stop_event_trip[a:b]
+        offsets = self.profile_ptr[self.trip_profile[trips]] + self.stop_event_pos[a:b]
+        start = self.trip_start[trips]
+        return trips, self.profile_arrival[offsets] + start, self.profile_departure[offsets] + start
+
+
+# Loaded indexes by agency; filled by preload_stop_times() during warm-up
+_indexes: Dict[str, CompactStopTimes] = {}
+
+
+def get_stop_times_index(agency: str) -> Optional[CompactStopTimes]:
+    """Return the compact index for an agency if it has been loaded."""
+    return _indexes.get(agency.lower())
+
+
+def preload_stop_times(agency: str) -> Dict[str, int]:
+    """Load an agency's stop_times from the database and compact them. Returns size stats."""
+    agency = agency.lower()
+    service = GTFSService(agency)
+    try:
+        stop_times = service.get_stop_times()
+    except Exception as e:
+        # Some feeds ship without stop_times; schedule lookups then stay on the DB path
+        log_debug(f"[StopTimes] ✗ {agency}: stop_times unavailable, using DB queries ({type(e).__name__})")
+        return {"rows": 0}
+    if stop_times.empty:
+        raise RuntimeError(f"GTFS stop_times table is empty for agency: {agency}")
+    stops = service.get_stops()
+    try:
+        timepoints = service.get_timepoints()
+    except Exception:
+        timepoints = None
+
+    raw_bytes = int(stop_times.memory_usage(deep=True).sum())
+    index = CompactStopTimes.build(agency, stop_times, stops, timepoints)
+    _indexes[agency] = index
+
+    log_debug(
+        f"[StopTimes] ✓ {agency}: {len(stop_times)} rows, {len(index.trip_ids)} trips, "
+        f"{index.pattern_count} patterns, {len(index.profile_pattern)} profiles, "
+        f"{raw_bytes / 1e6:.1f} MB -> {index.nbytes / 1e6:.1f} MB"
+    )
+    return {
+        "rows": len(stop_times),
+        "trips": len(index.trip_ids),
+        "patterns": index.pattern_count,
+        "profiles": len(index.profile_pattern),
+        "raw_bytes": raw_bytes,
+        "compact_bytes": index.nbytes,
+    }
@@ -0,0 +1,457 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.agency_registry import agency_registry
+from app.services.debug_logger import log_debug
+from app.services.gtfs_service import GTFSService
+from app.services.isochrone import project, unproject
+from app.services.realtime_feed import realtime_feed, service_midnight
+from app.services.stop_helper import stop_catalog
+from app.services.stop_times_index import (
+    CompactStopTimes, format_gtfs_time, get_stop_times_index, preload_stop_times,
+)
+from app.utils.metrics import time_section
+
+# Vehicles farther than this from their trip's shape are treated as off route. It is
+# also the segment grid's cell size, so the 3x3 cells around a point hold every
+# segment within reach.
+MAX_OFFSET_METERS = 300.0
+# Metres of offset one metre of distance from the expected position along the shape
+# is worth, so a shape that doubles back is matched on the right pass
+HINT_WEIGHT = 0.05
+# A position only gives a delay between this long before the trip's first departure and
+# after its last arrival; outside that the trip is not running and the offset is meaningless
+RUNNING_MARGIN_SECONDS = 1800
+# Grid keys pack (shape, cell y, cell x) into one int64, so a lookup only sees its own shape
+_CELL_BITS = 20
+_CELL_BIAS = 1 << (_CELL_BITS - 1)
+
+
+def _cell_keys(shape: np.ndarray, cell_x: np.ndarray, cell_y: np.ndarray) -> np.ndarray:
+    return ((shape.astype(np.int64) << (2 * _CELL_BITS))
+            | ((cell_y + _CELL_BIAS) << _CELL_BITS) | (cell_x + _CELL_BIAS))
+
+
+class ShapeIndex:
+    """
+    One agency's trip geometry as flat NumPy arrays, for projecting many points at once.
+
+    Shapes are stored CSR style (points of shape k at ptr[k]:ptr[k+1], in metres from
+    isochrone.project) with the cumulative distance along the shape at every point.
+    Each segment (consecutive points of a shape) is filed under its shape and the grid
+    cells its bounding box touches, so projecting a point only measures the segments
+    of its own shape near it.
+    Trips without a GTFS shape (feeds that ship no shapes.txt) get their stop pattern
+    as a straight-line shape, named `pattern:{n}`.
+    """
+
+    def __init__(self, agency: str, shapes: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                 trip_shapes: Dict[str, str], trip_routes: Dict[str, str], stop_ids: np.ndarray,
+                 stop_x: np.ndarray, stop_y: np.ndarray, compact: Optional[CompactStopTimes]):
+        self.agency = agency
+        self.trip_shapes = trip_shapes
+        self.trip_routes = trip_routes
+        self.compact = compact
+        self.stop_ids = stop_ids
+        self.stop_x, self.stop_y = stop_x, stop_y
+        self._stop_distances: Dict[Tuple[int, int], np.ndarray] = {}
+
+        if compact is not None:
+            # Straight lines through the stops for patterns none of whose trips has a shape
+            shaped = {compact.pattern_of_trip(compact.trip_index[trip]) for trip in trip_shapes
+                      if trip in compact.trip_index and trip_shapes[trip] in shapes}
+            for p in range(compact.pattern_count):
+                if p in shaped:
+                    continue
+                stops = compact.pattern_stops[compact.pattern_ptr[p]:compact.pattern_ptr[p + 1]]
+                x, y = stop_x[stops], stop_y[stops]
+                known = ~np.isnan(x)
+                if known.sum() >= 2:
+                    shapes[f"pattern:{p}"] = (x[known], y[known])
+
+        self.shape_ids = np.array(list(shapes), dtype=object)
+        self.shape_index = {shape_id: k for k, shape_id in enumerate(self.shape_ids)}
+        lengths = np.array([len(shapes[s][0]) for s in self.shape_ids], dtype=np.int64)
+        self.ptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self.x = np.concatenate([shapes[s][0] for s in self.shape_ids]) if len(lengths) else np.zeros(0)
+        self.y = np.concatenate([shapes[s][1] for s in self.shape_ids]) if len(lengths) else np.zeros(0)
+        point_shape = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+
+        # Segment i joins points i and i + 1 of the same shape
+        same = point_shape[1:] == point_shape[:-1] if len(self.x) else np.zeros(0, dtype=bool)
+        step = np.hypot(np.diff(self.x), np.diff(self.y)) * same
+        cum = np.concatenate([[0.0], np.cumsum(step)])
+        self.cum = cum - np.repeat(cum[self.ptr[:-1]], lengths)
+        self.length = self.cum[self.ptr[1:] - 1] if len(lengths) else np.zeros(0)
+        self.seg_start = np.flatnonzero(same).astype(np.int64)
+        self.seg_shape = point_shape[self.seg_start]
+        self._build_grid()
+
+    def _build_grid(self):
+        a, b = self.seg_start, self.seg_start + 1
+        cx0 = np.floor(np.minimum(self.x[a], self.x[b]) / MAX_OFFSET_METERS).astype(np.int64)
+        cx1 = np.floor(np.maximum(self.x[a], self.x[b]) / MAX_OFFSET_METERS).astype(np.int64)
+        cy0 = np.floor(np.minimum(self.y[a], self.y[b]) / MAX_OFFSET_METERS).astype(np.int64)
+        cy1 = np.floor(np.maximum(self.y[a], self.y[b]) / MAX_OFFSET_METERS).astype(np.int64)
+        width = cx1 - cx0 + 1
+        counts = width * (cy1 - cy0 + 1)
+        segment = np.repeat(np.arange(len(a)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = np.repeat(cx0, counts) + within % np.repeat(width, counts)
+        cell_y = np.repeat(cy0, counts) + within // np.repeat(width, counts)
+        keys = _cell_keys(np.repeat(self.seg_shape, counts), cell_x, cell_y)
+        order = np.argsort(keys, kind="stable")
+        self.cell_keys, starts = np.unique(keys[order], return_index=True)
+        self.cell_ptr = np.concatenate([starts, [len(order)]]).astype(np.int64)
+        self.cell_segments = segment[order]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray) and value.dtype != object)
+
+    def shape_for_trip(self, trip_id: str) -> Optional[int]:
+        shape = self.shape_index.get(self.trip_shapes.get(trip_id, ""))
+        if shape is None and self.compact is not None and trip_id in self.compact.trip_index:
+            pattern = self.compact.pattern_of_trip(self.compact.trip_index[trip_id])
+            shape = self.shape_index.get(f"pattern:{pattern}")
+        return shape
+
+    def project(self, shapes: np.ndarray, x: np.ndarray, y: np.ndarray,
+                hint: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Project points onto their shapes in one pass: (distance along the shape, offset
+        from it) in metres per point, NaN for points farther than MAX_OFFSET_METERS.
+        `hint` is where along the shape each point is expected (NaN for no preference).
+        """
+        n = len(x)
+        along = np.full(n, np.nan)
+        offset = np.full(n, np.nan)
+        if n == 0 or len(self.cell_keys) == 0:
+            return along, offset
+
+        # Candidate (point, segment) pairs from the 3x3 cells of its shape around each point
+        cx = np.floor(x / MAX_OFFSET_METERS).astype(np.int64)
+        cy = np.floor(y / MAX_OFFSET_METERS).astype(np.int64)
+        dx, dy = np.meshgrid(np.arange(-1, 2), np.arange(-1, 2))
+        keys = _cell_keys(np.repeat(shapes, 9), (cx[:, None] + dx.ravel()).ravel(), (cy[:, None] + dy.ravel()).ravel())
+        key_point = np.repeat(np.arange(n), 9)
+        pos = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+        found = self.cell_keys[pos] == keys
+        starts, ends = self.cell_ptr[pos[found]], self.cell_ptr[pos[found] + 1]
+        counts = ends - starts
+        point = np.repeat(key_point[found], counts)
+        segment = self.cell_segments[np.repeat(starts, counts) + np.arange(counts.sum())
+                                     - np.repeat(np.cumsum(counts) - counts, counts)]
+        if len(point) == 0:
+            return along, offset
+
+        # Closest point of each candidate segment
+        a = self.seg_start[segment]
+        ax, ay = self.x[a], self.y[a]
+        sx, sy = self.x[a + 1] - ax, self.y[a + 1] - ay
+        squared = sx * sx + sy * sy
+        px, py = x[point] - ax, y[point] - ay
+        t = np.clip(np.divide(px * sx + py * sy, squared, out=np.zeros_like(squared), where=squared > 0), 0.0, 1.0)
+        distance = np.hypot(px - t * sx, py - t * sy)
+        position = self.cum[a] + t * np.sqrt(squared)
+
+        score = distance.copy()
+        if hint is not None:
+            expected = hint[point]
+            score += np.where(np.isnan(expected), 0.0, HINT_WEIGHT * np.abs(position - expected))
+        score[distance > MAX_OFFSET_METERS] = np.inf
+
+        order = np.lexsort((score, point))
+        first = order[np.unique(point[order], return_index=True)[1]]
+        best = first[np.isfinite(score[first])]
+        along[point[best]] = position[best]
+        offset[point[best]] = distance[best]
+        return along, offset
+
+    def stop_distances(self, shape: int, pattern: int) -> np.ndarray:
+        """Distance along `shape` of each stop of a compact pattern (non-decreasing), cached."""
+        key = (shape, pattern)
+        distances = self._stop_distances.get(key)
+        if distances is not None:
+            return distances
+        compact = self.compact
+        stops = compact.pattern_stops[compact.pattern_ptr[pattern]:compact.pattern_ptr[pattern + 1]]
+        x, y = self.stop_x[stops], self.stop_y[stops]
+        length = self.length[shape]
+        # Expect stops spread along the shape in order, which settles loops and out-and-back shapes
+        hint = np.linspace(0.0, length, len(stops)) if len(stops) > 1 else np.zeros(len(stops))
+        known = ~np.isnan(x)
+        along = np.full(len(stops), np.nan)
+        along[known], _ = self.project(np.full(known.sum(), shape), x[known], y[known], hint[known])
+        valid = ~np.isnan(along)
+        if valid.any():
+            along = np.interp(np.arange(len(stops)), np.flatnonzero(valid), along[valid])
+        else:
+            along = hint
+        distances = np.maximum.accumulate(along)
+        self._stop_distances[key] = distances
+        return distances
+
+
+def _load_shapes(agency: str) -> ShapeIndex:
+    """Read an agency's shapes and trip -> shape links and build its ShapeIndex."""
+    compact = get_stop_times_index(agency)
+    if compact is None and preload_stop_times(agency)["rows"]:
+        compact = get_stop_times_index(agency)
+    if compact is None:
+        raise RuntimeError(f"stop_times index is not loaded for agency: {agency}")
+
+    service = GTFSService(agency)
+    trips = service.get_trips()
+    routes = trips["route_id"].astype(str)
+    trip_ids = trips["trip_id"].astype(str)
+    trip_routes = dict(zip(trip_ids, routes))
+    trip_shapes: Dict[str, str] = {}
+    if "shape_id" in trips.columns:
+        linked = trips["shape_id"].notna()
+        trip_shapes = dict(zip(trip_ids[linked], trips.loc[linked, "shape_id"].astype(str)))
+
+    shapes: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    try:
+        frame = service.get_shapes()
+    except Exception:
+        # Feeds without shapes.txt: every trip follows its stop pattern
+        frame = None
+    if frame is not None and not frame.empty:
+        frame = frame.assign(
+            shape_id=frame["shape_id"].astype(str),
+            shape_pt_sequence=frame["shape_pt_sequence"].astype(float),
+        ).sort_values(["shape_id", "shape_pt_sequence"], kind="stable")
+        x, y = project(frame["shape_pt_lat"].astype(float).to_numpy(), frame["shape_pt_lon"].astype(float).to_numpy())
+        codes, ids = frame["shape_id"].factorize(sort=False)
+        bounds = np.flatnonzero(np.diff(codes)) + 1
+        for shape_id, xs, ys in zip(ids, np.split(x, bounds), np.split(y, bounds)):
+            if len(xs) >= 2:
+                shapes[shape_id] = (xs, ys)
+
+    catalog = stop_catalog(agency)
+    lat = np.full(len(compact.stop_ids), np.nan)
+    lon = np.full(len(compact.stop_ids), np.nan)
+    for i, stop_id in enumerate(compact.stop_ids):
+        stop = catalog.by_id.get(stop_id)
+        if stop is not None:
+            lat[i], lon[i] = stop["stop_lat"], stop["stop_lon"]
+    stop_x, stop_y = project(lat, lon)
+
+    index = ShapeIndex(agency, shapes, trip_shapes, trip_routes, compact.stop_ids, stop_x, stop_y, compact)
+    log_debug(f"[TripProgress] ✓ {agency}: {len(index.shape_ids)} shapes, {len(index.seg_start)} segments "
+              f"({index.nbytes / 1e6:.1f} MB)")
+    return index
+
+
+def _iso(midnight: float, seconds: float) -> str:
+    return datetime.fromtimestamp(midnight + seconds).astimezone().isoformat(timespec="seconds")
+
+
+class TripProgressService:
+    """
+    Where a trip is along its route, and when it reaches the stops ahead.
+
+    A position (from the agency's GTFS-Realtime vehicles, or given by the caller) is
+    projected onto the trip's shape through the ShapeIndex. Its distance along the
+    shape, set against the stops' distances and scheduled times, gives the last and
+    next stop and the trip's delay, which is carried on to the downstream stops.
+    Without a usable position the timetable alone places the trip. `vehicles()`
+    projects every live vehicle of an agency in one vectorized pass and keeps the
+    result until the next feed snapshot.
+    """
+
+    def __init__(self):
+        self._shapes = agency_registry.cache("shapes", _load_shapes)
+        # agency -> (snapshot fetched_at, progress of its vehicles)
+        self._vehicles: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+
+    def _index(self, agency: str) -> ShapeIndex:
+        index = self._shapes.get(agency)
+        if index.compact is not get_stop_times_index(agency):
+            # stop_times were reloaded since: rebuild on the new patterns
+            self._shapes.evict(agency)
+            index = self._shapes.get(agency)
+        return index
+
+    @staticmethod
+    def _clock(times: Dict[str, np.ndarray], now: datetime, start_date: Optional[str] = None) -> Tuple[float, float]:
+        """(service-day midnight epoch, seconds since it), for a trip that may run past 24:00."""
+        midnight = service_midnight(start_date, now.timestamp())
+        seconds = now.timestamp() - midnight
+        if start_date is None and times["arrival"][-1] >= 86400 and seconds < times["arrival"][0] - 43200:
+            # After midnight on a trip that started on yesterday's service day
+            midnight -= 86400
+            seconds += 86400
+        return midnight, seconds
+
+    @staticmethod
+    def _running(times: Dict[str, np.ndarray], seconds: float) -> bool:
+        return (times["departure"][0] - RUNNING_MARGIN_SECONDS <= seconds
+                <= times["arrival"][-1] + RUNNING_MARGIN_SECONDS)
+
+    def trip(self, agency: str, trip_id: str, lat: Optional[float] = None, lon: Optional[float] = None,
+             now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Progress of one trip, or None if the trip is unknown. A position is only used while
+        the trip is running (within RUNNING_MARGIN_SECONDS of its timetable); otherwise the
+        timetable places it with no delay. Raises RuntimeError before warm-up.
+        """
+        index = self._index(agency)
+        compact = index.compact
+        times = compact.trip_times(trip_id)
+        shape = index.shape_for_trip(trip_id)
+        if times is None or shape is None:
+            return None
+        now = now or datetime.now()
+        midnight, seconds = self._clock(times, now)
+        pattern = compact.pattern_of_trip(compact.trip_index[trip_id])
+        stop_distances = index.stop_distances(shape, pattern)
+        arrival = times["arrival"].astype(np.float64)
+        scheduled_at = float(np.interp(seconds, arrival, stop_distances))
+
+        source, vehicle = "schedule", None
+        running = self._running(times, seconds)
+        if running and lat is not None and lon is not None:
+            source, vehicle = "request", {"lat": lat, "lon": lon}
+        elif running and realtime_feed.enabled_for(agency):
+            live = realtime_feed.vehicles(agency)
+            position = live[1].get(trip_id) if live else None
+            if position is not None:
+                source, vehicle = "vehicle", {"vehicle_id": position[0], "lat": position[1], "lon": position[2]}
+
+        along, offset, delay = scheduled_at, None, None
+        if vehicle is not None:
+            x, y = project(np.array([vehicle["lat"]]), np.array([vehicle["lon"]]))
+            projected, distance = index.project(np.array([shape]), x, y, np.array([scheduled_at]))
+            if np.isnan(projected[0]):
+                # Too far from the route to say where along it the vehicle is
+                source = "schedule"
+            else:
+                along, offset = float(projected[0]), round(float(distance[0]), 1)
+                delay = int(round(seconds - float(np.interp(along, stop_distances, arrival))))
+
+        stops = self._stops(index, times, stop_distances, along, delay or 0, midnight, seconds)
+        passed = [stop for stop in stops if stop["passed"]]
+        upcoming = [stop for stop in stops if not stop["passed"]]
+        k = shape
+        point = index.ptr[k] + np.searchsorted(index.cum[index.ptr[k]:index.ptr[k + 1]], along, side="right") - 1
+        point = int(min(max(point, index.ptr[k]), index.ptr[k + 1] - 2))
+        span = index.cum[point + 1] - index.cum[point]
+        t = 0.0 if span <= 0 else min(max((along - index.cum[point]) / span, 0.0), 1.0)
+        snapped_lat, snapped_lon = unproject(index.x[point] + t * (index.x[point + 1] - index.x[point]),
+                                             index.y[point] + t * (index.y[point + 1] - index.y[point]))
+        length = float(index.length[k])
+        return {
+            "agency": agency,
+            "trip_id": trip_id,
+            "route_id": index.trip_routes.get(trip_id),
+            "shape_id": index.shape_ids[k],
+            "source": source,
+            "vehicle": vehicle,
+            "distance_m": round(along, 1),
+            "length_m": round(length, 1),
+            "progress": round(along / length, 4) if length > 0 else 0.0,
+            "lat": round(float(snapped_lat), 6),
+            "lon": round(float(snapped_lon), 6),
+            "offset_m": offset,
+            "delay_seconds": delay,
+            "current_stop": passed[-1] if passed else None,
+            "next_stop": upcoming[0] if upcoming else None,
+            "stops": stops,
+        }
+
+    @staticmethod
+    def _stops(index: ShapeIndex, times: Dict[str, np.ndarray], stop_distances: np.ndarray, along: float,
+               delay: int, midnight: float, seconds: float) -> List[Dict[str, Any]]:
+        catalog = stop_catalog(index.agency)
+        stops = []
+        for stop, sequence, arrival, distance in zip(times["stops"].tolist(), times["stop_sequence"].tolist(),
+                                                     times["arrival"].tolist(), stop_distances.tolist()):
+            stop_id = index.stop_ids[stop]
+            info = catalog.by_id.get(stop_id, {})
+            passed = distance < along - 1.0
+            estimated = None if passed else max(arrival + delay, seconds)
+            stops.append({
+                "stop_id": stop_id,
+                "stop_code": info.get("stop_code"),
+                "stop_name": info.get("stop_name") or index.compact.stop_names[stop],
+                "stop_sequence": sequence,
+                "distance_m": round(distance, 1),
+                "scheduled_time": format_gtfs_time(arrival),
+                "estimated_time": _iso(midnight, estimated) if estimated is not None else None,
+                "minutes_until": round((estimated - seconds) / 60) if estimated is not None else None,
+                "passed": passed,
+            })
+        return stops
+
+    def vehicles(self, agency: str, route: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Progress of every vehicle in the agency's GTFS-Realtime snapshot (optionally one
+        route id), projected together; None without a fresh snapshot.
+        """
+        live = realtime_feed.vehicles(agency) if realtime_feed.enabled_for(agency) else None
+        if live is None:
+            return None
+        fetched_at, positions = live
+        cached = self._vehicles.get(agency)
+        if cached is None or cached[0] != fetched_at:
+            cached = (fetched_at, self._project_vehicles(agency, fetched_at, positions))
+            self._vehicles[agency] = cached
+        return [vehicle for vehicle in cached[1] if route is None or vehicle["route_id"] == route]
+
+    def _project_vehicles(self, agency: str, fetched_at: float, positions: Dict[str, list]) -> List[Dict[str, Any]]:
+
+        index = self._index(agency)
+        compact = index.compact
+        now = datetime.fromtimestamp(fetched_at)
+        rows = []
+        for trip_id, (vehicle_id, lat, lon) in positions.items():
+            times = compact.trip_times(trip_id)
+            shape = index.shape_for_trip(trip_id)
+            if times is None or shape is None:
+                continue
+            midnight, seconds = self._clock(times, now)
+            distances = index.stop_distances(shape, compact.pattern_of_trip(compact.trip_index[trip_id]))
+            arrival = times["arrival"].astype(np.float64)
+            rows.append((trip_id, vehicle_id, lat, lon, shape, float(np.interp(seconds, arrival, distances)),
+                         times, distances, arrival, midnight, seconds))
+
+        with time_section("trip_progress_project"):
+            x, y = project(np.array([row[2] for row in rows], dtype=np.float64),
+                           np.array([row[3] for row in rows], dtype=np.float64))
+            along, offset = index.project(np.array([row[4] for row in rows], dtype=np.int64), x, y,
+                                          np.array([row[5] for row in rows], dtype=np.float64))
+
+        result = []
+        for row, distance, off in zip(rows, along.tolist(), offset.tolist()):
+            trip_id, vehicle_id, lat, lon, shape, _, times, distances, arrival, midnight, seconds = row
+            if distance != distance:
+                continue  # off route
+            # A vehicle on a trip the timetable says is not running (e.g. another service day) has no delay
+            delay = (int(round(seconds - float(np.interp(distance, distances, arrival))))
+                     if self._running(times, seconds) else None)
+            ahead = int(np.searchsorted(distances, distance + 1.0))
+            next_stop = index.stop_ids[times["stops"][ahead]] if ahead < len(distances) else None
+            length = float(index.length[shape])
+            result.append({
+                "trip_id": trip_id,
+                "route_id": index.trip_routes.get(trip_id),
+                "vehicle_id": vehicle_id,
+                "lat": lat,
+                "lon": lon,
+                "distance_m": round(distance, 1),
+                "progress": round(distance / length, 4) if length > 0 else 0.0,
+                "offset_m": round(off, 1),
+                "delay_seconds": delay,
+                "next_stop_id": next_stop,
+                "next_stop_name": compact.stop_names[times["stops"][ahead]] if next_stop is not None else None,
+                "next_stop_eta": (_iso(midnight, max(float(arrival[ahead]) + (delay or 0), seconds))
+                                  if next_stop is not None else None),
+            })
+        return result
+
+
+trip_progress = TripProgressService()
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.services.agency_registry import agency_registry
+from app.services.debug_logger import log_debug
+from app.utils.lazy import LazyObject
+
+
+class WarmupService:
+    """
+    Startup pipeline that preloads in-memory indexes concurrently and tracks readiness.
+    Each component is a blocking loader run in a worker thread; its result and load time
+    are recorded so `/ready` and `/health` can report what is actually warm.
+    """
+
+    def __init__(self):
+        self.components: Dict[str, Callable[[], Any]] = {}
+        self.status: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Register a blocking loader under a component name."""
+        self.components[name] = loader
+        self.status[name] = {"state": "pending"}
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.components) and all(
+            info.get("state") == "ready" for info in self.status.values()
+        )
+
+    def _run_component(self, name: str, loader: Callable[[], Any]):
+        self.status[name] = {"state": "loading"}
+        start = time.perf_counter()
+        try:
+            result = loader()
+            elapsed = time.perf_counter() - start
+            self.status[name] = {"state": "ready", "seconds": round(elapsed, 3), "result": result}
+            log_debug(f"[Warmup] ✓ {name} loaded in {elapsed:.3f}s ({result})")
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            self.status[name] = {"state": "failed", "seconds": round(elapsed, 3), "error": str(e)}
+            log_debug(f"[Warmup] ✗ {name} failed after {elapsed:.3f}s: {e}")
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every pending or failed component concurrently and return the report."""
+        async with self._lock:
+            self.started_at = time.time()
+            pending = {
+                name: loader for name, loader in self.components.items()
+                if self.status.get(name, {}).get("state") != "ready"
+            }
+            await asyncio.gather(*(
+                asyncio.to_thread(self._run_component, name, loader)
+                for name, loader in pending.items()
+            ))
+            self.finished_at = time.time()
+            return self.report()
+
+    def run_sync(self) -> Dict[str, Any]:
+        """Run the pipeline from synchronous code (scripts, pre-fork hooks)."""
+        return asyncio.run(self.run())
+
+    def report(self) -> Dict[str, Any]:
+        total = None
+        if self.started_at and self.finished_at:
+            total = round(self.finished_at - self.started_at, 3)
+        return {
+            "ready": self.ready,
+            "total_seconds": total,
+            "components": self.status
+        }
+
+
+def register_default_components(warmup: "WarmupService"):
+    """
+    Register the stop catalogs, schedule and stop_times indexes, search index and topology
+    for every preloaded agency (AGENCY_PRELOAD); other agencies load on first use. Services are referenced lazily so registering at import
+    does not load pandas; each one is imported when its loader runs.
+    """
+    preload_stops = LazyObject("app.services.stop_helper", "preload_stops")
+    schedule_service = LazyObject("app.services.schedule_service", "schedule_service")
+    build_station_to_lines = LazyObject("app.services.stations_data", "build_station_to_lines")
+    fare_service = LazyObject("app.services.fare_service", "fare_service")
+    preload_stop_times = LazyObject("app.services.stop_times_index", "preload_stop_times")
+    route_pattern_service = LazyObject("app.services.route_patterns", "route_pattern_service")
+    preload_search_index = LazyObject("app.services.search_index", "preload_search_index")
+
+    def load_stop_times(agency: str):
+        # Route patterns are derived from the compact stop_times, so they load in the same step
+        result = preload_stop_times(agency)
+        if result["rows"]:
+            result["route_patterns"] = route_pattern_service.preload(agency)
+        return result
+
+    agencies = agency_registry.pinned()
+    for agency in agencies:
+        warmup.register(f"stops:{agency}", lambda ag=agency: preload_stops(ag))
+        warmup.register(f"schedule:{agency}", lambda ag=agency: schedule_service.preload(ag))
+        warmup.register(f"stop_times:{agency}", lambda ag=agency: load_stop_times(ag))
+    warmup.register("topology:bart", build_station_to_lines)
+    warmup.register("search", preload_search_index)
+    if "bart" in agencies:
+        warmup.register("fares:bart", lambda: fare_service.preload())
+
+
+warmup_service = WarmupService()
+register_default_components(warmup_service)
@@ -1,26 +1,70 @@
 import redis
+import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
 from functools import wraps
 from typing import Optional, Any
 import json
 from app.config import settings
+from app.utils.metrics import record_cache
 
-# Redis connection pool
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    db=settings.REDIS_DB,
-    password=settings.REDIS_PASSWORD,
-    decode_responses=True
-)
+# Sync and async clients are created on first use, not at import
+_redis_client: Optional[redis.Redis] = None
+_async_redis_client: Optional[aioredis.Redis] = None
+
+def _sync_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            decode_responses=True
+        )
+    return _redis_client
 
 def get_redis():
     """Return Redis connection."""
     try:
-        redis_client.ping()
-        return redis_client
+        client = _sync_client()
+        client.ping()
+        return client
     except redis.ConnectionError:
         raise ConnectionError("Could not connect to Redis server")
 
+def get_async_redis() -> aioredis.Redis:
+    """Return the per-process asyncio Redis client, creating it on first use."""
+    global _async_redis_client
+    if _async_redis_client is None:
+        # Request paths (rate limiter, arrival fallback) use this client, so a Redis outage
+        # must fail fast instead of retrying with backoff for seconds
+        _async_redis_client = aioredis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            decode_responses=True,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            retry=Retry(NoBackoff(), 0)
+        )
+    return _async_redis_client
+
+def reset_redis_clients():
+    """Drop connections inherited from a parent process (call after fork)."""
+    global _async_redis_client
+    if _redis_client is not None:
+        _redis_client.connection_pool.reset()
+    _async_redis_client = None
+
+async def close_redis():
+    """Close this process's asyncio Redis client (app shutdown)."""
+    global _async_redis_client
+    if _async_redis_client is not None:
+        await _async_redis_client.aclose()
+        _async_redis_client = None
+
 def cache_key(*args, **kwargs) -> str:
     """Generate a cache key from arguments."""
     key_parts = [str(arg) for arg in args]
@@ -40,16 +84,18 @@ def cache(ttl: int = settings.CACHE_TTL):
             key = f"{func.__name__}:{cache_key(*args, **kwargs)}"
             
             # Try to get from cache
-            cached = redis_client.get(key)
+            cached = _sync_client().get(key)
             if cached:
+                record_cache(func.__name__, "hit")
                 return json.loads(cached)
+            record_cache(func.__name__, "miss")
             
             # Get fresh data
             result = await func(*args, **kwargs)
             
             # Cache the result
             if result is not None:
-                redis_client.setex(key, ttl, json.dumps(result))
+                _sync_client().setex(key, ttl, json.dumps(result))
             
             return result
         return wrapper
@@ -58,22 +104,25 @@ def cache(ttl: int = settings.CACHE_TTL):
 def clear_cache(pattern: str = "*"):
     """Clear cache entries matching pattern."""
     try:
-        for key in redis_client.scan_iter(pattern):
-            redis_client.delete(key)
+        for key in _sync_client().scan_iter(pattern):
+            _sync_client().delete(key)
     except redis.ConnectionError:
         raise ConnectionError("Could not connect to Redis server")
 
 def get_cached(key: str) -> Optional[Any]:
     """Get value from cache."""
+    cache_name = key.split(":", 1)[0]
     try:
-        value = redis_client.get(key)
+        value = _sync_client().get(key)
+        record_cache(cache_name, "hit" if value else "miss")
         return json.loads(value) if value else None
     except redis.ConnectionError:
+        record_cache(cache_name, "error")
         raise ConnectionError("Could not connect to Redis server")
 
 def set_cached(key: str, value: Any, ttl: int = settings.CACHE_TTL):
     """Set value in cache."""
     try:
-        redis_client.setex(key, ttl, json.dumps(value))
+        _sync_client().setex(key, ttl, json.dumps(value))
     except redis.ConnectionError:
         raise ConnectionError("Could not connect to Redis server") 
\ No newline at end of file
@@ -0,0 +1,31 @@
+import importlib
+from typing import Any
+
+
+class LazyObject:
+    """
+    Stand-in for a module-level object (a service singleton or function) that is only
+    imported on first use. Lets light modules refer to pandas/numpy-backed services
+    without paying for those imports when the app starts.
+
+        schedule_service = LazyObject("app.services.schedule_service", "schedule_service")
+    """
+
+    def __init__(self, module: str, name: str):
+        self._module = module
+        self._name = name
+        self._target = None
+
+    def _resolve(self) -> Any:
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self._module), self._name)
+        return self._target
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._resolve(), attr)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<LazyObject {self._module}.{self._name}>"
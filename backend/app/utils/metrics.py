@@ -0,0 +1,264 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from app.utils.profiling import profiled_thread
+
+# Latency buckets (seconds) shared by request, upstream and DB histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "munibuddy_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "munibuddy_requests_in_progress",
+    "HTTP requests currently being served",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_LATENCY = Histogram(
+    "munibuddy_upstream_duration_seconds",
+    "Upstream API call latency",
+    ["upstream", "agency", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_REQUESTS = Counter(
+    "munibuddy_upstream_requests_total",
+    "Upstream API calls by outcome (HTTP status, 'timeout' or 'error')",
+    ["upstream", "agency", "status"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "munibuddy_db_query_duration_seconds",
+    "Database query latency by GTFSService method",
+    ["agency", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "munibuddy_cache_requests_total",
+    "Cache lookups by result (hit/miss/error)",
+    ["cache", "result"],
+)
+SECTION_LATENCY = Histogram(
+    "munibuddy_section_duration_seconds",
+    "Latency of in-process hot-path sections (parsing, pandas merges)",
+    ["section"],
+    buckets=LATENCY_BUCKETS,
+)
+
+UPSTREAM_BUDGET_DECISIONS = Counter(
+    "munibuddy_upstream_budget_decisions_total",
+    "Rate-limiter decisions for budgeted upstreams by priority class",
+    ["upstream", "priority", "result"],
+)
+UPSTREAM_BUDGET_TOKENS = Gauge(
+    "munibuddy_upstream_budget_tokens",
+    "Tokens left in the shared upstream request budget after the latest decision",
+    ["upstream"],
+    multiprocess_mode="mostrecent",
+)
+ARRIVAL_OBSERVATIONS = Counter(
+    "munibuddy_arrival_observations_total",
+    "Live predictions kept for delay history (recorded, written, dropped, failed)",
+    ["result"],
+)
+UPSTREAM_FALLBACKS = Counter(
+    "munibuddy_upstream_fallbacks_total",
+    "Responses served from cache or schedule instead of the upstream, by reason",
+    ["upstream", "source", "reason"],
+)
+
+UPSTREAM_CIRCUIT_STATE = Gauge(
+    "munibuddy_upstream_circuit_state",
+    "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)",
+    ["upstream"],
+    multiprocess_mode="max",
+)
+UPSTREAM_HEDGES = Counter(
+    "munibuddy_upstream_hedged_requests_total",
+    "Second (hedged) requests sent because the first was slower than the upstream's p95",
+    ["upstream"],
+)
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+NOTIFICATION_EVENTS = Counter(
+    "munibuddy_notifications_total",
+    "Notification pipeline events (queued, sent, retried, failed)",
+    ["event"],
+)
+NOTIFICATION_WATCHED_STOPS = Gauge(
+    "munibuddy_notification_watched_stops",
+    "Distinct stops evaluated in the latest notification pass",
+    multiprocess_mode="mostrecent",
+)
+REALTIME_FEED_PREDICTIONS = Gauge(
+    "munibuddy_realtime_feed_predictions",
+    "Stop predictions in the GTFS-Realtime snapshot this worker serves",
+    ["agency"],
+    multiprocess_mode="mostrecent",
+)
+REALTIME_FEED_AGE = Gauge(
+    "munibuddy_realtime_feed_age_seconds",
+    "Age of the GTFS-Realtime snapshot when this worker loaded it",
+    ["agency"],
+    multiprocess_mode="mostrecent",
+)
+BART_BOARD_DEPARTURES = Gauge(
+    "munibuddy_bart_board_departures",
+    "Departures in the BART all-stations snapshot this worker serves",
+    multiprocess_mode="mostrecent",
+)
+BART_BOARD_AGE = Gauge(
+    "munibuddy_bart_board_age_seconds",
+    "Age of the BART all-stations snapshot when this worker loaded it",
+    multiprocess_mode="mostrecent",
+)
+AGENCIES_LOADED = Gauge(
+    "munibuddy_agencies_loaded",
+    "Agencies with data held in memory by this worker",
+    multiprocess_mode="max",
+)
+
+
+def observe_upstream(upstream: str, agency: str, endpoint: str, status: str, seconds: Optional[float]):
+    """Record an upstream call; `seconds` is None when no request was sent (e.g. budget denied)."""
+    if seconds is not None:
+        UPSTREAM_LATENCY.labels(upstream, agency, endpoint).observe(seconds)
+    UPSTREAM_REQUESTS.labels(upstream, agency, status).inc()
+
+
+def record_cache(cache: str, result: str, count: int = 1):
+    CACHE_REQUESTS.labels(cache, result).inc(count)
+
+
+def record_budget(upstream: str, priority: str, result: str, tokens: float):
+    UPSTREAM_BUDGET_DECISIONS.labels(upstream, priority, result).inc()
+    UPSTREAM_BUDGET_TOKENS.labels(upstream).set(tokens)
+
+
+def record_circuit_state(upstream: str, state: str):
+    UPSTREAM_CIRCUIT_STATE.labels(upstream).set(CIRCUIT_STATES[state])
+
+
+def record_hedge(upstream: str):
+    UPSTREAM_HEDGES.labels(upstream).inc()
+
+
+def record_notification(event: str, count: int = 1):
+    NOTIFICATION_EVENTS.labels(event).inc(count)
+
+
+def record_watched_stops(count: int):
+    NOTIFICATION_WATCHED_STOPS.set(count)
+
+
+def record_observations(result: str, count: int = 1):
+    ARRIVAL_OBSERVATIONS.labels(result).inc(count)
+
+
+def record_fallback(upstream: str, source: str, reason: str):
+    UPSTREAM_FALLBACKS.labels(upstream, source, reason).inc()
+
+
+def record_agencies_loaded(count: int):
+    AGENCIES_LOADED.set(count)
+
+
+def record_realtime_feed(agency: str, predictions: int, age: float):
+    REALTIME_FEED_PREDICTIONS.labels(agency).set(predictions)
+    REALTIME_FEED_AGE.labels(agency).set(age)
+
+
+def record_bart_board(departures: int, age: float):
+    BART_BOARD_DEPARTURES.set(departures)
+    BART_BOARD_AGE.set(age)
+
+
+@contextmanager
+def time_section(section: str):
+    """Time an in-process block, e.g. `with time_section("schedule_merge"): ...`."""
+    start = time.perf_counter()
+    try:
+        with profiled_thread():
+            yield
+    finally:
+        SECTION_LATENCY.labels(section).observe(time.perf_counter() - start)
+
+
+def track_db(method):
+    """Decorator for GTFSService methods: records query latency labelled by agency and method name."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with profiled_thread():
+                return method(self, *args, **kwargs)
+        finally:
+            DB_QUERY_LATENCY.labels(self.agency, method.__name__).observe(time.perf_counter() - start)
+    return wrapper
+
+
+def _route_template(scope) -> str:
+    """Full route template for a request (include_router prefixes are part of route.path)."""
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency and in-flight requests.
+    Routes are labelled by their template (e.g. /api/v1/stop-schedule/{stop_id}) to keep
+    label cardinality bounded; unmatched paths are grouped under "unmatched".
+    """
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            REQUEST_LATENCY.labels(method, _route_template(scope), str(status["code"])).observe(
+                time.perf_counter() - start
+            )
+
+
+def render_metrics():
+    """Return (payload, content_type), aggregating across workers in multiprocess mode."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,409 @@
+"""
+On-demand sampling profiler for individual requests.
+
+Off unless PROFILING_ENABLED: the middleware is not even installed. When enabled, a
+request is profiled if it carries `X-Profile: <PROFILING_TOKEN>` or falls in the random
+PROFILING_SAMPLE_RATE share. While at least one request is being profiled, a daemon
+thread wakes every PROFILING_INTERVAL_MS and records, for each of them:
+
+- every task the request created (its own task, gather/hedge children, streaming
+  helpers): the live stack of the event-loop thread when that task is running, or its
+  coroutine await chain when it is suspended, ending in e.g. `[await Future]`, so time
+  spent waiting on 511/BART shows up under the call that awaited it;
+- every worker thread currently doing work for the request. Threads announce
+  themselves through `profiled_thread()`, which `time_section` and `track_db` enter,
+  so the pandas merges of the schedule service and GTFSService queries are covered.
+
+Samples are stored as collapsed stacks ("a;b;c 12", the input format of flamegraph.pl
+and speedscope) in Redis, shared by all workers, with an in-process copy for when Redis
+is down, and are served as folded text or a rendered SVG flame graph from /admin/profiles.
+The last PROFILING_KEEP profiles are kept for PROFILING_TTL seconds, and only callers
+sending `X-Admin-Token: <ADMIN_TOKEN>` can read them.
+"""
+import asyncio
+import hmac
+import html
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+
+from app.config import settings
+from app.services.debug_logger import log_debug
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_BACKEND_DIR = os.path.dirname(_APP_DIR)
+
+# The profile of the request being handled in this context (inherited by its tasks and to_thread calls)
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+_running: List["RequestProfile"] = []
+_running_lock = threading.Lock()
+_sampler: Optional[threading.Thread] = None
+
+# Profiles kept in this process for when Redis is unavailable
+_local: "deque[Dict[str, Any]]" = deque(maxlen=max(1, settings.PROFILING_KEEP))
+_labels: Dict[Any, str] = {}
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(_BACKEND_DIR):
+            path = os.path.relpath(path, _BACKEND_DIR)
+        elif "site-packages" in path:
+            path = path.split("site-packages" + os.sep, 1)[1]
+        else:
+            path = os.path.basename(path)
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return label
+
+
+def _thread_stack(frame, start=None) -> List[str]:
+    """Labels from `start` (or the first app frame) down to the running frame."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    if start is not None and start in frames:
+        frames = frames[frames.index(start):]
+    else:
+        # Drop interpreter/threadpool bootstrap above the first frame of our own code
+        for i, f in enumerate(frames):
+            if f.f_code.co_filename.startswith(_APP_DIR):
+                frames = frames[i:]
+                break
+    return [_label(f.f_code) for f in frames]
+
+
+def _await_stack(coro, start=None) -> List[str]:
+    """Labels along a suspended coroutine's await chain, ending in what it is waiting on."""
+    stack: List[Any] = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            waiting = type(coro).__name__
+            stack.append(f"[await {'Future' if waiting == 'FutureIter' else waiting}]")
+            break
+        stack.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    if start is not None and start in stack:
+        stack = stack[stack.index(start):]
+    return [item if isinstance(item, str) else _label(item.f_code) for item in stack]
+
+
+class RequestProfile:
+    """Samples collected for one request."""
+
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.root = f"{method} {path}"
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.tasks: List[asyncio.Task] = [asyncio.current_task()]
+        # The middleware's frame; stacks of the request task are cut above it
+        self.root_frame = None
+        self.threads: Counter = Counter()
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.status = 500
+
+    def attach(self, thread_id: int):
+        self.threads[thread_id] += 1
+
+    def detach(self, thread_id: int):
+        self.threads[thread_id] -= 1
+        if self.threads[thread_id] <= 0:
+            del self.threads[thread_id]
+
+    def sample(self, frames: Dict[int, Any]):
+        running = asyncio.current_task(self.loop)
+        for i, task in enumerate(list(self.tasks)):
+            if task is None or task.done():
+                continue
+            start = self.root_frame if i == 0 else None
+            if task is running and self.loop_thread in frames:
+                coro_frame = getattr(task.get_coro(), "cr_frame", None)
+                stack = _thread_stack(frames[self.loop_thread], start or coro_frame)
+            else:
+                stack = _await_stack(task.get_coro(), start)
+            if i:
+                stack.insert(0, f"[task {getattr(task.get_coro(), '__qualname__', task.get_name())}]")
+            self.samples[(self.root, *stack)] += 1
+
+        for thread_id in list(self.threads):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                self.samples[(self.root, "[worker thread]", *_thread_stack(frame))] += 1
+        self.sample_count += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.samples.most_common())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "duration_ms": round(self.duration * 1000, 1),
+            "interval_ms": settings.PROFILING_INTERVAL_MS,
+            "samples": self.sample_count,
+            "folded": self.folded(),
+        }
+
+
+def _sample_loop():
+    global _sampler
+    interval = max(settings.PROFILING_INTERVAL_MS, 1.0) / 1000
+    while True:
+        with _running_lock:
+            if not _running:
+                _sampler = None
+                return
+            profiles = list(_running)
+        frames = sys._current_frames()
+        for profile in profiles:
+            try:
+                profile.sample(frames)
+            except Exception as e:  # a task or frame changed under us; skip this tick
+                log_debug(f"[Profile] ⚠️ Sample skipped for {profile.id}: {e}")
+        del frames
+        time.sleep(interval)
+
+
+def _begin(profile: RequestProfile):
+    global _sampler
+    with _running_lock:
+        _running.append(profile)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="request-profiler", daemon=True)
+            _sampler.start()
+
+
+def _end(profile: RequestProfile):
+    with _running_lock:
+        _running.remove(profile)
+
+
+@contextmanager
+def profiled_thread():
+    """Let the profile of the current request (if any) sample this worker thread inside the block."""
+    profile = _current.get()
+    thread_id = threading.get_ident()
+    if profile is None or thread_id == profile.loop_thread:
+        yield
+        return
+    profile.attach(thread_id)
+    try:
+        yield
+    finally:
+        profile.detach(thread_id)
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop):
+    """Record tasks created while a profile is active so children of a request are sampled too."""
+    previous = loop.get_task_factory()
+    if getattr(previous, "profiling", False):
+        return
+
+    def factory(loop, coro, **kwargs):
+        task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+        profile = _current.get()
+        if profile is not None:
+            profile.tasks.append(task)
+        return task
+
+    factory.profiling = True
+    loop.set_task_factory(factory)
+
+
+# --- storage ------------------------------------------------------------------------
+
+def _key(profile_id: str) -> str:
+    return f"profiles:{profile_id}"
+
+
+async def save_profile(profile: Dict[str, Any]):
+    _local.appendleft(profile)
+    # Imported here: app.utils.cache imports app.utils.metrics, which imports this module
+    from app.utils.cache import get_async_redis
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            pipe.setex(_key(profile["id"]), settings.PROFILING_TTL, orjson.dumps(profile))
+            pipe.lpush("profiles:recent", profile["id"])
+            pipe.ltrim("profiles:recent", 0, settings.PROFILING_KEEP - 1)
+            await pipe.execute()
+    except Exception as e:
+        log_debug(f"[Profile] ⚠️ Could not store profile {profile['id']} in Redis: {e}")
+
+
+async def recent_profiles() -> List[Dict[str, Any]]:
+    """Newest first, without the samples."""
+    from app.utils.cache import get_async_redis
+    try:
+        redis = get_async_redis()
+        ids = await redis.lrange("profiles:recent", 0, settings.PROFILING_KEEP - 1)
+        raw = await redis.mget([_key(i) for i in ids]) if ids else []
+        profiles = [orjson.loads(r) for r in raw if r]
+    except Exception as e:
+        log_debug(f"[Profile] ⚠️ Redis unavailable, listing this worker's profiles: {e}")
+        profiles = list(_local)
+    return [{k: v for k, v in p.items() if k != "folded"} for p in profiles]
+
+
+async def load_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    from app.utils.cache import get_async_redis
+    try:
+        raw = await get_async_redis().get(_key(profile_id))
+        if raw:
+            return orjson.loads(raw)
+    except Exception as e:
+        log_debug(f"[Profile] ⚠️ Redis unavailable, looking in this worker: {e}")
+    return next((p for p in _local if p["id"] == profile_id), None)
+
+
+# --- flame graph --------------------------------------------------------------------
+
+_ROW = 17
+
+
+def _colour(name: str) -> str:
+    h = zlib.crc32(name.encode())
+    if name.startswith("[await"):
+        return f"rgb({80 + h % 40},{130 + h % 50},{210 + h % 40})"
+    if name.startswith("["):
+        return "rgb(190,190,190)"
+    return f"rgb({205 + h % 50},{80 + (h >> 8) % 130},{(h >> 16) % 60})"
+
+
+def render_svg(folded: str, title: str, width: int = 1200) -> str:
+    """Flame graph (root at the bottom) of collapsed stacks as a standalone SVG."""
+    root: Dict[str, Any] = {"value": 0, "children": {}}
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        n = int(count)
+        root["value"] += n
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"value": 0, "children": {}})
+            node["value"] += n
+
+    boxes: List[Tuple[str, int, int, int]] = []
+
+    def layout(node: Dict[str, Any], x: int, depth: int):
+        for name, child in sorted(node["children"].items()):
+            boxes.append((name, x, depth, child["value"]))
+            layout(child, x, depth + 1)
+            x += child["value"]
+
+    layout(root, 0, 0)
+    total = max(root["value"], 1)
+    depth = max((d for _, _, d, _ in boxes), default=0) + 1
+    height = depth * _ROW + 40
+    scale = (width - 20) / total
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">',
+        f'<rect width="100%" height="100%" fill="#fafafa"/>',
+        f'<text x="10" y="18" font-size="13">{html.escape(title)}</text>',
+    ]
+    for name, x, d, value in boxes:
+        w = value * scale
+        if w < 0.5:
+            continue
+        y = height - (d + 1) * _ROW - 4
+        tip = f"{name} — {value} samples ({value / total:.1%})"
+        parts.append(
+            f'<g><title>{html.escape(tip)}</title>'
+            f'<rect x="{10 + x * scale:.1f}" y="{y}" width="{w:.1f}" height="{_ROW - 1}" '
+            f'fill="{_colour(name)}" rx="2"/>'
+        )
+        chars = int(w // 7)
+        if chars >= 3:
+            text = name if len(name) <= chars else name[:chars - 2] + ".."
+            parts.append(f'<text x="{12 + x * scale:.1f}" y="{y + 12}">{html.escape(text)}</text>')
+        parts.append("</g>")
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+# --- middleware ---------------------------------------------------------------------
+
+def _trigger(scope) -> Optional[str]:
+    if settings.PROFILING_TOKEN:
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                # Compared as bytes: compare_digest rejects str with non-ASCII characters
+                if hmac.compare_digest(value, settings.PROFILING_TOKEN.encode()):
+                    return "header"
+                break
+    if settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware profiling selected requests (see module docstring). Only added
+    when PROFILING_ENABLED; unselected requests cost a header scan. Profiled responses
+    carry `X-Profile-Id` for /admin/profiles/{id}.
+    """
+
+    def __init__(self, app, skip_prefixes=("/admin", "/metrics", "/health", "/ready")):
+        self.app = app
+        self.skip_prefixes = tuple(skip_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_prefixes):
+            await self.app(scope, receive, send)
+            return
+        trigger = _trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], trigger)
+        profile.root_frame = sys._getframe()
+        _install_task_factory(profile.loop)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token = _current.set(profile)
+        _begin(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _end(profile)
+            _current.reset(token)
+            profile.duration = time.perf_counter() - profile.start
+            await save_profile(profile.to_dict())
+            log_debug(f"[Profile] ✓ {profile.root} profiled as {profile.id}: "
+                      f"{profile.sample_count} samples in {profile.duration * 1000:.0f} ms")
@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+from typing import Any, List, Optional, Tuple
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "application/x-ndjson", "text/")
+
+# Slow-changing resources that browsers and Caddy may cache and revalidate with ETags
+CACHEABLE_PREFIXES = ("/api/v1/routes", "/api/v1/route-timetable", "/api/v1/nearby-stops", "/api/v1/shapes",
+                      "/api/v1/fares", "/api/v1/search")
+
+
+def _orjson_default(value: Any) -> Any:
+    # Anything orjson cannot handle natively (pydantic models, Decimals, pandas scalars)
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(
+        content,
+        default=_orjson_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson (numpy arrays/scalars and NaN -> null handled natively)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _accepts(header: Optional[str], token: str) -> bool:
+    """True if a comma-separated Accept/Accept-Encoding header lists `token` with a non-zero q."""
+    if not header:
+        return False
+    for part in header.split(","):
+        value, *params = [p.strip() for p in part.split(";")]
+        if value.lower() != token:
+            continue
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    return float(param[2:]) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+# Headers a 304 repeats from the 200 it stands for (RFC 9110 15.4.5)
+_NOT_MODIFIED_HEADERS = (b"etag", b"cache-control", b"expires", b"date", b"content-location")
+
+
+def _vary(headers: List[Tuple[bytes, bytes]], extra: List[str]) -> bytes:
+    """Merge our Vary fields into any the app already set (e.g. CORS adds Origin)."""
+    existing = _header(headers, b"vary")
+    return ", ".join(([existing] if existing else []) + extra).encode()
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    if brotli is not None and _accepts(accept_encoding, "br"):
+        return "br"
+    if _accepts(accept_encoding, "gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.GZIP_LEVEL)
+
+
+class CompactResponseMiddleware:
+    """
+    Pure ASGI middleware for buffered (non-streaming) responses:
+
+    - weak ETag from the JSON body on GET 200s, answering If-None-Match with 304
+      (and a Cache-Control max-age for the slow-changing CACHEABLE_PREFIXES)
+    - MessagePack body when the client sends `Accept: application/msgpack`
+    - brotli/gzip Content-Encoding negotiated from Accept-Encoding, above
+      COMPRESSION_MIN_BYTES
+
+    Streaming responses (more than one body chunk) and already-encoded bodies pass through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = scope.get("headers", [])
+        method = scope.get("method", "GET")
+        path = scope.get("path", "")
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Streaming response: forward untouched
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            status, headers, body = self._transform(
+                method, path, request_headers, start_message["status"],
+                list(start_message.get("headers", [])), message.get("body", b"")
+            )
+            await send({**start_message, "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _transform(self, method, path, request_headers, status, headers, body):
+        content_type = (_header(headers, b"content-type") or "").lower()
+        if _header(headers, b"content-encoding") is not None:
+            return status, headers, body
+
+        is_json = content_type.startswith("application/json")
+        vary = ["Accept-Encoding"]
+
+        if method == "GET" and status == 200 and is_json:
+            etag = 'W/"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+            headers = [(k, v) for k, v in headers if k.lower() != b"etag"] + [(b"etag", etag.encode())]
+            if path.startswith(CACHEABLE_PREFIXES) and _header(headers, b"cache-control") is None:
+                headers.append((b"cache-control", f"public, max-age={settings.STATIC_CACHE_MAX_AGE}".encode()))
+            if_none_match = _header(request_headers, b"if-none-match")
+            if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+                # Validators and caching headers, plus CORS so cross-origin revalidations can read it;
+                # Vary (with CORS's Origin) is merged below
+                not_modified = [(k, v) for k, v in headers
+                                if k.lower() in _NOT_MODIFIED_HEADERS or k.lower().startswith(b"access-control-")]
+                return 304, not_modified + [(b"vary", _vary(headers, vary + ["Accept"]))], b""
+
+        if is_json and msgpack is not None and settings.ENABLE_MSGPACK:
+            vary.append("Accept")
+            accept = _header(request_headers, b"accept")
+            if any(_accepts(accept, t) for t in MSGPACK_TYPES):
+                body = msgpack.packb(orjson.loads(body), use_bin_type=True)
+                content_type = "application/msgpack"
+                headers = [(k, v) for k, v in headers if k.lower() != b"content-type"]
+                headers.append((b"content-type", content_type.encode()))
+
+        encoding = None
+        if len(body) >= settings.COMPRESSION_MIN_BYTES and content_type.startswith(COMPRESSIBLE_TYPES):
+            encoding = choose_encoding(_header(request_headers, b"accept-encoding"))
+            if encoding:
+                body = compress(body, encoding)
+                headers.append((b"content-encoding", encoding.encode()))
+
+        headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"vary")] + [
+            (b"vary", _vary(headers, vary))
+        ]
+        headers.append((b"content-length", str(len(body)).encode()))
+        return status, headers, body
@@ -0,0 +1,65 @@
+"""
+Request-handling checks that run without Postgres, Redis or the upstreams.
+
+Imports the API with profiling and the admin endpoints enabled and sends requests that
+must be rejected cleanly rather than fail, e.g. tokens with non-ASCII bytes, which
+`hmac.compare_digest` refuses as str.
+
+Usage (from backend/):
+    python -m benchmarks.checks
+
+Exits with status 1 if any check fails.
+"""
+import os
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fixtures import BACKEND_DIR
+
+TOKEN = "check-token"
+
+
+def _configure_env():
+    # Read when app.main is imported: the profiling middleware is only added when enabled
+    os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+    os.environ.setdefault("API_KEY", "benchmark")
+    os.environ.setdefault("BART_API_KEY", "benchmark")
+    os.environ["DEBUG"] = "false"
+    os.environ["PROFILING_ENABLED"] = "true"
+    os.environ["PROFILING_TOKEN"] = TOKEN
+    os.environ["ADMIN_TOKEN"] = TOKEN
+
+
+def checks(client) -> Dict[str, Callable[[], Tuple[int, int]]]:
+    """Check name -> () returning (expected status, actual status)."""
+    # Raw header bytes: "ö" in latin-1 is the single byte 0xf6
+    return {
+        "profile header: non-ASCII token is ignored": lambda: (
+            404, client.get("/api/v1/no-such-route", headers={"X-Profile": "tök".encode("latin-1")}).status_code),
+        "admin header: non-ASCII token is refused": lambda: (
+            403, client.get("/admin/profiles", headers={"X-Admin-Token": "ädm".encode("latin-1")}).status_code),
+        "admin header: wrong token is refused": lambda: (
+            403, client.get("/admin/profiles", headers={"X-Admin-Token": "wrong"}).status_code),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    _configure_env()
+    sys.path.insert(0, str(BACKEND_DIR))
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    # No lifespan: nothing here needs the database or background work
+    client = TestClient(app, raise_server_exceptions=False)
+    failures = 0
+    for name, check in checks(client).items():
+        expected, actual = check()
+        ok = expected == actual
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name} (expected {expected}, got {actual})")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Compare two benchmark result files and fail on regressions.
+
+Usage (from backend/):
+    python -m benchmarks.compare baseline.json bench.json --threshold 0.15
+
+Exits with status 1 if any case's p50 or p95 got slower by more than the threshold.
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+METRICS = ("p50_ms", "p95_ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two MuniBuddy benchmark runs.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown (0.15 = 15%%)")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="Ignore cases faster than this in both runs")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'case':34s} {'metric':7s} {'baseline':>10s} {'current':>10s} {'change':>8s}")
+    for name in sorted(set(baseline) & set(current)):
+        for metric in METRICS:
+            old, new = baseline[name][metric], current[name][metric]
+            if max(old, new) < args.min_ms:
+                continue
+            change = (new - old) / old if old else 0.0
+            flag = ""
+            if change > args.threshold:
+                flag = "  REGRESSION"
+                regressions.append((name, metric, change))
+            print(f"{name:34s} {metric:7s} {old:10.3f} {new:10.3f} {change:+8.1%}{flag}")
+
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f"{name:34s} only in {'baseline' if name in baseline else 'current'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Import-time check for the API process.
+
+Runs `python -X importtime -c "import app.main"` in fresh interpreters and fails when
+startup regresses: a module that must stay lazy (pandas, numpy, ...) gets imported, or,
+against a baseline run, app.main imports more modules than it did or its median import
+time grows by more than the threshold. Absolute milliseconds depend on the machine and
+are only reported.
+
+Usage (from backend/):
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --output imports.json
+    python -m benchmarks.import_time --baseline imports.json --threshold 0.2
+
+Exits with status 1 on any regression.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.fixtures import BACKEND_DIR
+
+# Loaded on first use only (warm-up, the first schedule/fare/search request, the first log line)
+LAZY_MODULES = ("pandas", "numpy", "xmltodict", "colorama")
+
+
+def _env() -> Dict[str, str]:
+    # No connection is made at import, so a throwaway SQLite URL is enough
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///:memory:")
+    env.setdefault("API_KEY", "benchmark")
+    env.setdefault("BART_API_KEY", "benchmark")
+    env["DEBUG"] = "false"
+    return env
+
+
+def profile_once(target: str) -> Dict[str, Tuple[int, int]]:
+    """Module -> (self µs, cumulative µs) for one `import target` in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, env=_env(), capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {target} failed:\n{proc.stderr[-2000:]}")
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the API's import time and lazy imports.")
+    parser.add_argument("--target", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", help="Result file of an earlier run (same machine) to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown vs. baseline (0.2 = 20%%)")
+    parser.add_argument("--module-threshold", type=int, default=5,
+                        help="Modules app.main may import beyond the baseline's count")
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level packages to print")
+    parser.add_argument("--output", help="Write the result as JSON")
+    args = parser.parse_args(argv)
+
+    runs = [profile_once(args.target) for _ in range(args.runs)]
+    total_ms = statistics.median(run[args.target][1] for run in runs) / 1000
+    # Modules imported by the target, beyond those the interpreter loads anyway; the same in every run
+    module_count = min(len(run) for run in runs)
+
+    # Cost of each top-level package: its largest cumulative entry per run, median over runs
+    packages: Dict[str, List[int]] = {}
+    for run in runs:
+        per_run: Dict[str, int] = {}
+        for name, (_, cumulative) in run.items():
+            package = name.split(".")[0]
+            per_run[package] = max(per_run.get(package, 0), cumulative)
+        for package, cumulative in per_run.items():
+            packages.setdefault(package, []).append(cumulative)
+    slowest = sorted(((statistics.median(v) / 1000, k) for k, v in packages.items()), reverse=True)
+
+    print(f"import {args.target}: {total_ms:.1f} ms (median of {args.runs}), {module_count} modules")
+    for ms, name in slowest[1:args.top + 1]:
+        print(f"  {name:32s} {ms:8.1f} ms")
+
+    failures = []
+    eager = sorted({name for name in LAZY_MODULES for run in runs if name in run})
+    if eager:
+        failures.append(f"imported at startup but should be lazy: {', '.join(eager)}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if total_ms > baseline["total_ms"] * (1 + args.threshold):
+            failures.append(f"{total_ms:.1f} ms is more than {args.threshold:.0%} slower than "
+                            f"baseline {baseline['total_ms']:.1f} ms")
+        if "module_count" in baseline and module_count > baseline["module_count"] + args.module_threshold:
+            failures.append(f"{module_count} modules imported, baseline {baseline['module_count']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "target": args.target,
+                "total_ms": round(total_ms, 1),
+                "module_count": module_count,
+                "packages_ms": {name: round(ms, 1) for ms, name in slowest[:args.top + 1]},
+            }, f, indent=2)
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+MuniBuddy benchmark suite.
+
+Runs fully offline: GTFS comes from a SQLite copy of backend/gtfs_data and 511/BART
+calls are answered by benchmarks/stub_upstream.py (recorded payloads, no delay) or, with
+`--upstream mock`, by mock_upstream (synthesized payloads with MOCK_* latency, error and
+rate-limit injection). Results are written as JSON so two runs can be compared with
+`python -m benchmarks.compare`.
+
+Usage (from backend/):
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --only find_nearby_stops --only http:nearby_stops
+    MOCK_LATENCY=lognormal:150,0.6 python -m benchmarks.run --upstream mock --only http
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.fixtures import BACKEND_DIR, BENCH_NOW, GTFS_RT_EXPECTED, GTFS_RT_FEED, build_sqlite_db, recorded
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configure_env(db_path, upstream_url: str):
+    """Point the app at the SQLite fixture and the stub upstream before it is imported."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["TRANSIT_511_BASE_URL"] = f"{upstream_url}/transit"
+    os.environ["BART_API_BASE_URL"] = f"{upstream_url}/api"
+    os.environ["DEBUG"] = "false"
+    os.environ["UPSTREAM_511_QUOTA"] = "0"  # measure the request path, not the 511 budget
+    os.environ.setdefault("API_KEY", "benchmark")
+    os.environ.setdefault("BART_API_KEY", "benchmark")
+
+
+def _freeze_schedule_clock():
+    """Run schedule lookups at BENCH_NOW so results do not depend on the wall clock."""
+    import app.services.schedule_service as schedule_module
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return BENCH_NOW
+
+    schedule_module.datetime = FrozenDatetime
+
+
+class ServerThread:
+    """Run an ASGI app under uvicorn in a daemon thread."""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.time() + 30
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError("benchmark server failed to start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the app's debug prints while timing (they still run, they just go nowhere)."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def summarize(samples: List[float], wall: Optional[float] = None, **extra) -> Dict[str, Any]:
+    ms = sorted(sample * 1000 for sample in samples)
+
+    def pct(p: float) -> float:
+        return ms[min(len(ms) - 1, int(round(p / 100 * (len(ms) - 1))))]
+
+    total = wall if wall is not None else sum(samples)
+    return {
+        "iterations": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "p50_ms": round(pct(50), 4),
+        "p95_ms": round(pct(95), 4),
+        "p99_ms": round(pct(99), 4),
+        "min_ms": round(ms[0], 4),
+        "max_ms": round(ms[-1], 4),
+        "ops_per_sec": round(len(ms) / total, 2) if total else None,
+        **extra,
+    }
+
+
+def bench(fn: Callable[[], Any], iterations: int, warmup: int = 3, setup: Optional[Callable[[], Any]] = None):
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def micro_cases(iterations: int) -> Dict[str, Callable[[], Dict[str, Any]]]:
+    from app.integrations.gtfs_rt import decode_feed
+    from app.services import stop_helper
+    from app.services.isochrone import isochrone_service
+    from app.services.schedule_service import schedule_service
+    from app.services.trip_progress import trip_progress
+    from app.utils.json_cleaner import clean_api_response
+    from app.utils.xml_parser import xml_to_json
+    import numpy as np
+
+    lat, lon = 37.7651, -122.4197  # 16th St & Mission
+    siri_json = recorded("511_stop_monitoring_SF_15551.json")
+    siri_xml = recorded("511_stop_monitoring_SF_15551.xml")
+
+    def load_stops_cold():
+        for agency in stop_helper._catalogs.loaded():
+            stop_helper._catalogs.evict(agency)
+
+    all_stops = stop_helper.load_stops()
+
+    def project_every_trip():
+        # One position per BART trip (at its second stop), projected onto the shapes in one pass
+        index = trip_progress._index("bart")
+        trips = [(index.shape_for_trip(trip_id), index.compact.trip_times(trip_id)["stops"][1])
+                 for trip_id in index.compact.trip_ids]
+        shapes = [shape for shape, _ in trips if shape is not None]
+        stops = [stop for shape, stop in trips if shape is not None]
+        x, y = index.stop_x[stops], index.stop_y[stops]
+        return bench(lambda: index.project(np.array(shapes), x, y), max(iterations // 10, 10))
+
+    def decode_fixed_feed():
+        # Fails the run rather than timing a decoder that returns the wrong thing
+        decoded = decode_feed(GTFS_RT_FEED)
+        if decoded != GTFS_RT_EXPECTED:
+            raise AssertionError(f"decode_feed does not match the fixed feed: {decoded}")
+        return bench(lambda: decode_feed(GTFS_RT_FEED), iterations)
+
+    return {
+        "find_nearby_stops": lambda: bench(
+            lambda: stop_helper.find_nearby_stops(lat, lon, all_stops, 0.15), iterations),
+        "nearby_stops:grid": lambda: bench(lambda: stop_helper.nearby_stops(lat, lon, 0.15), iterations),
+        "load_stops:warm": lambda: bench(lambda: stop_helper.load_stops(), iterations),
+        "load_stops:cold": lambda: bench(
+            lambda: stop_helper.load_stops(), max(iterations // 20, 5), setup=load_stops_cold),
+        "schedule:get_schedule:bart": lambda: bench(
+            lambda: schedule_service.get_schedule("16TH", agency="bart"), max(iterations // 10, 10)),
+        "isochrone:30min": lambda: bench(
+            lambda: isochrone_service.isochrone(lat, lon, 30, BENCH_NOW), max(iterations // 10, 10)),
+        "trip_progress:project_all": project_every_trip,
+        "gtfsrt:decode": decode_fixed_feed,
+        "clean_api_response": lambda: bench(lambda: clean_api_response(siri_json), iterations),
+        "xml_to_json": lambda: bench(lambda: xml_to_json(siri_xml), iterations),
+    }
+
+
+HTTP_ENDPOINTS = {
+    "http:health": "/health",
+    "http:nearby_stops": "/api/v1/nearby-stops?lat=37.7651&lon=-122.4197&radius=0.25",
+    "http:stop_schedule:bart": "/api/v1/stop-schedule/16TH?agency=bart",
+    "http:bus_positions": "/api/v1/bus-positions/by-stop?stopCode=15551&agency=muni",
+    "http:bart_positions": "/api/v1/bart-positions/by-stop?stopCode=16TH&agency=bart",
+}
+
+
+async def _load(base_url: str, path: str, total: int, concurrency: int) -> Dict[str, Any]:
+    import httpx
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker(client):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+        await client.get(path)  # warm the route once
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return summarize(latencies, wall=wall, concurrency=concurrency, errors=errors)
+
+
+def _wait_ready(base_url: str, timeout: float = 120.0):
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=5.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API did not become ready")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _selected(name: str, only: List[str]) -> bool:
+    return not only or any(name == o or name.startswith(f"{o}:") for o in only)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the MuniBuddy benchmark suite offline.")
+    parser.add_argument("--output", "-o", default="bench.json", help="Where to write the JSON results")
+    parser.add_argument("--iterations", "-n", type=int, default=200, help="Iterations per micro benchmark")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per HTTP endpoint")
+    parser.add_argument("--concurrency", "-c", type=int, default=20, help="Concurrent HTTP clients")
+    parser.add_argument("--only", action="append", default=[], help="Run only this case (repeatable)")
+    parser.add_argument("--upstream", choices=["stub", "mock"], default="stub",
+                        help="Replay recorded payloads (stub) or use the fault-injecting mock_upstream server")
+    parser.add_argument("--rebuild-db", action="store_true", help="Rebuild the SQLite GTFS fixture")
+    args = parser.parse_args(argv)
+
+    db_path = build_sqlite_db(force=args.rebuild_db)
+    upstream_port, api_port = _free_port(), _free_port()
+    _configure_env(db_path, f"http://127.0.0.1:{upstream_port}")
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    if args.upstream == "mock":
+        from mock_upstream.app import app as upstream_app
+    else:
+        from benchmarks.stub_upstream import app as upstream_app
+    from app.main import app as api_app
+
+    _freeze_schedule_clock()
+    results: Dict[str, Any] = {}
+
+    with ServerThread(upstream_app, upstream_port), ServerThread(api_app, api_port):
+        base_url = f"http://127.0.0.1:{api_port}"
+        with _quiet():
+            _wait_ready(base_url)
+
+            for name, case in micro_cases(args.iterations).items():
+                if _selected(name, args.only):
+                    results[name] = case()
+                    print(f"{name:32s} p50={results[name]['p50_ms']:.3f}ms", file=sys.stderr)
+
+            for name, path in HTTP_ENDPOINTS.items():
+                if _selected(name, args.only):
+                    results[name] = asyncio.run(_load(base_url, path, args.requests, args.concurrency))
+                    print(f"{name:32s} p50={results[name]['p50_ms']:.3f}ms "
+                          f"rps={results[name]['ops_per_sec']}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "upstream": args.upstream,
+            "schedule_now": BENCH_NOW.isoformat(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""
+Stub 511/BART server replaying recorded responses from benchmarks/recorded/.
+
+Routes mirror the real upstream paths so only the base URLs change:
+    TRANSIT_511_BASE_URL = http://127.0.0.1:<port>/transit
+    BART_API_BASE_URL    = http://127.0.0.1:<port>/api
+"""
+from fastapi import FastAPI, Query
+from fastapi.responses import Response
+
+from benchmarks.fixtures import RECORDED_DIR
+
+app = FastAPI(title="MuniBuddy benchmark stub upstream")
+
+
+def _replay(prefix: str, key: str, default: str) -> bytes:
+    path = RECORDED_DIR / f"{prefix}_{key}.json"
+    if not path.exists():
+        path = RECORDED_DIR / default
+    return path.read_bytes()
+
+
+@app.get("/transit/StopMonitoring")
+def stop_monitoring(agency: str = Query("SF"), stopCode: str = Query(...)):
+    body = _replay(f"511_stop_monitoring_{agency}", stopCode, "511_stop_monitoring_SF_15551.json")
+    return Response(content=body, media_type="application/json; charset=utf-8")
+
+
+@app.get("/api/etd.aspx")
+def bart_etd(orig: str = Query(...)):
+    body = _replay("bart_etd", orig.upper(), "bart_etd_16TH.json")
+    return Response(content=body, media_type="application/json")
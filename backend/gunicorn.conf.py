@@ -0,0 +1,50 @@
+# backend/gunicorn.conf.py
+# Multi-worker mode: gunicorn -c gunicorn.conf.py app.main:app
+#
+# The app is imported and warmed once in the master (preload_app), then workers are
+# forked and share the static indexes copy-on-write. See "Running multiple workers"
+# in the README for the worker-count / RAM model.
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    """Warm the static indexes in the master before any worker is forked."""
+    from app.services.warmup_service import warmup_service
+    from app.db.database import engine
+    from app.utils.cache import reset_redis_clients
+
+    report = warmup_service.run_sync()
+    server.log.info(f"Warm-up finished in master: ready={report['ready']} ({report['total_seconds']}s)")
+
+    # Never hand open sockets to the children
+    engine.dispose()
+    reset_redis_clients()
+
+    # Move everything loaded so far into the permanent generation so the cyclic GC
+    # in each worker never walks (and therefore never dirties) the shared pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Drop pooled connections the worker inherited from the master."""
+    from app.db.database import engine
+    from app.utils.cache import reset_redis_clients
+
+    engine.dispose(close=False)
+    reset_redis_clients()
+
+
+def child_exit(server, worker):
+    """Let the Prometheus multiprocess collector drop the dead worker's live gauges."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
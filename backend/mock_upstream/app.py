@@ -0,0 +1,162 @@
+"""
+Local stand-in for the 511 and BART real-time APIs.
+
+Run from backend/:
+    uvicorn mock_upstream.app:app --port 8099
+
+and point the API at it with UPSTREAM_MOCK_URL=http://127.0.0.1:8099 (this sets both
+TRANSIT_511_BASE_URL and BART_API_BASE_URL). Besides the JSON endpoints it serves the
+GTFS-Realtime protobuf feeds (511 /transit/tripupdates and /transit/vehiclepositions,
+BART /gtfsrt/tripupdate.aspx). Behaviour is configured with MOCK_* env
+vars or at runtime through POST /_mock/config:
+
+    MOCK_LATENCY        fixed:<ms> | uniform:<lo_ms>,<hi_ms> | lognormal:<median_ms>,<sigma>
+    MOCK_ERROR_RATE     probability of answering 503 (default 0)
+    MOCK_TIMEOUT_RATE   probability of hanging for MOCK_HANG_SECONDS (default 0)
+    MOCK_RATE_LIMIT     <requests>/<seconds> per api_key, answered with 429 (default off)
+"""
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Optional
+
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from mock_upstream.synth import Synthesizer
+
+
+class FaultConfig(BaseModel):
+    latency: str = os.getenv("MOCK_LATENCY", "lognormal:120,0.5")
+    error_rate: float = float(os.getenv("MOCK_ERROR_RATE", "0"))
+    timeout_rate: float = float(os.getenv("MOCK_TIMEOUT_RATE", "0"))
+    hang_seconds: float = float(os.getenv("MOCK_HANG_SECONDS", "30"))
+    rate_limit: Optional[str] = os.getenv("MOCK_RATE_LIMIT") or None
+    seed: int = int(os.getenv("MOCK_SEED", "511"))
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """Return a latency in seconds for a distribution spec such as 'lognormal:120,0.5'."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return values[0] / 1000
+    if kind == "uniform":
+        return rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = values[0], values[1] if len(values) > 1 else 0.5
+        return rng.lognormvariate(0, sigma) * median / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+app = FastAPI(title="MuniBuddy mock upstream (511 + BART)")
+app.state.config = FaultConfig()
+app.state.synth = Synthesizer(seed=app.state.config.seed)
+app.state.rng = random.Random(app.state.config.seed)
+app.state.windows = defaultdict(deque)
+app.state.stats = defaultdict(int)
+
+
+@app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    if request.url.path.startswith("/_mock"):
+        return await call_next(request)
+
+    config: FaultConfig = app.state.config
+    rng: random.Random = app.state.rng
+    stats = app.state.stats
+    stats["requests"] += 1
+
+    if config.rate_limit:
+        limit, _, window = config.rate_limit.partition("/")
+        key = request.query_params.get("api_key") or request.query_params.get("key") or "anonymous"
+        hits = app.state.windows[key]
+        now = time.monotonic()
+        while hits and now - hits[0] > float(window):
+            hits.popleft()
+        if len(hits) >= int(limit):
+            stats["rate_limited"] += 1
+            return JSONResponse(status_code=429, content={"error": "rate limit exceeded"},
+                                headers={"Retry-After": str(int(float(window) - (now - hits[0])) + 1)})
+        hits.append(now)
+
+    await asyncio.sleep(sample_latency(config.latency, rng))
+
+    roll = rng.random()
+    if roll < config.timeout_rate:
+        stats["timeouts"] += 1
+        await asyncio.sleep(config.hang_seconds)
+    elif roll < config.timeout_rate + config.error_rate:
+        stats["errors"] += 1
+        return JSONResponse(status_code=503, content={"error": "injected upstream failure"})
+
+    return await call_next(request)
+
+
+@app.get("/transit/StopMonitoring")
+def stop_monitoring(agency: str = Query("SF"), stopCode: str = Query(...)):
+    payload = app.state.synth.stop_monitoring(agency, stopCode, datetime.now().astimezone())
+    if payload is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown stopCode {stopCode} for {agency}"})
+    return payload
+
+
+@app.get("/transit/VehicleMonitoring")
+def vehicle_monitoring(agency: str = Query("SF"), vehicleID: Optional[str] = Query(None)):
+    payload = app.state.synth.vehicle_monitoring(agency, datetime.now().astimezone(), vehicleID)
+    if payload is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown agency {agency}"})
+    return payload
+
+
+def _gtfs_realtime(operator: str, which: int) -> Response:
+    feeds = app.state.synth.gtfs_realtime(operator, datetime.now().astimezone())
+    if feeds is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown agency {operator}"})
+    return Response(content=feeds[which], media_type="application/x-protobuf")
+
+
+@app.get("/transit/tripupdates")
+def trip_updates(agency: str = Query("SF")):
+    return _gtfs_realtime(agency, 0)
+
+
+@app.get("/transit/vehiclepositions")
+def vehicle_positions(agency: str = Query("SF")):
+    return _gtfs_realtime(agency, 1)
+
+
+@app.get("/gtfsrt/tripupdate.aspx")
+def bart_trip_updates():
+    return _gtfs_realtime("BA", 0)
+
+
+@app.get("/api/etd.aspx")
+def bart_etd(orig: str = Query(...), cmd: str = Query("etd")):
+    payload = app.state.synth.bart_etd(orig, datetime.now().astimezone())
+    if payload is None:
+        return JSONResponse(status_code=400, content={"error": f"Invalid orig station: {orig}"})
+    return payload
+
+
+@app.get("/_mock/config")
+def get_config():
+    return app.state.config
+
+
+@app.post("/_mock/config")
+def update_config(config: FaultConfig):
+    sample_latency(config.latency, random.Random())  # validate the spec
+    app.state.config = config
+    app.state.rng = random.Random(config.seed)
+    app.state.windows.clear()
+    return config
+
+
+@app.get("/_mock/stats")
+def get_stats():
+    return dict(app.state.stats)
@@ -0,0 +1,65 @@
+"""
+Just enough protobuf encoding to emit GTFS-Realtime FeedMessages (field numbers from
+gtfs-realtime.proto), so the mock can serve the whole-agency TripUpdates and
+VehiclePositions feeds without the protobuf runtime.
+"""
+import struct
+from typing import Iterable, List, Optional
+
+
+def _varint(value: int) -> bytes:
+    value &= (1 << 64) - 1  # negatives as 64-bit two's complement, like int32/int64
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _key(number: int, wire: int) -> bytes:
+    return _varint(number << 3 | wire)
+
+
+def uint(number: int, value: Optional[int]) -> bytes:
+    return b"" if value is None else _key(number, 0) + _varint(value)
+
+
+def message(number: int, *parts: bytes) -> bytes:
+    body = b"".join(parts)
+    return _key(number, 2) + _varint(len(body)) + body
+
+
+def text(number: int, value: Optional[str]) -> bytes:
+    return b"" if value is None else message(number, value.encode("utf-8"))
+
+
+def fixed_float(number: int, value: float) -> bytes:
+    return _key(number, 5) + struct.pack("<f", value)
+
+
+def trip_descriptor(trip_id: str, route_id: str, direction_id: int, start_date: str) -> bytes:
+    return message(1, text(1, trip_id), text(3, start_date), text(5, route_id), uint(6, direction_id))
+
+
+def stop_time_update(stop_id: str, arrival: int, delay: int) -> bytes:
+    return message(2, message(2, uint(1, delay), uint(2, arrival)), text(4, stop_id))
+
+
+def feed_message(timestamp: int, entities: Iterable[bytes]) -> bytes:
+    header = message(1, text(1, "2.0"), uint(2, 0), uint(3, timestamp))
+    return header + b"".join(entities)
+
+
+def trip_update_entity(entity_id: str, trip: bytes, vehicle_id: str, updates: List[bytes], timestamp: int) -> bytes:
+    return message(2, text(1, entity_id), message(3, trip, *updates, message(3, text(1, vehicle_id)), uint(4, timestamp)))
+
+
+def vehicle_entity(entity_id: str, trip: bytes, vehicle_id: str, lat: float, lon: float,
+                   stop_id: str, timestamp: int) -> bytes:
+    position = message(2, fixed_float(1, lat), fixed_float(2, lon))
+    return message(2, text(1, entity_id), message(4, trip, position, uint(5, timestamp), text(7, stop_id),
+                                                  message(8, text(1, vehicle_id))))
@@ -0,0 +1,322 @@
+"""
+Synthesizes 511 SIRI and BART ETD payloads from the checked-in GTFS feeds.
+
+For every stop we derive which route/direction/headsign patterns serve it (BART from
+stop_times.txt, Muni from timepoints.txt) and generate upcoming arrivals on a
+per-pattern headway, with trip ids, delays and vehicle positions that look like the
+real feeds. Output is deterministic for a given seed and minute.
+"""
+import math
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from mock_upstream import gtfs_rt
+
+GTFS_DIR = Path(__file__).resolve().parent.parent / "gtfs_data"
+
+# 511 operator code -> feed folder
+FEEDS = {
+    "SF": GTFS_DIR / "muni_gtfs-current",
+    "BA": GTFS_DIR / "bart_gtfs-current",
+}
+
+BART_LINE_COLORS = {
+    "Yellow": ("YELLOW", "#ffff33"), "Orange": ("ORANGE", "#ff9933"), "Green": ("GREEN", "#339933"),
+    "Red": ("RED", "#ff0000"), "Blue": ("BLUE", "#0099cc"), "Beige": ("BEIGE", "#d5cfa3"),
+}
+
+
+def _iso(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+@dataclass
+class Pattern:
+    route_id: str
+    line_name: str
+    direction_id: int
+    headsign: str
+    trip_ids: List[str]
+    headway_min: int
+    # Stop code of the destination (BART's abbreviation): the station the headsign names,
+    # or else the stop the pattern's trips end at
+    destination_code: str = ""
+
+
+@dataclass
+class Stop:
+    stop_id: str
+    stop_code: str
+    name: str
+    lat: float
+    lon: float
+    patterns: List[Pattern] = field(default_factory=list)
+
+
+class AgencyFeed:
+    """Stops and the patterns serving them for one 511 operator."""
+
+    def __init__(self, operator: str, folder: Path):
+        self.operator = operator
+        stops = pd.read_csv(folder / "stops.txt", dtype=str, keep_default_na=False)
+        trips = pd.read_csv(folder / "trips.txt", dtype=str, keep_default_na=False)
+        routes = pd.read_csv(folder / "routes.txt", dtype=str, keep_default_na=False)
+
+        if (folder / "stop_times.txt").exists():
+            served = pd.read_csv(folder / "stop_times.txt", usecols=["trip_id", "stop_id", "stop_sequence"],
+                                 dtype={"trip_id": str, "stop_id": str, "stop_sequence": int})
+            served = served.sort_values(["trip_id", "stop_sequence"])
+        else:
+            # Listed in stop order within each trip
+            served = pd.read_csv(folder / "timepoints.txt", dtype=str, usecols=["trip_id", "stop_id"])
+        last_stop = served.groupby("trip_id", sort=False)["stop_id"].last()
+        codes_by_id = dict(zip(stops["stop_id"], stops["stop_code"] if "stop_code" in stops.columns else stops["stop_id"]))
+
+        if "location_type" in stops.columns:
+            stops = stops[stops["location_type"].isin(["", "0"])]
+
+        joined = served.merge(trips[["trip_id", "route_id", "direction_id", "trip_headsign"]], on="trip_id")
+        joined = joined.merge(routes[["route_id", "route_short_name"]], on="route_id")
+        grouped = joined.groupby(["stop_id", "route_id", "route_short_name", "direction_id", "trip_headsign"])["trip_id"]
+
+        self.stops: Dict[str, Stop] = {}
+        for _, row in stops.iterrows():
+            code = row.get("stop_code") or row["stop_id"]
+            self.stops[code] = Stop(row["stop_id"], code, row["stop_name"].strip(),
+                                    float(row["stop_lat"]), float(row["stop_lon"]))
+        by_id = {stop.stop_id: stop for stop in self.stops.values()}
+        by_name = {stop.name: stop.stop_code for stop in self.stops.values()}
+
+        for (stop_id, route_id, short_name, direction_id, headsign), trip_ids in grouped:
+            stop = by_id.get(stop_id)
+            if stop is None:
+                continue
+            ids = sorted(trip_ids.unique().tolist())
+            # Busier patterns (more trips per day) get shorter headways
+            headway = int(max(4, min(30, round(18 * 60 / max(len(ids), 1)))))
+            end = last_stop.get(ids[0], "")
+            destination = by_name.get(headsign.strip()) or codes_by_id.get(end) or end
+            stop.patterns.append(Pattern(route_id, short_name, int(direction_id or 0), headsign, ids, headway,
+                                         destination))
+
+    def lookup(self, stop_code: str) -> Optional[Stop]:
+        return self.stops.get(stop_code) or self.stops.get(stop_code.upper())
+
+
+class Synthesizer:
+    def __init__(self, seed: int = 511):
+        self.seed = seed
+        self._feeds: Dict[str, AgencyFeed] = {}
+        # (operator, minute) -> encoded (TripUpdates, VehiclePositions) feeds
+        self._realtime: Dict[Tuple[str, str], Tuple[bytes, bytes]] = {}
+
+    def feed(self, operator: str) -> Optional[AgencyFeed]:
+        operator = operator.upper()
+        if operator not in FEEDS:
+            return None
+        if operator not in self._feeds:
+            self._feeds[operator] = AgencyFeed(operator, FEEDS[operator])
+        return self._feeds[operator]
+
+    def _rng(self, *key) -> random.Random:
+        return random.Random(f"{self.seed}:" + ":".join(map(str, key)))
+
+    def _arrivals(self, stop: Stop, now: datetime, horizon_min: int = 60) -> List[Tuple[Pattern, datetime, int, str]]:
+        """(pattern, expected arrival, delay seconds, trip id) for every pattern serving the stop."""
+        arrivals = []
+        minute_key = now.strftime("%Y%m%d%H%M")
+        for pattern in stop.patterns:
+            rng = self._rng(stop.stop_id, pattern.route_id, pattern.direction_id, pattern.headsign)
+            offset = rng.randint(0, pattern.headway_min - 1)
+            minute_of_day = now.hour * 60 + now.minute
+            first = pattern.headway_min - ((minute_of_day - offset) % pattern.headway_min)
+            for k, minutes in enumerate(range(first, horizon_min, pattern.headway_min)):
+                trip_rng = self._rng(minute_key, stop.stop_id, pattern.route_id, k)
+                delay = int(trip_rng.gauss(60, 90))
+                aimed = now.replace(second=0, microsecond=0) + timedelta(minutes=minutes)
+                trip_index = (minute_of_day // pattern.headway_min + k) % len(pattern.trip_ids)
+                arrivals.append((pattern, aimed + timedelta(seconds=delay), delay, pattern.trip_ids[trip_index]))
+        arrivals.sort(key=lambda item: item[1])
+        return arrivals
+
+    def _vehicle_position(self, stop: Stop, minutes_away: float, rng: random.Random) -> Tuple[float, float]:
+        # ~250 m per minute out along a random bearing
+        distance_deg = minutes_away * 0.00225
+        bearing = rng.uniform(0, 2 * math.pi)
+        return (stop.lat + distance_deg * math.cos(bearing),
+                stop.lon + distance_deg * math.sin(bearing) / math.cos(math.radians(stop.lat)))
+
+    def stop_monitoring(self, operator: str, stop_code: str, now: datetime, max_visits: int = 20) -> Optional[dict]:
+        feed = self.feed(operator)
+        stop = feed.lookup(stop_code) if feed else None
+        if stop is None:
+            return None
+
+        visits = []
+        for pattern, expected, delay, trip_id in self._arrivals(stop, now)[:max_visits]:
+            rng = self._rng(trip_id, expected.isoformat())
+            lat, lon = self._vehicle_position(stop, max((expected - now).total_seconds() / 60, 0), rng)
+            aimed = expected - timedelta(seconds=delay)
+            direction = "IB" if pattern.direction_id == 1 else "OB"
+            visits.append({
+                "RecordedAtTime": _iso(now),
+                "MonitoringRef": stop.stop_code,
+                "MonitoredVehicleJourney": {
+                    "LineRef": pattern.line_name,
+                    "DirectionRef": direction if operator.upper() == "SF" else ("S" if pattern.direction_id else "N"),
+                    "FramedVehicleJourneyRef": {"DataFrameRef": now.strftime("%Y-%m-%d"), "DatedVehicleJourneyRef": trip_id},
+                    "PublishedLineName": pattern.line_name,
+                    "OperatorRef": operator.upper(),
+                    "DestinationName": pattern.headsign,
+                    "Monitored": True,
+                    "InCongestion": None,
+                    "VehicleLocation": {"Longitude": f"{lon:.6f}", "Latitude": f"{lat:.6f}"},
+                    "Bearing": f"{rng.choice([0, 90, 180, 270]):.1f}",
+                    "Occupancy": rng.choice(["seatsAvailable", "standingAvailable", "full"]),
+                    "VehicleRef": str(rng.randint(1000, 9999)),
+                    "MonitoredCall": {
+                        "StopPointRef": stop.stop_code,
+                        "StopPointName": stop.name,
+                        "VehicleLocationAtStop": "",
+                        "VehicleAtStop": "",
+                        "DestinationDisplay": pattern.headsign,
+                        "AimedArrivalTime": _iso(aimed),
+                        "ExpectedArrivalTime": _iso(expected),
+                        "AimedDepartureTime": _iso(aimed),
+                        "ExpectedDepartureTime": None,
+                        "Distances": ""
+                    }
+                }
+            })
+
+        return {"ServiceDelivery": {
+            "ResponseTimestamp": _iso(now), "ProducerRef": operator.upper(), "Status": True,
+            "StopMonitoringDelivery": {"version": "1.4", "ResponseTimestamp": _iso(now), "Status": True,
+                                       "MonitoredStopVisit": visits}
+        }}
+
+    def vehicle_monitoring(self, operator: str, now: datetime, vehicle_id: Optional[str] = None) -> Optional[dict]:
+        """One vehicle per route/direction pattern, positioned near a stop on that pattern."""
+        feed = self.feed(operator)
+        if feed is None:
+            return None
+        seen = set()
+        activity = []
+        for stop in feed.stops.values():
+            for pattern in stop.patterns:
+                key = (pattern.route_id, pattern.direction_id)
+                if key in seen:
+                    continue
+                seen.add(key)
+                rng = self._rng(now.strftime("%Y%m%d%H%M"), *key)
+                ref = str(1000 + len(seen))
+                if vehicle_id and vehicle_id != ref:
+                    continue
+                lat, lon = self._vehicle_position(stop, rng.uniform(0, 3), rng)
+                trip_id = pattern.trip_ids[rng.randrange(len(pattern.trip_ids))]
+                activity.append({
+                    "RecordedAtTime": _iso(now),
+                    "MonitoredVehicleJourney": {
+                        "LineRef": pattern.line_name,
+                        "DirectionRef": "IB" if pattern.direction_id == 1 else "OB",
+                        "FramedVehicleJourneyRef": {"DataFrameRef": now.strftime("%Y-%m-%d"), "DatedVehicleJourneyRef": trip_id},
+                        "PublishedLineName": pattern.line_name,
+                        "OperatorRef": operator.upper(),
+                        "DestinationName": pattern.headsign,
+                        "Monitored": True,
+                        "VehicleLocation": {"Longitude": f"{lon:.6f}", "Latitude": f"{lat:.6f}"},
+                        "Bearing": f"{rng.choice([0, 90, 180, 270]):.1f}",
+                        "VehicleRef": ref,
+                        "MonitoredCall": {"StopPointRef": stop.stop_code, "StopPointName": stop.name}
+                    }
+                })
+        return {"Siri": {"ServiceDelivery": {
+            "ResponseTimestamp": _iso(now), "ProducerRef": operator.upper(), "Status": True,
+            "VehicleMonitoringDelivery": {"version": "1.4", "ResponseTimestamp": _iso(now), "Status": True,
+                                          "VehicleActivity": activity}
+        }}}
+
+    def gtfs_realtime(self, operator: str, now: datetime) -> Optional[Tuple[bytes, bytes]]:
+        """
+        Whole-agency GTFS-RT (TripUpdates, VehiclePositions) built from the same
+        arrivals StopMonitoring reports; one entity per trip, regenerated each minute.
+        """
+        feed = self.feed(operator)
+        if feed is None:
+            return None
+        key = (feed.operator, now.strftime("%Y%m%d%H%M"))
+        if key in self._realtime:
+            return self._realtime[key]
+
+        trips: Dict[str, Tuple[Pattern, List[Tuple[datetime, Stop, int]]]] = {}
+        for stop in feed.stops.values():
+            for pattern, expected, delay, trip_id in self._arrivals(stop, now):
+                trips.setdefault(trip_id, (pattern, []))[1].append((expected, stop, delay))
+
+        timestamp = int(now.timestamp())
+        start_date = now.strftime("%Y%m%d")
+        updates, vehicles = [], []
+        for trip_id, (pattern, calls) in trips.items():
+            calls.sort(key=lambda call: call[0])
+            rng = self._rng(trip_id, key[1])
+            vehicle_id = str(rng.randint(1000, 9999))
+            trip = gtfs_rt.trip_descriptor(trip_id, pattern.route_id, pattern.direction_id, start_date)
+            stop_updates = [gtfs_rt.stop_time_update(stop.stop_id, int(expected.timestamp()), delay)
+                            for expected, stop, delay in calls]
+            updates.append(gtfs_rt.trip_update_entity(trip_id, trip, vehicle_id, stop_updates, timestamp))
+            expected, stop, _ = calls[0]
+            lat, lon = self._vehicle_position(stop, max((expected - now).total_seconds() / 60, 0), rng)
+            vehicles.append(gtfs_rt.vehicle_entity(f"v{vehicle_id}", trip, vehicle_id, lat, lon, stop.stop_id, timestamp))
+
+        encoded = (gtfs_rt.feed_message(timestamp, updates), gtfs_rt.feed_message(timestamp, vehicles))
+        self._realtime = {key: encoded}
+        return encoded
+
+    def bart_station(self, stop: Stop, now: datetime) -> dict:
+        by_destination: Dict[str, dict] = {}
+        for pattern, expected, delay, _ in self._arrivals(stop, now, horizon_min=75):
+            color, hexcolor = BART_LINE_COLORS.get(pattern.route_id.split("-")[0], ("WHITE", "#ffffff"))
+            entry = by_destination.setdefault(pattern.headsign, {
+                "destination": pattern.headsign,
+                "abbreviation": pattern.destination_code,
+                "limited": "0",
+                "estimate": []
+            })
+            if len(entry["estimate"]) >= 3:
+                continue
+            minutes = max(int((expected - now).total_seconds() // 60), 0)
+            entry["estimate"].append({
+                "minutes": "Leaving" if minutes == 0 else str(minutes),
+                "platform": "2" if pattern.direction_id else "1",
+                "direction": "South" if pattern.direction_id else "North",
+                "length": str(self._rng(pattern.route_id, minutes).choice([8, 9, 10])),
+                "color": color,
+                "hexcolor": hexcolor,
+                "bikeflag": "1",
+                "delay": str(max(delay, 0)),
+                "cancelflag": "0",
+                "dynamicflag": "0"
+            })
+        return {"name": stop.name, "abbr": stop.stop_code, "etd": list(by_destination.values())}
+
+    def bart_etd(self, orig: str, now: datetime) -> Optional[dict]:
+        feed = self.feed("BA")
+        if orig.upper() == "ALL":
+            stations = [s for s in feed.stops.values() if s.patterns]
+        else:
+            stop = feed.lookup(orig)
+            if stop is None:
+                return None
+            stations = [stop]
+        return {"?xml": {"@version": "1.0", "@encoding": "utf-8"}, "root": {
+            "@id": "1",
+            "date": now.strftime("%m/%d/%Y"),
+            "time": now.strftime("%I:%M:%S %p PDT"),
+            "station": [self.bart_station(station, now) for station in stations],
+            "message": ""
+        }}
@@ -0,0 +1,35 @@
+"""
+Export the static stop/route/shape tiles Caddy serves at /tiles (see app/services/static_tiles.py).
+Run after loading a new GTFS feed:
+
+    python scripts/export_static_tiles.py            # agencies whose feed_version changed
+    python scripts/export_static_tiles.py --force    # everything
+    python scripts/export_static_tiles.py muni       # only these agencies
+"""
+import argparse
+import os
+import sys
+
+# Setup project path
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.getcwd())
+
+from app.config import settings
+from app.services.static_tiles import static_tiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export static map tiles for Caddy")
+    parser.add_argument("agencies", nargs="*", help="Agencies to export (default: every enabled agency)")
+    parser.add_argument("--force", action="store_true", help="Re-export even if the feed version is unchanged")
+    args = parser.parse_args()
+
+    manifest = static_tiles.export(args.agencies or None, force=args.force)
+    print(f"📦 Static tiles in {settings.STATIC_TILES_DIR}")
+    for agency, entry in manifest.get("agencies", {}).items():
+        print(f"  {agency}: feed {entry['feed_version']}, {len(entry['stops'])} stop tiles, "
+              f"{len(entry['shapes'])} route shapes")
+
+
+if __name__ == "__main__":
+    main()
@@ -142,23 +142,23 @@ const normalizeSiriData = async (visits = [], baseApiUrl) => {
     return grouped;
 };
 
-const adaptBartData = (bartData) => {
+const adaptArrivalData = (arrivalData) => {
      const adapted = { inbound: [], outbound: [] };
-     if (!bartData || (!bartData.inbound && !bartData.outbound)) return adapted; // Check if either exists
+     if (!arrivalData || (!arrivalData.inbound && !arrivalData.outbound)) return adapted; // Check if either exists
      
      for (const dir of ['inbound', 'outbound']) {
-         if (Array.isArray(bartData[dir])) {
-             adapted[dir] = bartData[dir].map(bartRoute => {
-                 const minutesUntil = typeof bartRoute.minutes_until === 'number' ? bartRoute.minutes_until : parseInt(bartRoute.arrival_time, 10);
+         if (Array.isArray(arrivalData[dir])) {
+             adapted[dir] = arrivalData[dir].map(arrival => {
+                 const minutesUntil = typeof arrival.minutes_until === 'number' ? arrival.minutes_until : parseInt(arrival.arrival_time, 10);
                  if (isNaN(minutesUntil)) return null; // Skip if minutes_until is not a number
                  return {
-                     route_number: bartRoute.route_number || "BART",
-                     destination: bartRoute.destination || "Unknown BART Dest.",
-                     arrival_time: null, // BART API might not provide ISO time in this format
+                     route_number: arrival.route_number || (arrivalData.agency === 'bart' ? "BART" : "Unknown Line"),
+                     destination: arrival.destination || "Unknown Dest.",
+                     arrival_time: arrival.arrival_time || null,
                      status: minutesUntil === 0 ? "Due" : `${minutesUntil} min`,
                      minutes_until: minutesUntil,
-                     is_realtime: true, // BART data is generally realtime
-                     vehicle: { nearest_stop: "" } // BART vehicle location not typically in this API response
+                     is_realtime: arrival.is_realtime ?? true,
+                     vehicle: { lat: arrival.vehicle?.lat ?? "", lon: arrival.vehicle?.lon ?? "", nearest_stop: "" }
                  };
              }).filter(Boolean); // Remove null entries
              adapted[dir].sort((a, b) => (a.minutes_until ?? Infinity) - (b.minutes_until ?? Infinity));
@@ -241,9 +241,9 @@ const TransitInfo = ({ stops, baseApiUrl /* setLiveVehicleMarkers removed for no
                     inbound: groupScheduleEntries(normalized.inbound),
                     outbound: groupScheduleEntries(normalized.outbound)
                 };
-            } else if ((agency === "bart" || agency === "ba") && responseData && (responseData.inbound || responseData.outbound)) {
-                scheduleData = adaptBartData(responseData); // Use adapted BART data
-                 scheduleData = { // BART data might already be grouped like this from backend
+            } else if (responseData && (responseData.inbound || responseData.outbound)) {
+                scheduleData = adaptArrivalData(responseData); // Typed Muni/BART arrivals from the backend
+                 scheduleData = {
                     inbound: groupScheduleEntries(scheduleData.inbound),
                     outbound: groupScheduleEntries(scheduleData.outbound)
                 };